@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Agent Registry
+Lazily constructed agents for the unified API server
+
+Each agent is registered with a factory and built the first time a route
+needs it, so the server starts listening without parsing every knowledge
+base or loading the events RAG stack. A per-agent lock makes concurrent
+first requests wait for one construction instead of racing; other agents
+are not blocked. warmup() builds chosen agents in background threads, and
+is_ready() backs the readiness probe.
+
+A failed construction is remembered for `retry_seconds`, during which the
+agent reports as unavailable (routes answer 503) instead of every request
+paying for another failing attempt.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+COLD, LOADING, READY, FAILED = "cold", "loading", "ready", "failed"
+
+
+class _Slot:
+    def __init__(self, factory: Callable[[], Any]):
+        self.factory = factory
+        self.lock = threading.Lock()
+        self.instance = None
+        self.state = COLD
+        self.error: Optional[str] = None
+        self.failed_at = 0.0
+        self.load_seconds: Optional[float] = None
+
+
+class AgentRegistry:
+    def __init__(self, retry_seconds: float = 30.0):
+        """
+        Args:
+            retry_seconds: How long a failed construction is not retried
+        """
+        self.retry_seconds = retry_seconds
+        self._slots: Dict[str, _Slot] = {}
+        self._warming: set = set()
+        # A construction running in the (preloading) Gunicorn master does not
+        # exist in forked workers: let them start it again
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._slots[name] = _Slot(factory)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._slots)
+
+    def get(self, name: str) -> Optional[Any]:
+        """The agent, constructed on first use; None if construction failed"""
+        slot = self._slots[name]
+        if slot.instance is not None:
+            return slot.instance
+
+        with slot.lock:
+            if slot.instance is not None:
+                return slot.instance
+            if slot.state == FAILED and time.monotonic() - slot.failed_at < self.retry_seconds:
+                return None
+
+            slot.state = LOADING
+            start_time = time.perf_counter()
+            try:
+                instance = slot.factory()
+            except Exception as e:
+                slot.state, slot.error, slot.failed_at = FAILED, str(e), time.monotonic()
+                logger.error(f"❌ Failed to initialize {name} agent: {e}")
+                return None
+
+            slot.load_seconds = round(time.perf_counter() - start_time, 3)
+            slot.instance, slot.state, slot.error = instance, READY, None
+            logger.info(f"✅ {name} agent initialized in {slot.load_seconds}s")
+            return instance
+
+    def state(self, name: str) -> str:
+        return self._slots[name].state
+
+    def warmup(self, names: Optional[Iterable[str]] = None) -> Dict:
+        """Construct the given agents (default: all) in background threads"""
+        names = list(names) if names is not None else self.names
+        unknown = [name for name in names if name not in self._slots]
+        if unknown:
+            raise KeyError(f"Unknown agents: {', '.join(unknown)}")
+
+        for name in names:
+            if self._slots[name].state in (COLD, FAILED) and name not in self._warming:
+                self._warming.add(name)
+                threading.Thread(target=self._warm, args=(name,), name=f"warmup-{name}", daemon=True).start()
+        return self.status(names)
+
+    def _warm(self, name: str):
+        try:
+            self.get(name)
+        finally:
+            self._warming.discard(name)
+
+    def is_ready(self, names: Optional[Iterable[str]] = None) -> bool:
+        return all(self._slots[name].state == READY for name in (names if names is not None else self.names))
+
+    def status(self, names: Optional[Iterable[str]] = None) -> Dict:
+        status = {}
+        for name in (names if names is not None else self.names):
+            slot = self._slots[name]
+            status[name] = {"state": slot.state, "load_seconds": slot.load_seconds}
+            if slot.error:
+                status[name]["error"] = slot.error
+        return status
+
+    def _after_fork(self):
+        warming = list(self._warming)
+        self._warming = set()
+        for slot in self._slots.values():
+            slot.lock = threading.Lock()
+            if slot.state == LOADING:
+                slot.state = COLD
+        if warming:
+            self.warmup(warming)
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+MetroFlex ASGI Server
+Async serving mode for the MetroFlex agent servers
+
+Serves the same routes and payloads as the Flask apps in
+unified_api_server.py, metroflex_ai_agent_enhanced.py and
+simple_agent_server.py, but OpenAI calls are awaited on AsyncOpenAI instead
+of blocking a worker thread, so one process keeps hundreds of conversations
+in flight. Embedding/retrieval and the synchronous workflow and conversation
+agents run in the thread pool.
+
+Run with:
+    uvicorn asgi_server:create_unified_app --factory --host 0.0.0.0 --port 5001
+    uvicorn asgi_server:create_events_app --factory --port 5001
+    uvicorn asgi_server:create_simple_app --factory --port 5001
+
+or under Gunicorn:
+    gunicorn -k uvicorn.workers.UvicornWorker 'asgi_server:create_unified_app()'
+"""
+
+import json
+import logging
+from datetime import datetime
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from llm_gateway import INTERACTIVE, LLMOverloaded, get_llm_gateway, overloaded_response
+from metrics import instrument_fastapi, record_error
+
+logger = logging.getLogger(__name__)
+
+ERROR_RESPONSE = "I apologize, but I'm experiencing technical difficulties. Please contact Brian Dobson at brian@metroflexgym.com or call 817-465-9331."
+
+
+def _create_app(title: str) -> FastAPI:
+    app = FastAPI(title=title)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    return app
+
+
+async def _json_body(request: Request) -> dict:
+    """Request JSON body, or {} when it is missing or malformed"""
+    try:
+        data = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+async def _agent(registry, name: str):
+    """Registered agent; a cold one is constructed in the thread pool, not on the event loop"""
+    if registry.state(name) == "ready":
+        return registry.get(name)
+    return await run_in_threadpool(registry.get, name)
+
+
+def _overloaded(error: LLMOverloaded) -> JSONResponse:
+    body, status, headers = overloaded_response(error)
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+def _sse(event: dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+def create_unified_app() -> FastAPI:
+    """Async counterpart of unified_api_server:app (all 5 agents)"""
+    import unified_api_server as unified
+
+    app = _create_app("MetroFlex Unified AI Agent API")
+    instrument_fastapi(app, "unified")
+
+    @app.get('/health')
+    async def health_check():
+        return JSONResponse(unified.health_payload())
+
+    @app.get('/ready')
+    async def readiness_check(agents: str = None):
+        try:
+            names = unified.parse_agent_names(agents)
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+        body, status = unified.ready_payload(names)
+        return JSONResponse(body, status_code=status)
+
+    @app.post('/warmup')
+    async def warmup(request: Request):
+        try:
+            names = unified.parse_agent_names((await _json_body(request)).get('agents'))
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+        return JSONResponse({'agents': unified.agents.warmup(names)}, status_code=202)
+
+    @app.post('/api/licensing/chat')
+    async def licensing_chat(request: Request):
+        licensing_agent = await _agent(unified.agents, 'licensing')
+        if not licensing_agent:
+            return JSONResponse({'error': 'Licensing agent not available'}, status_code=503)
+
+        try:
+            data = await _json_body(request)
+            query = data.get('query', '')
+            lead_data = data.get('lead_data')
+
+            if not query:
+                return JSONResponse({'error': 'Query is required'}, status_code=400)
+
+            result = await licensing_agent.agenerate_response(query, lead_data)
+
+            ghl_sent = False
+            if 'ghl_payload' in result:
+                ghl_sent = await run_in_threadpool(unified.send_to_ghl, result['ghl_payload'])
+
+            response = {
+                'response': result['response'],
+                'high_intent': result.get('high_intent', False),
+                'ghl_sent': ghl_sent
+            }
+
+            if 'qualification_score' in result:
+                response['qualification_score'] = result['qualification_score']
+
+            logger.info(f"Licensing query processed: {query[:50]}... (High intent: {response['high_intent']})")
+
+            return JSONResponse(response)
+
+        except LLMOverloaded as e:
+            logger.warning(f"LLM gateway shed licensing_chat: {e}")
+            return _overloaded(e)
+        except Exception as e:
+            record_error("unified", "licensing_chat")
+            logger.error(f"Error in licensing chat: {e}")
+            return JSONResponse({'error': str(e)}, status_code=500)
+
+    @app.post('/api/gym/chat')
+    async def gym_chat(request: Request):
+        gym_agent = await _agent(unified.agents, 'gym_member')
+        if not gym_agent:
+            return JSONResponse({'error': 'Gym member agent not available'}, status_code=503)
+
+        try:
+            data = await _json_body(request)
+            query = data.get('query', '')
+            prospect_data = data.get('prospect_data')
+
+            if not query:
+                return JSONResponse({'error': 'Query is required'}, status_code=400)
+
+            result = await gym_agent.agenerate_response(query, prospect_data)
+
+            ghl_sent = False
+            if 'ghl_payload' in result:
+                ghl_sent = await run_in_threadpool(unified.send_to_ghl, result['ghl_payload'])
+
+            response = {
+                'response': result['response'],
+                'high_intent': result.get('high_intent', False),
+                'ghl_sent': ghl_sent
+            }
+
+            if 'recommendation' in result:
+                response['recommendation'] = result['recommendation']
+
+            if 'founders_roi' in result:
+                response['founders_roi'] = result['founders_roi']
+
+            logger.info(f"Gym query processed: {query[:50]}... (High intent: {response['high_intent']})")
+
+            return JSONResponse(response)
+
+        except LLMOverloaded as e:
+            logger.warning(f"LLM gateway shed gym_chat: {e}")
+            return _overloaded(e)
+        except Exception as e:
+            record_error("unified", "gym_chat")
+            logger.error(f"Error in gym chat: {e}")
+            return JSONResponse({'error': str(e)}, status_code=500)
+
+    @app.post('/api/events/chat')
+    async def events_chat(request: Request):
+        events_agent = await _agent(unified.agents, 'events')
+        if not events_agent:
+            return JSONResponse({'error': 'Events agent not available'}, status_code=503)
+
+        try:
+            data = await _json_body(request)
+            message = data.get('message', '')
+
+            if not message:
+                return JSONResponse({'error': 'Message is required'}, status_code=400)
+
+            import metroflex_ai_agent_enhanced as events
+            result = await events_agent.achat(message, data.get('user_id', 'anonymous'), data.get('conversation_id'))
+
+            logger.info(f"Events query processed: {message[:50]}... (High intent: {result.get('high_intent_detected', False)})")
+
+            return JSONResponse(events.chat_payload(result))
+
+        except LLMOverloaded as e:
+            logger.warning(f"LLM gateway shed events_chat: {e}")
+            return _overloaded(e)
+        except Exception as e:
+            record_error("unified", "events_chat")
+            logger.error(f"Error in events chat: {e}")
+            return JSONResponse({'error': str(e)}, status_code=500)
+
+    @app.post('/api/workflow/generate')
+    async def workflow_generate(request: Request):
+        try:
+            data = await _json_body(request)
+            if unified.wants_fast_ack(request.query_params.get('async')):
+                body, status, headers = await run_in_threadpool(unified.submit_webhook_job, 'workflow', data)
+                return JSONResponse(body, status_code=status, headers=headers)
+
+            return JSONResponse(await run_in_threadpool(unified.process_workflow, data))
+
+        except LLMOverloaded as e:
+            logger.warning(f"LLM gateway shed workflow_generate: {e}")
+            return _overloaded(e)
+        except Exception as e:
+            record_error("unified", "workflow_generate")
+            logger.error(f"Error generating workflow: {e}")
+            return JSONResponse({'error': str(e)}, status_code=500)
+
+    @app.post('/api/conversation/handle')
+    async def conversation_handle(request: Request):
+        try:
+            data = await _json_body(request)
+            if unified.wants_fast_ack(request.query_params.get('async')):
+                body, status, headers = await run_in_threadpool(unified.submit_webhook_job, 'conversation', data)
+                return JSONResponse(body, status_code=status, headers=headers)
+
+            return JSONResponse(await run_in_threadpool(unified.process_conversation, data))
+
+        except LLMOverloaded as e:
+            logger.warning(f"LLM gateway shed conversation_handle: {e}")
+            return _overloaded(e)
+        except Exception as e:
+            record_error("unified", "conversation_handle")
+            logger.error(f"Error handling conversation: {e}")
+            return JSONResponse({'error': str(e)}, status_code=500)
+
+    @app.get('/api/jobs/stats')
+    async def job_stats():
+        return JSONResponse(await run_in_threadpool(lambda: unified.get_job_queue().stats()))
+
+    @app.get('/api/jobs/{job_id}')
+    async def job_status(job_id: str):
+        job = await run_in_threadpool(unified.get_job_queue().get, job_id)
+        if job is None:
+            return JSONResponse({'error': 'Job not found'}, status_code=404)
+        return JSONResponse(job)
+
+    @app.get('/api/llm/stats')
+    async def llm_stats():
+        return JSONResponse(unified.get_llm_gateway().stats())
+
+    @app.get('/api/outbox/stats')
+    async def outbox_stats():
+        return JSONResponse(await run_in_threadpool(lambda: unified.get_outbox().stats()))
+
+    @app.get('/api/agents/status')
+    async def agents_status():
+        return JSONResponse(unified.agents_status_payload())
+
+    return app
+
+
+def create_events_app() -> FastAPI:
+    """Async counterpart of metroflex_ai_agent_enhanced:app"""
+    import metroflex_ai_agent_enhanced as events
+
+    agent = events.agent
+    app = _create_app("MetroFlex AI Assistant (Enhanced)")
+    instrument_fastapi(app, "events")
+
+    @app.post('/webhook/chat')
+    async def ghl_webhook(request: Request):
+        try:
+            data = await _json_body(request)
+            user_message = data.get('message', '')
+            user_id = data.get('user_id', 'anonymous')
+            conversation_id = data.get('conversation_id')
+            contact_info = data.get('contact_info', {})
+
+            if not user_message:
+                return JSONResponse({"error": "No message provided"}, status_code=400)
+
+            if contact_info.get('email') or contact_info.get('phone'):
+                lead_captured = await run_in_threadpool(agent.capture_lead, user_id, contact_info, conversation_id)
+
+                if lead_captured:
+                    return JSONResponse({
+                        "success": True,
+                        "response": "Thank you! I've sent your information to our team. Brian Dobson will reach out within 24 hours. In the meantime, feel free to ask any other questions!",
+                        "lead_captured": True,
+                        "timestamp": datetime.now().isoformat()
+                    })
+
+            response_data = await agent.achat(user_message, user_id, conversation_id)
+
+            return JSONResponse(events.chat_payload(response_data))
+
+        except LLMOverloaded as e:
+            return _overloaded(e)
+        except Exception as e:
+            return JSONResponse({"error": str(e)}, status_code=500)
+
+    @app.post('/webhook/chat/batch')
+    async def ghl_webhook_batch(request: Request):
+        try:
+            items, max_concurrency = events.parse_batch_request(await _json_body(request))
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+        try:
+            results = await agent.achat_batch(items, max_concurrency)
+            body, status, headers = events.batch_payload(results, max_concurrency)
+            return JSONResponse(body, status_code=status, headers=headers)
+
+        except Exception as e:
+            return JSONResponse({"error": str(e)}, status_code=500)
+
+    @app.post('/webhook/chat/stream')
+    async def ghl_webhook_stream(request: Request):
+        data = await _json_body(request)
+        user_message = data.get('message', '')
+        user_id = data.get('user_id', 'anonymous')
+        conversation_id = data.get('conversation_id')
+
+        if not user_message:
+            return JSONResponse({"error": "No message provided"}, status_code=400)
+
+        async def generate():
+            async for event in agent.achat_stream(user_message, user_id, conversation_id):
+                yield _sse(event)
+
+        return StreamingResponse(
+            generate(),
+            media_type='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    @app.get('/health')
+    async def health_check():
+        return JSONResponse({
+            "status": "healthy",
+            "agent": "MetroFlex AI Assistant (Enhanced)",
+            "version": "2.0",
+            "features": ["intent_classification", "lead_capture", "vendor_database", "rag_optimization"]
+        })
+
+    @app.get('/cache/stats')
+    async def cache_stats():
+        return JSONResponse({**agent.response_cache.stats(), **agent.query_cache.stats(),
+                             "single_flight": agent.llm_flights.stats(),
+                             "faq_direct_answers": agent.faq_answers.stats()})
+
+    @app.get('/sessions/stats')
+    async def session_stats():
+        return JSONResponse(await run_in_threadpool(agent.conversation_history.stats))
+
+    @app.get('/retrieval/stats')
+    async def retrieval_stats():
+        return JSONResponse(await run_in_threadpool(
+            lambda: {**agent.retrieval_latency.stats(), "index": agent.retrieval.stats()}))
+
+    @app.get('/outbox/stats')
+    async def outbox_stats():
+        return JSONResponse(await run_in_threadpool(lambda: events.get_outbox().stats()))
+
+    @app.post('/admin/reload-kb')
+    async def reload_knowledge_base(request: Request):
+        if not events.admin_authorized(request.headers.get('X-Admin-Key')):
+            return JSONResponse({"error": "Unauthorized"}, status_code=403)
+
+        try:
+            return JSONResponse({"success": True, **await run_in_threadpool(agent.reload_knowledge_base)})
+        except Exception as e:
+            return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+    @app.post('/webhook/test-intent')
+    async def test_intent_classification(request: Request):
+        data = await _json_body(request)
+        query = data.get('query', '')
+
+        if not query:
+            return JSONResponse({"error": "No query provided"}, status_code=400)
+
+        intent_info = agent.classify_query_intent(query)
+        high_intent = agent.detect_high_intent(query, "", intent_info)
+
+        return JSONResponse({
+            "query": query,
+            "intent": intent_info,
+            "high_intent_analysis": high_intent
+        })
+
+    return app
+
+
+def create_simple_app() -> FastAPI:
+    """Async counterpart of simple_agent_server:app"""
+    from openai import AsyncOpenAI
+    import simple_agent_server as simple
+
+    client = AsyncOpenAI(api_key=simple.OPENAI_API_KEY)
+    app = _create_app("MetroFlex AI Assistant (Simple)")
+    instrument_fastapi(app, "simple")
+
+    @app.post('/webhook/chat')
+    async def chat(request: Request):
+        try:
+            data = await _json_body(request)
+            message = data.get('message', '')
+            session_id = data.get('session_id', 'default')
+
+            if not message:
+                return JSONResponse({"error": "No message provided"}, status_code=400)
+
+            messages = await run_in_threadpool(simple.build_messages, message, session_id)
+
+            async with get_llm_gateway().aslot(INTERACTIVE):
+                response = await client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=300
+                )
+
+            assistant_message = response.choices[0].message.content
+            simple.record_turn(session_id, message, assistant_message)
+
+            return JSONResponse({
+                "success": True,
+                "response": assistant_message,
+                "timestamp": datetime.now().isoformat()
+            })
+
+        except LLMOverloaded as e:
+            return _overloaded(e)
+        except Exception as e:
+            print(f"Error: {e}")
+            return JSONResponse({
+                "success": False,
+                "error": str(e),
+                "response": ERROR_RESPONSE
+            }, status_code=500)
+
+    @app.get('/health')
+    async def health():
+        return JSONResponse({
+            "status": "healthy",
+            "agent": "MetroFlex AI Assistant (Simple)",
+            "version": "1.0"
+        })
+
+    return app
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Keyword Matcher Benchmark
+Per-message cost of the compiled keyword automaton vs the old `any()` scans
+
+Generates a deterministic set of chat/SMS-style messages, checks that the
+matcher finds exactly the categories the substring scans find, then times:
+  - legacy:  classify_query_intent + detect_high_intent, one `any()` per table
+  - matcher (cold): one automaton scan per message (every message unique)
+  - matcher (warm): repeated message, served from the per-message scan cache
+and the same for the conversation agent's OBJECTION_PATTERNS.
+
+Usage:
+    python benchmark_keyword_matcher.py [--messages 20000]
+"""
+
+import argparse
+import random
+import time
+
+from keyword_matcher import HIGH_INTENT_SIGNALS, INTENT_KEYWORDS, KeywordMatcher
+from ghl_conversation_agent import OBJECTION_PATTERNS
+
+FILLER = [
+    "hi", "hey", "so", "i", "was", "wondering", "about", "the", "show", "in", "texas", "this", "year",
+    "my", "friend", "said", "can", "you", "tell", "me", "more", "please", "thanks", "what", "is", "a",
+    "good", "way", "to", "get", "ready", "for", "stage", "and", "also", "maybe", "next", "weekend"
+]
+
+
+def make_messages(count: int, tables, seed: int = 7):
+    """Filler sentences with 0-2 keywords sprinkled in (like real traffic)"""
+    rng = random.Random(seed)
+    keywords = [keyword for table in tables for keywords in table.values() for keyword in keywords]
+    messages = []
+    for _ in range(count):
+        words = rng.choices(FILLER, k=rng.randint(6, 30))
+        for _ in range(rng.choice([0, 0, 1, 1, 2])):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        if rng.random() < 0.3:
+            words[0] = words[0].capitalize()
+        messages.append(" ".join(words) + rng.choice(["?", ".", "!", ""]))
+    return messages
+
+
+def legacy_categories(table, text):
+    text_lower = text.lower()
+    return {category for category, keywords in table.items() if any(keyword in text_lower for keyword in keywords)}
+
+
+def legacy_events_scan(text):
+    # classify_query_intent and detect_high_intent each lowercased and scanned the message
+    return legacy_categories(INTENT_KEYWORDS, text) | legacy_categories(HIGH_INTENT_SIGNALS, text)
+
+
+def time_per_message(func, messages, repeat: int = 3) -> float:
+    """Best-of-N microseconds per message"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            func(message)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages) * 1e6
+
+
+def run(name, table, legacy, messages):
+    matcher = KeywordMatcher(table, cache_size=len(messages) + 1)
+
+    mismatches = [message for message in messages if legacy(message) != set(matcher.categories(message))]
+    if mismatches:
+        raise SystemExit(f"{name}: {len(mismatches)} mismatches, e.g. {mismatches[0]!r}")
+
+    legacy_us = time_per_message(legacy, messages)
+    cold_us = time_per_message(matcher._scan_uncached, messages)
+    warm_message = messages[0]
+    warm_us = time_per_message(matcher.categories, [warm_message] * len(messages))
+
+    keyword_count = sum(len(keywords) for keywords in table.values())
+    print(f"{name} ({len(table)} categories, {keyword_count} keywords, {len(messages):,} messages, all categories identical)")
+    print(f"   legacy any() scans:   {legacy_us:7.2f} µs/message")
+    print(f"   matcher (cold):       {cold_us:7.2f} µs/message  ({legacy_us / cold_us:.1f}x)")
+    print(f"   matcher (warm cache): {warm_us:7.2f} µs/message  ({legacy_us / warm_us:.1f}x)")
+    print(f"   at 1M messages/day:   {legacy_us:.0f} s -> {cold_us:.0f} s CPU")
+    print("")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    events_table = {**INTENT_KEYWORDS, **HIGH_INTENT_SIGNALS}
+    objection_table = {objection_type: pattern["keywords"] for objection_type, pattern in OBJECTION_PATTERNS.items()}
+
+    print("🏁 Keyword matcher benchmark")
+    print("")
+    run("Events agent intent + high-intent", events_table, legacy_events_scan,
+        make_messages(args.messages, [INTENT_KEYWORDS, HIGH_INTENT_SIGNALS]))
+    run("Conversation agent objections", objection_table, lambda text: legacy_categories(objection_table, text),
+        make_messages(args.messages, [objection_table]))
+
+
+if __name__ == "__main__":
+    main()
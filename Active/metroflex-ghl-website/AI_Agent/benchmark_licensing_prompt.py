@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Licensing Prompt Benchmark
+Input tokens and latency of the full-KB vs retrieval-scoped licensing prompt
+
+Builds the licensing agent once and, for a set of typical licensing
+questions, compares the two prompt modes:
+  - full:      the whole metroflex_licensing section, pretty-printed (the old prompt)
+  - retrieval: the LICENSING_CONTEXT_SECTIONS closest KB chunks, compact JSON
+reporting input tokens per call (prompt_budget.count_tokens) and the time to
+build the prompt. With --live each question is also sent to OpenAI in both
+modes and the end-to-end generate_response() latency and the prompt tokens
+OpenAI billed are reported.
+
+Usage:
+    python benchmark_licensing_prompt.py [--kb METROFLEX_COMPLETE_KB_V3.json] [--repeat 20] [--live]
+"""
+
+import argparse
+import os
+import time
+
+from licensing_agent import LicensingQualificationAgent
+from prompt_budget import message_tokens
+
+QUESTIONS = [
+    "How much does a MetroFlex license cost?",
+    "What are the requirements to open a MetroFlex gym?",
+    "I already own a 4,000 sq ft gym, can I rebrand it as MetroFlex?",
+    "What monthly royalties and fees do licensees pay?",
+    "Walk me through the application process and timeline",
+    "Is there a discount for the first licensees?",
+    "What support do I get after opening?",
+    "How big is the exclusive territory?"
+]
+
+
+def prompt_tokens(agent: LicensingQualificationAgent, question: str) -> int:
+    return sum(message_tokens(message) for message in agent._build_messages(question))
+
+
+def time_build(agent: LicensingQualificationAgent, question: str, repeat: int) -> float:
+    """Mean ms to build the prompt"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        agent._build_messages(question)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def time_live(agent: LicensingQualificationAgent, question: str):
+    """(end-to-end ms, prompt tokens billed) of one generate_response() call"""
+    client = agent._get_openai_client()
+    create = client.chat.completions.create
+    billed = {}
+
+    def recording_create(**kwargs):
+        response = create(**kwargs)
+        billed["prompt_tokens"] = response.usage.prompt_tokens
+        return response
+
+    client.chat.completions.create = recording_create
+    try:
+        start = time.perf_counter()
+        agent.generate_response(question)
+        return (time.perf_counter() - start) * 1000, billed.get("prompt_tokens")
+    finally:
+        client.chat.completions.create = create
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--kb", default="METROFLEX_COMPLETE_KB_V3.json")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--live", action="store_true", help="also call OpenAI (needs OPENAI_API_KEY)")
+    args = parser.parse_args()
+
+    agent = LicensingQualificationAgent(os.getenv("OPENAI_API_KEY", ""), args.kb)
+    if agent.knowledge_context.mode != "retrieval":
+        raise SystemExit("Licensing KB could not be indexed, nothing to compare")
+
+    print("🏁 Licensing prompt benchmark (full KB vs retrieved sections)")
+    print(f"   {agent.knowledge_context.limit} sections per prompt, {args.repeat} builds per question")
+    print("")
+
+    totals = {"full": [0, 0.0, 0.0, 0], "retrieval": [0, 0.0, 0.0, 0]}
+    for question in QUESTIONS:
+        print(f"   {question}")
+        for mode in ("full", "retrieval"):
+            agent.knowledge_context.mode = mode
+            tokens = prompt_tokens(agent, question)
+            build_ms = time_build(agent, question, args.repeat)
+            line = f"      {mode:9}  {tokens:5} input tokens   build {build_ms:7.3f} ms"
+            totals[mode][0] += tokens
+            totals[mode][1] += build_ms
+            if args.live:
+                latency_ms, billed = time_live(agent, question)
+                totals[mode][2] += latency_ms
+                totals[mode][3] += billed or 0
+                line += f"   end-to-end {latency_ms:7.0f} ms   billed {billed} prompt tokens"
+            print(line)
+    agent.knowledge_context.mode = "retrieval"
+
+    count = len(QUESTIONS)
+    print("")
+    print("   mean per call:")
+    for mode, (tokens, build_ms, latency_ms, billed) in totals.items():
+        line = f"      {mode:9}  {tokens / count:7.1f} input tokens   build {build_ms / count:7.3f} ms"
+        if args.live:
+            line += f"   end-to-end {latency_ms / count:7.0f} ms   billed {billed / count:7.1f} prompt tokens"
+        print(line)
+    print(f"   input tokens: {totals['full'][0] / max(totals['retrieval'][0], 1):.1f}x fewer with retrieval")
+
+
+if __name__ == "__main__":
+    main()
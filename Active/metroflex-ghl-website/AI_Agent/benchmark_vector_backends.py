@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Vector Backend Benchmark
+Query latency of Chroma vs the NumPy brute-force index at KB sizes
+
+Builds both backends from the same synthetic, L2-normalised 384-dim
+embeddings (MiniLM's size) with a "category" field, then times the query
+the agents run: top-3 by cosine, unfiltered and with a category filter.
+Embeddings are passed in directly, so only the search itself is measured.
+Also reports how often both backends agree on the top-1 document (HNSW is
+approximate; the NumPy index is exact).
+
+Usage:
+    python benchmark_vector_backends.py [--sizes 100 1000 10000] [--queries 500]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from numpy_index import NumpyVectorIndex
+
+CATEGORIES = ["event", "vendor", "sponsor", "division", "general"]
+
+
+def make_corpus(count: int, dimensions: int, rng):
+    embeddings = rng.standard_normal((count, dimensions)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    ids = [f"doc_{i}" for i in range(count)]
+    documents = [f"document {i}" for i in range(count)]
+    metadatas = [{"category": CATEGORIES[i % len(CATEGORIES)]} for i in range(count)]
+    return ids, documents, metadatas, embeddings
+
+
+def time_queries(collection, queries, where=None):
+    """Per-query latencies in ms and the top-1 id of each query"""
+    latencies, top_ids = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results = collection.query(query_embeddings=[query.tolist()], n_results=3, where=where)
+        latencies.append((time.perf_counter() - start) * 1000)
+        top_ids.append(results["ids"][0][0] if results["ids"][0] else None)
+    latencies.sort()
+    return latencies, top_ids
+
+
+def summary(latencies) -> str:
+    mean = sum(latencies) / len(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return f"mean {mean:7.3f} ms   p50 {p50:7.3f} ms   p95 {p95:7.3f} ms"
+
+
+def run(size: int, query_count: int, dimensions: int, seed: int = 7):
+    import chromadb
+
+    rng = np.random.default_rng(seed)
+    ids, documents, metadatas, embeddings = make_corpus(size, dimensions, rng)
+    # Queries near real documents, like user questions near KB entries
+    queries = embeddings[rng.integers(0, size, query_count)] + 0.3 * rng.standard_normal((query_count, dimensions)).astype(np.float32)
+
+    chroma = chromadb.EphemeralClient().get_or_create_collection(
+        name=f"bench_{size}", metadata={"hnsw:space": "cosine"}
+    )
+    batch = 5000
+    start = time.perf_counter()
+    for i in range(0, size, batch):
+        chroma.add(ids=ids[i:i + batch], documents=documents[i:i + batch],
+                   metadatas=metadatas[i:i + batch], embeddings=embeddings[i:i + batch].tolist())
+    chroma_build = time.perf_counter() - start
+
+    numpy_index = NumpyVectorIndex()
+    start = time.perf_counter()
+    numpy_index.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+    numpy_build = time.perf_counter() - start
+
+    print(f"{size:,} documents ({dimensions} dims, {query_count} queries, top-3)")
+    print(f"   build:     chroma {chroma_build * 1000:9.1f} ms   numpy {numpy_build * 1000:9.1f} ms")
+
+    for label, where in [("no filter", None), ("category filter", {"category": "event"})]:
+        chroma_latencies, chroma_top = time_queries(chroma, queries, where)
+        numpy_latencies, numpy_top = time_queries(numpy_index, queries, where)
+        agreement = sum(a == b for a, b in zip(chroma_top, numpy_top)) / len(queries)
+        chroma_mean = sum(chroma_latencies) / len(chroma_latencies)
+        numpy_mean = sum(numpy_latencies) / len(numpy_latencies)
+        print(f"   {label}:")
+        print(f"      chroma  {summary(chroma_latencies)}")
+        print(f"      numpy   {summary(numpy_latencies)}   ({chroma_mean / numpy_mean:.1f}x)")
+        print(f"      top-1 agreement: {agreement:.1%}")
+    print("")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dimensions", type=int, default=384)
+    args = parser.parse_args()
+
+    print("🏁 Vector backend benchmark (Chroma HNSW vs NumPy brute force)")
+    print("")
+    for size in args.sizes:
+        run(size, args.queries, args.dimensions)
+
+
+if __name__ == "__main__":
+    main()
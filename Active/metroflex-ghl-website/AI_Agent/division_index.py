@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Division Index
+Deterministic NPC class placement from height and weight
+
+Questions like "what physique class am I at 5'8\"" used to depend on the
+LLM reading the right line of a division document, and those documents
+only list the first few height/weight classes. DivisionIndex turns every
+`weight_classes`, `height_classes` and `height_weight_classes` list of
+`npc_divisions_detailed` into sorted interval bounds once per knowledge
+base load; a lookup is a regex parse of the question plus one bisect per
+division it names. A question that names no division, or only divisions
+without readable limits, is left to the LLM.
+
+Class limits are inclusive upper bounds ("up to 5'4\"", max_weight 154),
+matching how the NPC publishes them.
+"""
+
+import math
+import re
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+KG_TO_LBS = 2.20462
+
+# Inches after the feet are 0-11, so the "215" of "6 foot 215 pounds" is not read as 6'21"
+_FEET_INCHES = re.compile(
+    r"\b([4-7])\s*(?:'|’|ft\.?|feet|foot)\s*(?:(1[01]|\d)(?!\d)(\.\d+)?\s*(?:\"|”|''|in\b|inch(?:es)?\b)?)?",
+    re.IGNORECASE
+)
+_INCHES_ONLY = re.compile(r"\b(\d{2}(?:\.\d+)?)\s*(?:\"|”|in\b|inch(?:es)?\b)", re.IGNORECASE)
+_WEIGHT = re.compile(r"\b(\d{2,3}(?:\.\d+)?)\s*(lbs?\b|pounds?\b|kgs?\b|kilos?\b)", re.IGNORECASE)
+_BARE_NUMBER = re.compile(r"(?<![\d.$])\b(\d{2,3}(?:\.\d+)?)\b(?![\d.%])")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+MIN_HEIGHT_INCHES, MAX_HEIGHT_INCHES = 48, 90
+MIN_WEIGHT_LBS, MAX_WEIGHT_LBS = 80, 400
+
+
+def parse_height(text: str) -> Tuple[Optional[float], Optional[Tuple[int, int]]]:
+    """Height in inches mentioned in `text` (5'8", 5 ft 8 in, 68 inches) and its span"""
+    for match in _FEET_INCHES.finditer(text):
+        inches = int(match.group(1)) * 12 + float((match.group(2) or "0") + (match.group(3) or ""))
+        if MIN_HEIGHT_INCHES <= inches <= MAX_HEIGHT_INCHES:
+            return inches, match.span()
+    for match in _INCHES_ONLY.finditer(text):
+        inches = float(match.group(1))
+        if MIN_HEIGHT_INCHES <= inches <= MAX_HEIGHT_INCHES:
+            return inches, match.span()
+    return None, None
+
+
+def parse_weight(text: str, height_span: Optional[Tuple[int, int]] = None) -> Optional[float]:
+    """
+    Body weight in lbs mentioned in `text` ("180 lbs", "82 kg"); a bare
+    number ("5'8 and 180") only counts when a height was given too
+    """
+    for match in _WEIGHT.finditer(text):
+        weight = float(match.group(1))
+        if match.group(2).lower().startswith("k"):
+            weight *= KG_TO_LBS
+        if MIN_WEIGHT_LBS <= weight <= MAX_WEIGHT_LBS:
+            return round(weight, 1)
+
+    if height_span is None:
+        return None
+    remainder = text[:height_span[0]] + " " + text[height_span[1]:]
+    for match in _BARE_NUMBER.finditer(remainder):
+        weight = float(match.group(1))
+        if MIN_WEIGHT_LBS <= weight <= MAX_WEIGHT_LBS:
+            return weight
+    return None
+
+
+def format_height(inches: float) -> str:
+    feet, rest = divmod(inches, 12)
+    return f"{int(feet)}'{rest:g}\""
+
+
+def _height_interval(text: str) -> Tuple[float, float]:
+    """(lower, upper] in inches of a class label like "5'4\" to 5'5\"", "up to 5'4\"", "over 5'10\"" """
+    heights = [int(feet) * 12 + float(inches or 0) for feet, inches in
+               re.findall(r"([4-7])\s*'\s*(\d{1,2}(?:\.\d+)?)?", text)]
+    if not heights:
+        heights = [float(value) for value in re.findall(r"(\d{2}(?:\.\d+)?)\s*(?:\"|in)", text)]
+    if not heights:
+        raise ValueError(f"Unrecognized height class: {text!r}")
+
+    lowered = text.lower()
+    if len(heights) >= 2:
+        return heights[0], heights[1]
+    if any(word in lowered for word in ("over", "above", "and up", "+")):
+        return heights[0], math.inf
+    return -math.inf, heights[0]
+
+
+def _numbers(value) -> List[float]:
+    return [float(n) for n in _NUMBER.findall(str(value))]
+
+
+def _weight_interval(weight_class: Dict) -> Tuple[float, float]:
+    """(lower, upper] in lbs of a weight_classes entry (max_weight, weight_range or min_weight)"""
+    if 'max_weight' in weight_class:
+        return -math.inf, _numbers(weight_class['max_weight'])[0]
+    if 'weight_range' in weight_class:
+        bounds = _numbers(weight_class['weight_range'])
+        return (bounds[0], bounds[1]) if len(bounds) >= 2 else (-math.inf, bounds[0])
+    if 'min_weight' in weight_class:
+        return _numbers(weight_class['min_weight'])[0], math.inf
+    return -math.inf, math.inf
+
+
+class _Intervals:
+    """Classes sorted by inclusive upper bound; lookup() is one bisect"""
+
+    def __init__(self, entries: List[Tuple[float, float, Dict]]):
+        entries = sorted(entries, key=lambda entry: entry[1])
+        # "max_weight: 154" after "max_weight: 143.25" means over 143.25 up to 154
+        entries = [(entries[i - 1][1] if lower == -math.inf and i else lower, upper, value)
+                   for i, (lower, upper, value) in enumerate(entries)]
+        self.lowers = [entry[0] for entry in entries]
+        self.uppers = [entry[1] for entry in entries]
+        self.values = [entry[2] for entry in entries]
+
+    def lookup(self, value: float) -> Optional[Tuple[float, float, Dict]]:
+        i = bisect_left(self.uppers, value)
+        if i == len(self.uppers):
+            return None
+        return self.lowers[i], self.uppers[i], self.values[i]
+
+
+def _describe(lower: float, upper: float, unit: str) -> str:
+    fmt = format_height if unit == "height" else (lambda lbs: f"{lbs:g} lbs")
+    if lower == -math.inf and upper == math.inf:
+        return "open"
+    if lower == -math.inf:
+        return f"up to {fmt(upper)}"
+    if upper == math.inf:
+        return f"over {fmt(lower)}"
+    return f"over {fmt(lower)} up to {fmt(upper)}"
+
+
+class DivisionIndex:
+    def __init__(self, divisions: Dict[str, Dict]):
+        """
+        Args:
+            divisions: The knowledge base's npc_divisions_detailed section
+        """
+        self.weight_classes: Dict[str, _Intervals] = {}
+        self.height_classes: Dict[str, _Intervals] = {}
+        self.height_weight_limits: Dict[str, _Intervals] = {}
+        self.aliases: Dict[str, List[str]] = {}
+        self.skipped: List[str] = []
+
+        # "classic physique" for mens_classic_physique, but not "physique",
+        # which names both mens_physique and womens_physique
+        names = {division_key: division_key.replace('_', ' ') for division_key in divisions}
+        short_names = {division_key: name.split(' ', 1)[1] for division_key, name in names.items()
+                       if name.startswith(("mens ", "womens "))}
+        for division_key, name in names.items():
+            short = short_names.get(division_key)
+            ambiguous = short in names.values() or list(short_names.values()).count(short) > 1
+            self.aliases[division_key] = [name] + ([short] if short and not ambiguous else [])
+
+        for division_key, division_data in divisions.items():
+            try:
+                if 'weight_classes' in division_data:
+                    self.weight_classes[division_key] = _Intervals([
+                        (*_weight_interval(wc), {"class": wc['class']}) for wc in division_data['weight_classes']
+                    ])
+                if 'height_classes' in division_data:
+                    self.height_classes[division_key] = _Intervals([
+                        (*_height_interval(hc['height']), {"class": hc['class']}) for hc in division_data['height_classes']
+                    ])
+                if 'height_weight_classes' in division_data:
+                    self.height_weight_limits[division_key] = _Intervals([
+                        (*_height_interval(hwc['height']), {"height": hwc['height'], "max_weight": _numbers(hwc['max_weight'])[0]})
+                        for hwc in division_data['height_weight_classes']
+                    ])
+            except (KeyError, IndexError, ValueError):
+                # Class limits in a format we can't read: that division stays LLM-only
+                self.skipped.append(division_key)
+
+    def mentioned_divisions(self, query: str) -> List[str]:
+        """
+        Divisions named in the query, with or without class limits;
+        "classic physique" does not also count as "(mens) physique"
+        """
+        text = query.lower().replace("'", "").replace("’", "")
+        spans = {}
+        for division_key, aliases in self.aliases.items():
+            for alias in aliases:
+                start = text.find(alias)
+                if start >= 0:
+                    spans[division_key] = (start, start + len(alias))
+                    break
+        return [key for key, (start, end) in spans.items()
+                if not any(other != key and o_start <= start and end <= o_end and (o_start, o_end) != (start, end)
+                           for other, (o_start, o_end) in spans.items())]
+
+    def place(self, height: Optional[float], weight: Optional[float],
+              divisions: Optional[List[str]] = None) -> List[Dict]:
+        """Class (or weight allowance) in each division that height/weight decide"""
+        placements = []
+        wanted = set(divisions) if divisions else None
+
+        if weight is not None:
+            for division_key, intervals in self.weight_classes.items():
+                if wanted is not None and division_key not in wanted:
+                    continue
+                found = intervals.lookup(weight)
+                if found:
+                    lower, upper, value = found
+                    placements.append({"division": division_key, "class": value["class"], "basis": "weight",
+                                       "limits": _describe(lower, upper, "weight")})
+
+        if height is not None:
+            for division_key, intervals in self.height_classes.items():
+                if wanted is not None and division_key not in wanted:
+                    continue
+                found = intervals.lookup(height)
+                if found:
+                    lower, upper, value = found
+                    placements.append({"division": division_key, "class": value["class"], "basis": "height",
+                                       "limits": _describe(lower, upper, "height")})
+
+            for division_key, intervals in self.height_weight_limits.items():
+                if wanted is not None and division_key not in wanted:
+                    continue
+                found = intervals.lookup(height)
+                if found:
+                    lower, upper, value = found
+                    placement = {"division": division_key, "class": value["height"], "basis": "height_weight",
+                                 "limits": _describe(lower, upper, "height"), "max_weight": value["max_weight"]}
+                    if weight is not None:
+                        placement["within_limit"] = weight <= value["max_weight"]
+                    placements.append(placement)
+
+        return placements
+
+    def lookup(self, query: str) -> Optional[Dict]:
+        """
+        Parse height/weight from a question and place them
+
+        Returns:
+            {"height_inches", "weight_lbs", "placements": [...]} or None when the
+            question has no height or weight, names no division, or none of the
+            divisions it names can place them
+        """
+        height, height_span = parse_height(query)
+        weight = parse_weight(query, height_span)
+        if height is None and weight is None:
+            return None
+        divisions = self.mentioned_divisions(query)
+        if not divisions:
+            return None
+        placements = self.place(height, weight, divisions)
+        if not placements:
+            return None
+        return {"height_inches": height, "weight_lbs": weight, "placements": placements}
+
+    @staticmethod
+    def format(result: Dict) -> str:
+        """Placement as a context document for the prompt"""
+        measured = []
+        if result["height_inches"] is not None:
+            measured.append(format_height(result["height_inches"]))
+        if result["weight_lbs"] is not None:
+            measured.append(f"{result['weight_lbs']:g} lbs")
+
+        lines = [f"NPC class placement for {' and '.join(measured)} (computed from the official class limits):"]
+        for placement in result["placements"]:
+            division = placement["division"].replace('_', ' ').title()
+            if placement["basis"] == "height_weight":
+                line = f"{division}: height class {placement['class']}, max weight {placement['max_weight']:g} lbs"
+                if "within_limit" in placement:
+                    line += " (within the limit)" if placement["within_limit"] else " (over the limit, must weigh in lighter)"
+            elif placement["basis"] == "height":
+                # "A" in npc_divisions_detailed, "Open Class A" in the events-only KB
+                label = placement["class"] if "class" in placement["class"].lower() else f"Class {placement['class']}"
+                line = f"{division}: {label} ({placement['limits']})"
+            else:
+                line = f"{division}: {placement['class']} ({placement['limits']})"
+            lines.append(line + ".")
+        return " ".join(lines)
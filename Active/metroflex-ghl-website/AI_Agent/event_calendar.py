@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Event Calendar
+Sorted in-memory calendar for date and "next event" questions
+
+Built from the knowledge base's `2025_2026_events` section on every load
+(and knowledge base reload). Events are kept sorted by date, so "next
+upcoming", "events in May" and "days until the Ronnie Coleman Classic" are
+bisect lookups against today's date, instead of vector search over event
+documents plus the LLM working out what is next from the date in its
+system prompt.
+"""
+
+import calendar
+import re
+from bisect import bisect_left
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, List, Optional, Set
+
+_DATE_FORMATS = ("%Y-%m-%d", "%B %d, %Y", "%b %d, %Y", "%A, %B %d, %Y", "%m/%d/%Y", "%B %d %Y")
+_MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+_MONTH_PATTERN = re.compile(r"\b(" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\b\.?(?:\s+(\d{4}))?",
+                            re.IGNORECASE)
+# "may" is also a verb: only count it as a month when a date word comes with it
+_AMBIGUOUS_MONTHS = {"may", "mar", "jun", "jan", "dec", "sept", "sep"}
+
+
+def parse_event_date(value) -> Optional[date]:
+    """Date of an event entry ("2026-05-16", "May 16, 2026", ...), None for TBD or unknown formats"""
+    if not isinstance(value, str):
+        return None
+    text = re.sub(r"(\d)(st|nd|rd|th)\b", r"\1", value.strip())
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+class EventCalendar:
+    def __init__(self, events: Dict[str, Dict]):
+        """
+        Args:
+            events: The knowledge base's 2025_2026_events section
+        """
+        entries = []
+        self.undated: List[str] = []
+        for event_key, event_data in events.items():
+            event_date = parse_event_date(event_data.get('date'))
+            if event_date is None:
+                self.undated.append(event_key)
+                continue
+            name = event_data.get('official_name', event_key.replace('_', ' ').title())
+            entries.append({
+                "key": event_key,
+                "name": name,
+                "aliases": self._aliases(event_key, name),
+                "date": event_date,
+                # The events-only KB has no venues; its location names the venue
+                "venue": event_data.get('venue'),
+                "location": event_data.get('location') or event_data.get('city') or 'Texas'
+            })
+
+        # A short name two events share ("ronnie coleman" of a Classic and a
+        # Masters) names neither of them
+        counts = Counter(alias for entry in entries for alias in entry["aliases"])
+        for entry in entries:
+            own = self._full_names(entry["key"], entry["name"])
+            entry["aliases"] = [alias for alias in entry["aliases"] if alias in own or counts[alias] == 1]
+
+        entries.sort(key=lambda entry: (entry["date"], entry["name"]))
+        self.events = entries
+        self.dates = [entry["date"] for entry in entries]
+
+    @staticmethod
+    def _full_names(event_key: str, name: str) -> Set[str]:
+        return {name.lower(), re.sub(r"^npc\s+", "", name.lower()), event_key.replace('_', ' ')}
+
+    @classmethod
+    def _aliases(cls, event_key: str, name: str) -> List[str]:
+        aliases = cls._full_names(event_key, name)
+        # "NPC Branch Warren Classic Houston" is usually asked about as
+        # "branch warren classic" or "branch warren": every leading run of two
+        # or more words, with or without a trailing classic/championship/show
+        words = re.sub(r"^npc\s+", "", name.lower()).split()
+        for length in range(2, len(words) + 1):
+            prefix = " ".join(words[:length])
+            aliases.add(prefix)
+            shorter = re.sub(r"\s+(classic|championships?|show)$", "", prefix)
+            if len(shorter.split()) >= 2:
+                aliases.add(shorter)
+        return sorted(aliases, key=len, reverse=True)
+
+    def upcoming(self, today: date, limit: int = 1) -> List[Dict]:
+        """Events on or after `today`, soonest first"""
+        i = bisect_left(self.dates, today)
+        return self.events[i:i + limit]
+
+    def in_month(self, year: int, month: int) -> List[Dict]:
+        start = date(year, month, 1)
+        end = date(year + month // 12, month % 12 + 1, 1)
+        return self.events[bisect_left(self.dates, start):bisect_left(self.dates, end)]
+
+    def find(self, query: str) -> Optional[Dict]:
+        """Event named in the query, by official name, key or short name ("better bodies")"""
+        text = query.lower()
+        best = None
+        for entry in self.events:
+            for alias in entry["aliases"]:
+                if alias in text and (best is None or len(alias) > best[0]):
+                    best = (len(alias), entry)
+        return best[1] if best else None
+
+    def _mentioned_month(self, query: str, today: date) -> Optional[tuple]:
+        """(year, month) asked about; without a year, the next occurrence of that month"""
+        for match in _MONTH_PATTERN.finditer(query):
+            word = match.group(1).lower()
+            if word in _AMBIGUOUS_MONTHS and not match.group(2) and not re.search(
+                    r"\b(in|during|for|of|this|next)\s+" + re.escape(match.group(1)) + r"\b", query, re.IGNORECASE):
+                continue
+            month = _MONTHS[word]
+            year = int(match.group(2)) if match.group(2) else today.year + (month < today.month)
+            return year, month
+        return None
+
+    @staticmethod
+    def _describe(entry: Dict, today: date) -> str:
+        days = (entry["date"] - today).days
+        when = "today" if days == 0 else f"in {days} days" if days > 0 else f"{-days} days ago"
+        place = ", ".join(part for part in (entry["venue"], entry["location"]) if part)
+        return f"{entry['name']}: {entry['date'].strftime('%A, %B %d, %Y')} at {place} ({when})"
+
+    def context(self, query: str, today: Optional[date] = None) -> Optional[str]:
+        """
+        Calendar facts relevant to a date question, as a context document:
+        the named event with days until it, the events of a named month, and
+        the next upcoming events
+        """
+        if not self.events:
+            return None
+        today = today or date.today()
+        lines = [f"Event calendar as of today, {today.strftime('%A, %B %d, %Y')}:"]
+
+        event = self.find(query)
+        if event:
+            lines.append(f"Asked about: {self._describe(event, today)}.")
+
+        month = self._mentioned_month(query, today)
+        if month:
+            year, number = month
+            in_month = self.in_month(year, number)
+            label = f"{calendar.month_name[number]} {year}"
+            if in_month:
+                lines.append(f"Events in {label}: " + "; ".join(self._describe(e, today) for e in in_month) + ".")
+            else:
+                lines.append(f"No events scheduled in {label}.")
+
+        upcoming = self.upcoming(today, limit=3)
+        if upcoming:
+            lines.append("Next upcoming: " + "; ".join(self._describe(e, today) for e in upcoming) + ".")
+        else:
+            lines.append("No upcoming events are scheduled yet.")
+        return " ".join(lines)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+MetroFlex FAQ Direct Answers
+Answers verbatim FAQ questions straight from the knowledge base
+
+When a question is (nearly) word for word one of the knowledge base FAQ
+entries, the entry's answer is returned without a GPT-4o-mini completion.
+Matching runs against an index of the FAQ *questions* only (the "faq"
+namespace of the shared retrieval service): the FAQ documents in the
+events namespace embed question and answer together, so even a verbatim
+question lands too far from them for a tight threshold.
+
+The cosine-distance threshold is set per intent, e.g.
+    FAQ_DIRECT_ANSWER_DISTANCE=0.1                   # all intents
+    FAQ_DIRECT_ANSWER_INTENTS=sponsor:0,datetime:0.05  # overrides, 0 disables
+Per-intent check/hit counters and the distance of every check (see
+/cache/stats and metroflex_faq_match_distance) show where to set it.
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+from metrics import record_cache, record_faq_distance
+from vector_index import sync_collection
+
+
+def faq_document(question: str, answer: str) -> str:
+    """
+    Text of an FAQ entry as indexed in the main vector database
+
+    `question` is a faq_quick_reference key ("how_to_register") or an
+    events-only KB question ("Do I need an NPC membership to compete?"); its
+    casing is kept apart from the first letter, so "NPC" stays "NPC".
+    """
+    text = question.replace('_', ' ').strip()
+    text = text[:1].upper() + text[1:]
+    if not text.endswith('?'):
+        text += '?'
+    return f"Q: {text} A: {answer}"
+
+
+def parse_intent_thresholds(spec: str) -> Dict[str, float]:
+    """'sponsor:0,datetime:0.05' -> {"sponsor": 0.0, "datetime": 0.05}"""
+    thresholds = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        intent, _, distance = item.partition(":")
+        thresholds[intent.strip()] = float(distance)
+    return thresholds
+
+
+class FAQDirectAnswers:
+    def __init__(self, index, max_distance: float = 0.1,
+                 intent_thresholds: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            index: Collection for the questions, embedded with the same encoder
+                as the query embeddings (e.g. RetrievalService.namespace("faq"))
+            max_distance: Cosine distance below which an FAQ question counts as a match
+            intent_thresholds: Per-intent overrides of max_distance (0 disables the intent)
+        """
+        self.index = index
+        self.max_distance = max_distance
+        self.intent_thresholds = intent_thresholds or {}
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def sync(self, faq: Dict[str, str]) -> Dict:
+        """Index the questions of a {question_key: answer} FAQ section (unchanged ones are reused)"""
+        questions: List[str] = []
+        metadatas: List[Dict] = []
+        for question, answer in faq.items():
+            questions.append(question.replace('_', ' '))
+            metadatas.append({"category": "faq", "question": question, "answer": answer})
+        return sync_collection(self.index, questions, metadatas)
+
+    def threshold(self, intent: str) -> float:
+        return self.intent_thresholds.get(intent, self.max_distance)
+
+    def enabled(self, intent: str) -> bool:
+        return self.threshold(intent) > 0 and self.index.count() > 0
+
+    def match(self, intent: str, query_embedding) -> Optional[Dict]:
+        """
+        Closest FAQ entry if it is within the intent's threshold
+
+        Returns:
+            {"question", "answer", "document", "metadata", "distance"} or None
+        """
+        if not self.enabled(intent):
+            return None
+
+        results = self.index.query(query_embeddings=[query_embedding], n_results=1)
+        if not results["ids"] or not results["ids"][0]:
+            return None
+        distance = results["distances"][0][0]
+        metadata = results["metadatas"][0][0]
+        hit = distance <= self.threshold(intent)
+        record_faq_distance(intent, distance)
+        record_cache("faq_direct_answer", hit)
+
+        with self._lock:
+            counters = self._counters.setdefault(intent, {"checks": 0, "hits": 0})
+            counters["checks"] += 1
+            counters["hits"] += hit
+        if not hit:
+            return None
+
+        return {
+            "question": metadata["question"],
+            "answer": metadata["answer"],
+            "document": faq_document(metadata["question"], metadata["answer"]),
+            "metadata": {"category": "faq", "question": metadata["question"]},
+            "distance": distance
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            by_intent = {
+                intent: {**counters, "hit_rate": round(counters["hits"] / counters["checks"], 4),
+                         "max_distance": self.threshold(intent)}
+                for intent, counters in self._counters.items()
+            }
+        return {
+            "entries": self.index.count(),
+            "max_distance": self.max_distance,
+            "intent_thresholds": self.intent_thresholds,
+            "by_intent": by_intent
+        }
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+MetroFlex GHL Client
+Shared HTTP client for every call to GoHighLevel
+
+One process-wide client with:
+  - a pooled keep-alive requests.Session (recreated after a fork)
+  - a token bucket matched to GHL's API limits (burst of 100 requests per
+    10 seconds per location by default), so a burst of leads or handoffs
+    is spread out instead of answered with 429s
+  - a circuit breaker: after `failure_threshold` consecutive connection
+    errors / 5xx responses calls fail fast with GHLUnavailable for
+    `reset_seconds`, then one trial request decides whether GHL is back
+  - per-call latency and error metrics (metrics.py, agent "ghl_client")
+
+Callers never wait on GHL in a request thread: lead and handoff payloads go
+through the outbox (ghl_outbox.py), whose background worker uses this
+client and puts rows back, without spending a delivery attempt, whenever
+it raises GHLUnavailable.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import record_error, time_stage
+
+
+class GHLUnavailable(Exception):
+    """GHL can't be called right now (circuit open or rate limited); retry after `retry_after` seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum burst
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float = 0.0) -> float:
+        """
+        Take one token, waiting up to `timeout` seconds for it
+
+        Returns:
+            0.0 when a token was taken, otherwise the seconds until one is available
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return 0.0
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return wait
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Empty the bucket for `seconds` (GHL answered 429 with Retry-After)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> float:
+        """0.0 if a call may go out, else seconds until the circuit half-opens"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                # Let exactly one trial call through
+                self.state = self.HALF_OPEN
+                return 0.0
+            return max(remaining, 1.0)
+
+    def cancel_trial(self):
+        """The half-open trial never reached GHL (rate limited): stay open for another reset_seconds"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class GHLClient:
+    def __init__(self, rate_per_second: float = 10.0, burst: float = 100.0, pool_size: int = 10,
+                 failure_threshold: int = 5, reset_seconds: float = 30.0, timeout: float = 10.0,
+                 max_wait_seconds: float = 5.0):
+        """
+        Args:
+            rate_per_second: Sustained request rate (GHL: 100 per 10 s per location)
+            burst: Requests allowed back to back
+            pool_size: Keep-alive connections kept per host
+            failure_threshold: Consecutive failures that open the circuit
+            reset_seconds: How long an open circuit fails fast
+            timeout: Default request timeout
+            max_wait_seconds: Longest a call waits for a rate-limit token
+        """
+        self.limiter = TokenBucket(rate_per_second, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_wait_seconds = max_wait_seconds
+
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def _http(self) -> requests.Session:
+        # Connections must not be shared across a fork: one pool per process
+        with self._session_lock:
+            if self._session is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session, self._session_pid = session, os.getpid()
+            return self._session
+
+    def post(self, url: str, data: Optional[str] = None, json: Optional[Dict] = None,
+             headers: Optional[Dict] = None, timeout: Optional[float] = None) -> requests.Response:
+        """
+        POST to GHL through the limiter and circuit breaker
+
+        Returns the response for any HTTP status (callers decide what counts as
+        delivered). Connection errors propagate as requests.RequestException.
+
+        Raises:
+            GHLUnavailable: circuit open, no rate-limit token in time, or HTTP 429
+        """
+        retry_after = self.breaker.allow()
+        if retry_after:
+            self.rejected += 1
+            record_error("ghl_client", "circuit_open")
+            raise GHLUnavailable("GHL circuit open", retry_after)
+
+        wait = self.limiter.acquire(self.max_wait_seconds)
+        if wait:
+            # Without this a trial call that never went out would leave the
+            # circuit half-open (and every later call rejected) for good
+            self.breaker.cancel_trial()
+            self.rejected += 1
+            record_error("ghl_client", "rate_limited")
+            raise GHLUnavailable("GHL rate limit reached", wait)
+
+        self.calls += 1
+        try:
+            with time_stage("ghl_client", "post"):
+                response = self._http().post(url, data=data, json=json, headers=headers,
+                                             timeout=timeout or self.timeout)
+        except requests.RequestException:
+            self.failures += 1
+            self.breaker.record_failure()
+            record_error("ghl_client", "connection")
+            raise
+
+        if response.status_code == 429:
+            try:
+                pause = float(response.headers.get("Retry-After", "10"))
+            except ValueError:
+                pause = 10.0
+            self.limiter.pause(pause)
+            self.breaker.cancel_trial()
+            record_error("ghl_client", "http_429")
+            raise GHLUnavailable("GHL answered 429", pause)
+
+        if response.status_code >= 500:
+            self.failures += 1
+            self.breaker.record_failure()
+            record_error("ghl_client", f"http_{response.status_code}")
+        else:
+            # 2xx and non-429 4xx: GHL itself is up
+            self.breaker.record_success()
+        return response
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "circuit_state": self.breaker.state,
+            "circuit_trips": self.breaker.trips,
+            "rate_per_second": self.limiter.rate,
+            "burst": self.limiter.capacity
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_ghl_client() -> GHLClient:
+    """
+    Process-wide GHL client configured from the environment
+
+    GHL_RATE_LIMIT_PER_SECOND  sustained requests/second per process (default 10)
+    GHL_RATE_LIMIT_BURST       back-to-back requests (default 100)
+    GHL_POOL_SIZE              keep-alive connections (default 10)
+    GHL_CIRCUIT_FAILURES       consecutive failures that open the circuit (default 5)
+    GHL_CIRCUIT_RESET_SECONDS  how long the open circuit fails fast (default 30)
+
+    With several Gunicorn workers each has its own bucket: divide the
+    account's limit by the worker count.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GHLClient(
+                rate_per_second=float(os.getenv("GHL_RATE_LIMIT_PER_SECOND", "10")),
+                burst=float(os.getenv("GHL_RATE_LIMIT_BURST", "100")),
+                pool_size=int(os.getenv("GHL_POOL_SIZE", "10")),
+                failure_threshold=int(os.getenv("GHL_CIRCUIT_FAILURES", "5")),
+                reset_seconds=float(os.getenv("GHL_CIRCUIT_RESET_SECONDS", "30"))
+            )
+    return _client
@@ -26,6 +26,9 @@ from typing import Dict, List, Optional
 from dataclasses import dataclass
 from datetime import datetime
 from openai import OpenAI
+from llm_gateway import INTERACTIVE, get_llm_gateway
+from metrics import record_llm_usage, time_stage
+from keyword_matcher import KeywordMatcher
 
 # Lazy initialization - only create client when needed (not at import time)
 _client = None
@@ -95,6 +98,16 @@ OBJECTION_PATTERNS = {
     }
 }
 
+# Words that escalate a conversation to a human (calculate_handoff_score)
+ESCALATION_KEYWORDS = ['terrible', 'scam', 'cancel', 'refund']
+
+# All objection keywords and the escalation words compiled into one
+# automaton (single pass per message)
+OBJECTION_MATCHER = KeywordMatcher({
+    **{objection_type: pattern["keywords"] for objection_type, pattern in OBJECTION_PATTERNS.items()},
+    "escalation": ESCALATION_KEYWORDS
+})
+
 
 # =============================================================================
 # DATA MODELS
@@ -170,14 +183,24 @@ def detect_objection(message: str) -> Dict:
     }}
     """
 
-    response = get_openai_client().chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        response_format={"type": "json_object"},
-        temperature=0.2
-    )
+    with get_llm_gateway().slot(INTERACTIVE), time_stage("conversation", "detect_objection"):
+        response = get_openai_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"},
+            temperature=0.2
+        )
+    record_llm_usage("conversation", response)
 
-    return json.loads(response.choices[0].message.content)
+    detected = json.loads(response.choices[0].message.content)
+    # Objection and escalation keywords literally present in the message are
+    # added from the keyword scan, so escalation checks don't depend on the
+    # model listing them
+    matched = list(detected.get("keywords_matched") or [])
+    for keywords in OBJECTION_MATCHER.match(message).values():
+        matched.extend(keyword for keyword in keywords if keyword not in matched)
+    detected["keywords_matched"] = matched
+    return detected
 
 
 # =============================================================================
@@ -232,12 +255,14 @@ def assess_awareness_level(
     }}
     """
 
-    response = get_openai_client().chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        response_format={"type": "json_object"},
-        temperature=0.3
-    )
+    with get_llm_gateway().slot(INTERACTIVE), time_stage("conversation", "assess_awareness_level"):
+        response = get_openai_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"},
+            temperature=0.3
+        )
+    record_llm_usage("conversation", response)
 
     return json.loads(response.choices[0].message.content)
 
@@ -374,12 +399,14 @@ def generate_response(
     }}
     """
 
-    response = get_openai_client().chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        response_format={"type": "json_object"},
-        temperature=0.7  # Higher for creative sales copy
-    )
+    with get_llm_gateway().slot(INTERACTIVE), time_stage("conversation", "generate_response"):
+        response = get_openai_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"},
+            temperature=0.7  # Higher for creative sales copy
+        )
+    record_llm_usage("conversation", response)
 
     return json.loads(response.choices[0].message.content)
 
@@ -420,7 +447,7 @@ def calculate_handoff_score(
         score += 50
         reasons.append("Frustrated sentiment detected")
 
-    if any(word in detected_objection.get('keywords_matched', []) for word in ['terrible', 'scam', 'cancel', 'refund']):
+    if any(word in detected_objection.get('keywords_matched', []) for word in ESCALATION_KEYWORDS):
         score = 98  # Critical escalation
         reasons.append("Angry keywords detected (terrible, scam, refund)")
 
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+MetroFlex GHL Outbox
+Durable, asynchronous delivery of lead payloads to GoHighLevel webhooks
+
+Chat requests only write the payload to a local SQLite table (WAL mode) and
+return. A background thread in each worker process drains the table in
+batches, retrying failed posts with exponential backoff until they are
+delivered or `max_attempts` is exhausted (then the row is kept as "dead" for
+inspection). Rows are leased while in flight, so several Gunicorn workers can
+share one outbox file without posting the same lead twice; the lease is
+renewed right before each post, so a slow batch can't outlive it. Posts go through
+the shared GHL client (ghl_client.py); while its circuit is open or the rate
+limit is reached, rows are rescheduled without spending an attempt.
+
+Usage:
+    outbox = get_outbox()
+    outbox.enqueue(webhook_url, payload)   # returns immediately
+    outbox.stats()                         # queue depth, delivery lag, failures
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from ghl_client import GHLClient, GHLUnavailable, get_ghl_client
+from metrics import record_error
+
+
+class GHLOutbox:
+    # Delivered rows older than this are deleted
+    RETENTION_SECONDS = 7 * 24 * 3600
+
+    def __init__(self, path: str = "./ghl_outbox.db", batch_size: int = 20, max_attempts: int = 8,
+                 base_backoff: float = 2.0, max_backoff: float = 600.0, poll_interval: float = 5.0,
+                 request_timeout: float = 10.0, lease_seconds: float = 60.0, client: Optional[GHLClient] = None):
+        """
+        Args:
+            path: SQLite file holding the outbox (shared by all workers on the host)
+            batch_size: Rows claimed per drain cycle
+            max_attempts: Delivery attempts before a row is marked dead
+            base_backoff: Delay before the first retry (doubles each attempt)
+            max_backoff: Upper bound for the retry delay
+            poll_interval: Idle wait between drain cycles
+            request_timeout: Timeout of each webhook POST
+            lease_seconds: How long a claimed row is reserved for one worker; renewed
+                before each post, so it must cover one post (request_timeout plus
+                the client's rate-limit wait)
+            client: GHL client to post with (default: the shared get_ghl_client())
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.request_timeout = request_timeout
+        self.lease_seconds = lease_seconds
+        self.client = client or get_ghl_client()
+        if lease_seconds <= request_timeout + self.client.max_wait_seconds:
+            raise ValueError(f"lease_seconds ({lease_seconds:g}) must exceed one post: request_timeout "
+                             f"{request_timeout:g}s + rate-limit wait {self.client.max_wait_seconds:g}s")
+
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker = None
+        self._worker_pid = None
+        self._worker_lock = threading.Lock()
+
+        conn = self._connection()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS ghl_outbox (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   url TEXT NOT NULL,
+                   payload TEXT NOT NULL,
+                   status TEXT NOT NULL DEFAULT 'pending',
+                   attempts INTEGER NOT NULL DEFAULT 0,
+                   created_at REAL NOT NULL,
+                   next_attempt_at REAL NOT NULL,
+                   lease_until REAL NOT NULL DEFAULT 0,
+                   delivered_at REAL,
+                   last_error TEXT
+               )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_ghl_outbox_due ON ghl_outbox (status, next_attempt_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, url: str, payload: Dict) -> int:
+        """Store a payload for delivery; returns the outbox row id"""
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT INTO ghl_outbox (url, payload, created_at, next_attempt_at) VALUES (?, ?, ?, ?)",
+            (url, json.dumps(payload, default=str), now, now)
+        )
+        self.start()
+        self._wake.set()
+        return cursor.lastrowid
+
+    def start(self):
+        """Start this process's background delivery thread (idempotent)"""
+        with self._worker_lock:
+            if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+                return
+            self._stop.clear()
+            self._worker = threading.Thread(target=self._run, name="ghl-outbox", daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the background thread after its current batch"""
+        self._stop.set()
+        self._wake.set()
+        if self._worker is not None and self._worker_pid == os.getpid():
+            self._worker.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                delivered = self.process_batch()
+            except Exception as e:
+                print(f"❌ GHL outbox worker error: {e}")
+                delivered = 0
+
+            # Keep draining while there is a backlog, otherwise wait for new work
+            if delivered < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _claim(self) -> Tuple[List[tuple], float]:
+        """Lease up to batch_size due rows; returns (rows, lease_until)"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """SELECT id, url, payload, attempts FROM ghl_outbox
+                   WHERE status = 'pending' AND next_attempt_at <= ? AND lease_until <= ?
+                   ORDER BY id LIMIT ?""",
+                (now, now, self.batch_size)
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE ghl_outbox SET lease_until = ? WHERE id = ?",
+                    [(now + self.lease_seconds, row[0]) for row in rows]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows, now + self.lease_seconds
+
+    def _renew(self, row_id: int, lease_until: float) -> bool:
+        """Extend the lease for one post; False if it lapsed and another worker claimed the row"""
+        cursor = self._connection().execute(
+            "UPDATE ghl_outbox SET lease_until = ? WHERE id = ? AND status = 'pending' AND lease_until = ?",
+            (time.time() + self.lease_seconds, row_id, lease_until)
+        )
+        return cursor.rowcount == 1
+
+    def process_batch(self) -> int:
+        """Claim due rows and post them; returns how many were attempted"""
+        rows, lease_until = self._claim()
+        conn = self._connection()
+
+        for row_id, url, payload, attempts in rows:
+            # Earlier posts of this batch may have used up the claim's lease
+            if not self._renew(row_id, lease_until):
+                record_error("ghl_outbox", "lease_lost")
+                continue
+            try:
+                error = self._post(url, payload)
+            except GHLUnavailable as e:
+                # GHL is down or throttling us: not this lead's fault, keep its attempts
+                conn.execute(
+                    "UPDATE ghl_outbox SET next_attempt_at = ?, last_error = ?, lease_until = 0 WHERE id = ?",
+                    (time.time() + e.retry_after, str(e), row_id)
+                )
+                continue
+            now = time.time()
+
+            if error is None:
+                conn.execute(
+                    "UPDATE ghl_outbox SET status = 'delivered', delivered_at = ?, attempts = ?, last_error = NULL WHERE id = ?",
+                    (now, attempts + 1, row_id)
+                )
+                continue
+
+            attempts += 1
+            if attempts >= self.max_attempts:
+                print(f"❌ GHL outbox giving up on #{row_id} after {attempts} attempts: {error}")
+                conn.execute(
+                    "UPDATE ghl_outbox SET status = 'dead', attempts = ?, last_error = ?, lease_until = 0 WHERE id = ?",
+                    (attempts, error, row_id)
+                )
+            else:
+                # Exponential backoff with jitter so workers don't retry in lockstep
+                delay = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+                delay *= random.uniform(0.8, 1.2)
+                conn.execute(
+                    "UPDATE ghl_outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, lease_until = 0 WHERE id = ?",
+                    (attempts, now + delay, error, row_id)
+                )
+
+        if rows:
+            conn.execute(
+                "DELETE FROM ghl_outbox WHERE status = 'delivered' AND delivered_at < ?",
+                (time.time() - self.RETENTION_SECONDS,)
+            )
+        return len(rows)
+
+    def _post(self, url: str, payload: str) -> Optional[str]:
+        """
+        POST one payload; returns None on success, else an error description
+
+        Raises:
+            GHLUnavailable: the client refused to call GHL right now
+        """
+        try:
+            response = self.client.post(
+                url, data=payload, headers={"Content-Type": "application/json"}, timeout=self.request_timeout
+            )
+        except requests.RequestException as e:
+            record_error("ghl_outbox", "webhook_post")
+            return str(e)
+        if 200 <= response.status_code < 300:
+            return None
+        record_error("ghl_outbox", "webhook_post")
+        return f"HTTP {response.status_code}"
+
+    def stats(self) -> Dict:
+        """Queue depth, delivery lag and failure counters for monitoring"""
+        now = time.time()
+        conn = self._connection()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM ghl_outbox GROUP BY status").fetchall())
+        oldest_pending, retrying = conn.execute(
+            "SELECT MIN(created_at), SUM(attempts > 0) FROM ghl_outbox WHERE status = 'pending'"
+        ).fetchone()
+        lags = [row[0] for row in conn.execute(
+            """SELECT delivered_at - created_at FROM ghl_outbox WHERE status = 'delivered'
+               ORDER BY delivered_at DESC LIMIT 100"""
+        ).fetchall()]
+        lags.sort()
+
+        return {
+            "queue_depth": counts.get("pending", 0),
+            "retrying": retrying or 0,
+            "dead": counts.get("dead", 0),
+            "delivered": counts.get("delivered", 0),
+            "oldest_pending_age_seconds": round(now - oldest_pending, 3) if oldest_pending else 0.0,
+            "delivery_lag_p50_seconds": round(lags[len(lags) // 2], 3) if lags else None,
+            "delivery_lag_max_seconds": round(lags[-1], 3) if lags else None,
+            "worker_running": self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive(),
+            "ghl_client": self.client.stats()
+        }
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox(start: bool = True) -> GHLOutbox:
+    """
+    Process-wide outbox configured from the environment, with its worker running
+
+    With start=False the worker is left to the first enqueue() (or a later
+    get_outbox()), so code that runs in a preloading Gunicorn master can hold
+    the outbox without starting a thread before the fork.
+
+    GHL_OUTBOX_PATH          SQLite file (default ./ghl_outbox.db)
+    GHL_OUTBOX_BATCH_SIZE    rows per drain cycle (default 20)
+    GHL_OUTBOX_MAX_ATTEMPTS  attempts before a lead is marked dead (default 8)
+    """
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = GHLOutbox(
+                path=os.getenv("GHL_OUTBOX_PATH", "./ghl_outbox.db"),
+                batch_size=int(os.getenv("GHL_OUTBOX_BATCH_SIZE", "20")),
+                max_attempts=int(os.getenv("GHL_OUTBOX_MAX_ATTEMPTS", "8"))
+            )
+    if start:
+        # Also drains leads left over from before a restart
+        _outbox.start()
+    return _outbox
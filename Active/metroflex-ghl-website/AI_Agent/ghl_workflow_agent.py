@@ -30,6 +30,8 @@ from typing import Dict, List, Optional
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from openai import OpenAI
+from llm_gateway import BATCH, get_llm_gateway
+from metrics import record_llm_usage, time_stage
 
 # Lazy initialization - only create client when needed (not at import time)
 _client = None
@@ -172,12 +174,14 @@ def assess_awareness_level(prospect: ProspectProfile, conversation_history: List
     }}
     """
 
-    response = get_openai_client().chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        response_format={"type": "json_object"},
-        temperature=0.3
-    )
+    with get_llm_gateway().slot(BATCH), time_stage("workflow", "assess_awareness_level"):
+        response = get_openai_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"},
+            temperature=0.3
+        )
+    record_llm_usage("workflow", response)
 
     return json.loads(response.choices[0].message.content)
 
@@ -301,12 +305,14 @@ def generate_workflow_content(
     }}
     """
 
-    response = get_openai_client().chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        response_format={"type": "json_object"},
-        temperature=0.7  # Higher creativity for copy
-    )
+    with get_llm_gateway().slot(BATCH), time_stage("workflow", "generate_workflow_content"):
+        response = get_openai_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"},
+            temperature=0.7  # Higher creativity for copy
+        )
+    record_llm_usage("workflow", response)
 
     return json.loads(response.choices[0].message.content)
 
@@ -0,0 +1,71 @@
+"""
+Gunicorn configuration for the MetroFlex agent servers
+Pre-fork model loading, so workers share the encoder and vector index
+
+Gunicorn reads this file automatically from the working directory:
+    gunicorn metroflex_ai_agent_enhanced:app
+    gunicorn unified_api_server:app
+
+With GUNICORN_PRELOAD=true (the default) the app module is imported once in
+the master: all-MiniLM-L6-v2 is loaded and the document embeddings are built
+there, then each worker is forked and shares those pages copy-on-write
+instead of loading its own copy. The garbage collector is frozen before the
+fork so collections in the workers don't touch (and copy) the shared
+objects. The NumPy index is also memory-mapped from disk, so even workers
+started later map the same page-cache pages.
+
+unified_api_server builds its AGENT_PRELOAD agents in the master too,
+synchronously, so workers share their encoder and index and only read the
+saved index. Its background threads (warmup of anything still cold, the
+restart of interrupted webhook jobs, the GHL outbox delivery thread) are
+not started in the master (a fork while those threads hold locks could hang
+a worker); post_fork() starts them in each worker instead, for either app.
+
+Set PROMETHEUS_MULTIPROC_DIR to an empty directory so /metrics reports all
+workers together (see metrics.py).
+"""
+
+import gc
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+if preload_app:
+    # Chroma keeps SQLite handles and background threads that must not cross
+    # a fork; the NumPy index is plain arrays and can be shared
+    os.environ.setdefault("VECTOR_BACKEND", "numpy")
+    # HuggingFace tokenizers' thread pool deadlocks in forked children
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    # The unified server's agents are built in the master without threads;
+    # its background threads start in each worker after the fork (post_fork)
+    os.environ["AGENT_WARMUP_AFTER_FORK"] = "true"
+    # No collections while the app is loading; the survivors are frozen in
+    # when_ready(), before the first worker is forked
+    gc.disable()
+
+
+def when_ready(server):
+    if preload_app:
+        # Move everything loaded so far into the permanent generation, so no
+        # collector (master or worker) writes to those shared pages again
+        gc.freeze()
+        gc.enable()
+        server.log.info(f"Preloaded app shared by {workers} workers ({gc.get_freeze_count()} frozen objects)")
+
+
+def post_fork(server, worker):
+    for name in ("unified_api_server", "metroflex_ai_agent_enhanced"):
+        module = sys.modules.get(name)
+        if module is not None:
+            module.start_background_work()
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges from the aggregated /metrics
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
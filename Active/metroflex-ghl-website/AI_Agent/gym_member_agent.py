@@ -4,15 +4,24 @@ MetroFlex Gym Member Onboarding Agent
 Purpose: Convert prospects into Miami members + reduce churn
 Revenue Impact: $175k-$250k in Year 1 (70-100 Founder's @ $2,500)
 Time-Sensitive: Founder's deadline May 15, 2026
+
+Prompts carry the GYM_CONTEXT_SECTIONS knowledge base chunks closest to the
+question, from the "gym" namespace (GYM_PROMPT_MODE=full sends the whole
+metroflex_gym_miami section instead).
 """
 
+import asyncio
 import os
 import json
 import logging
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+from llm_gateway import INTERACTIVE, get_llm_gateway
+from metrics import record_llm_usage, record_prompt_tokens, time_stage
+from prompt_budget import message_tokens
+from retrieval_service import SectionContext
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -43,9 +52,16 @@ class GymMemberOnboardingAgent:
     5. High-intent detection → GHL
     """
 
-    def __init__(self, openai_api_key: str, knowledge_base_path: str):
+    def __init__(self, openai_api_key: str, knowledge_base_path: str, retrieval=None):
+        """
+        Args:
+            openai_api_key: OpenAI API key
+            knowledge_base_path: KB JSON holding the metroflex_gym_miami section
+            retrieval: RetrievalService for the KB chunks (default: the process-wide one)
+        """
         self.api_key = openai_api_key
         self._client = None  # Lazy initialization
+        self._async_client = None
         self.knowledge_base = self._load_knowledge_base(knowledge_base_path)
         self.model = "gpt-4o-mini"
 
@@ -53,6 +69,13 @@ class GymMemberOnboardingAgent:
         self.founders_total = 100
         self.founders_deadline = datetime(2026, 5, 15)
 
+        self.knowledge_context = SectionContext(
+            "gym", self.knowledge_base, "membership_tiers", "tier",
+            mode=os.getenv('GYM_PROMPT_MODE', 'retrieval').lower(),
+            limit=int(os.getenv('GYM_CONTEXT_SECTIONS', '3')),
+            retrieval=retrieval
+        )
+
     def _get_openai_client(self):
         """Get or create OpenAI client (lazy initialization)"""
         if self._client is None:
@@ -61,11 +84,22 @@ class GymMemberOnboardingAgent:
             self._client = OpenAI(api_key=self.api_key)
         return self._client
 
+    def _get_async_openai_client(self):
+        """Get or create AsyncOpenAI client (ASGI serving mode)"""
+        if self._async_client is None:
+            if not self.api_key:
+                raise ValueError("OPENAI_API_KEY not provided")
+            self._async_client = AsyncOpenAI(api_key=self.api_key)
+        return self._async_client
+
     def _load_knowledge_base(self, path: str) -> Dict:
         """Load gym knowledge base"""
         with open(path, 'r') as f:
             kb = json.load(f)
-        return kb.get('metroflex_gym_miami', {})
+        gym = kb.get('metroflex_gym_miami', {})
+        if not gym:
+            logger.warning(f"⚠️ No metroflex_gym_miami section in {path}")
+        return gym
 
     def calculate_membership_recommendation(self, prospect: MemberProspect) -> Dict:
         """
@@ -173,25 +207,15 @@ After that? FREE FOREVER. That's the Founder's advantage.
 
         return roi
 
-    def generate_response(self, query: str, prospect_data: Optional[Dict] = None) -> Dict:
-        """
-        Generate AI response for gym membership inquiry
-
-        Returns:
-        {
-            'response': str,
-            'recommendation': dict (if prospect data provided),
-            'high_intent': bool,
-            'ghl_payload': dict (if high-intent)
-        }
-        """
+    def _build_messages(self, query: str) -> List[Dict]:
+        """System prompt with the relevant knowledge base sections plus the user query"""
         # System prompt
         system_prompt = f"""You are the MetroFlex Miami Gym Member Onboarding Agent.
 
 Your mission: Convert prospects into members and create FOMO for Founder's memberships.
 
 KNOWLEDGE BASE:
-{json.dumps(self.knowledge_base, indent=2)}
+{self.knowledge_context.text(query)}
 
 TONE: Motivational, legacy-focused, urgent (for Founder's)
 
@@ -231,6 +255,15 @@ NEXT STEPS:
 
 Always emphasize the MetroFlex legacy and community."""
 
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": query}
+        ]
+        record_prompt_tokens("gym", sum(message_tokens(message) for message in messages))
+        return messages
+
+    def _build_result(self, query: str, ai_response: str, prospect_data: Optional[Dict] = None) -> Dict:
+        """Attach high-intent detection, scoring and the GHL payload to the AI response"""
         # Detect high-intent
         high_intent_keywords = [
             'join', 'membership', 'sign up', 'how much', 'cost', 'price',
@@ -239,21 +272,6 @@ Always emphasize the MetroFlex legacy and community."""
 
         high_intent = any(keyword in query.lower() for keyword in high_intent_keywords)
 
-        # Generate AI response
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": query}
-        ]
-
-        response = self._get_openai_client().chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=700
-        )
-
-        ai_response = response.choices[0].message.content
-
         result = {
             'response': ai_response,
             'high_intent': high_intent
@@ -304,11 +322,51 @@ Always emphasize the MetroFlex legacy and community."""
 
         return result
 
+    def generate_response(self, query: str, prospect_data: Optional[Dict] = None) -> Dict:
+        """
+        Generate AI response for gym membership inquiry
+
+        Returns:
+        {
+            'response': str,
+            'recommendation': dict (if prospect data provided),
+            'high_intent': bool,
+            'ghl_payload': dict (if high-intent)
+        }
+        """
+        messages = self._build_messages(query)
+        with get_llm_gateway().slot(INTERACTIVE), time_stage("gym", "llm_completion"):
+            response = self._get_openai_client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=700
+            )
+        record_llm_usage("gym", response, self.model)
+
+        return self._build_result(query, response.choices[0].message.content, prospect_data)
+
+    async def agenerate_response(self, query: str, prospect_data: Optional[Dict] = None) -> Dict:
+        """Async variant of generate_response() for the ASGI server"""
+        # Query encoding runs in a worker thread, not on the event loop
+        messages = await asyncio.to_thread(self._build_messages, query)
+        async with get_llm_gateway().aslot(INTERACTIVE):
+            with time_stage("gym", "llm_completion"):
+                response = await self._get_async_openai_client().chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=700
+                )
+        record_llm_usage("gym", response, self.model)
+
+        return self._build_result(query, response.choices[0].message.content, prospect_data)
+
 
 def main():
     """Test the Gym Member Agent"""
     api_key = os.getenv('OPENAI_API_KEY')
-    kb_path = 'METROFLEX_GYM_KB_V1.json'
+    kb_path = 'METROFLEX_COMPLETE_KB_V3.json'
 
     agent = GymMemberOnboardingAgent(api_key, kb_path)
 
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Keyword Matcher
+Single-pass keyword classification for the agents' intent and objection tables
+
+A table maps category -> keywords. All keywords of a table are compiled once
+into one trie-shaped regex, so a message is scanned a single time no matter
+how many categories and keywords there are, and every matching category is
+returned. Matching keeps the semantics of the `keyword in text.lower()`
+chains it replaces: plain case-insensitive substrings, overlaps included.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """Regex alternation shaped like a trie, preferring the longest keyword"""
+    trie: Dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}  # end of keyword
+
+    def build(node: Dict) -> str:
+        terminal = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if terminal:
+            # Optional, greedy: a longer keyword wins over its own prefix
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    def __init__(self, table: Dict[str, Iterable[str]], cache_size: int = 2048):
+        """
+        Args:
+            table: category -> keywords (case-insensitive substrings)
+            cache_size: Number of recent messages whose scan result is kept,
+                so classifying the same message several times costs one scan
+        """
+        self.table = {category: [keyword.lower() for keyword in keywords] for category, keywords in table.items()}
+
+        categories_by_keyword: Dict[str, set] = {}
+        for category, keywords in self.table.items():
+            for keyword in keywords:
+                categories_by_keyword.setdefault(keyword, set()).add(category)
+
+        # The regex reports the longest keyword starting at each position;
+        # every shorter keyword that is a prefix of it matched there too
+        self._hits: Dict[str, Tuple[Tuple[str, str], ...]] = {}
+        for keyword in categories_by_keyword:
+            hits = []
+            for prefix, categories in categories_by_keyword.items():
+                if keyword.startswith(prefix):
+                    hits.extend((category, prefix) for category in categories)
+            self._hits[keyword] = tuple(hits)
+
+        pattern = _trie_pattern(categories_by_keyword) if categories_by_keyword else '(?!)'
+        self._regex = re.compile('(?=(' + pattern + '))')
+        self._scan = lru_cache(maxsize=cache_size)(self._scan_uncached)
+
+    def _scan_uncached(self, text: str) -> Tuple[Tuple[str, str], ...]:
+        found = {}
+        for match in self._regex.finditer(text.lower()):
+            for hit in self._hits[match.group(1)]:
+                found[hit] = None  # ordered set
+        return tuple(found)
+
+    def categories(self, text: str) -> FrozenSet[str]:
+        """Every category with at least one keyword in the text"""
+        return frozenset(category for category, _ in self._scan(text))
+
+    def match(self, text: str) -> Dict[str, List[str]]:
+        """category -> keywords found in the text, for matching categories only"""
+        matched: Dict[str, List[str]] = {}
+        for category, keyword in self._scan(text):
+            if keyword not in matched.setdefault(category, []):
+                matched[category].append(keyword)
+        return matched
+
+
+# Events agent (metroflex_ai_agent_enhanced.py) keyword tables.
+# Intent categories are in priority order: classify_query_intent returns the first match
+INTENT_KEYWORDS = {
+    "datetime": ['when', 'date', 'schedule', 'time', 'day', 'next event', 'upcoming'],
+    "registration": ['register', 'sign up', 'entry', 'how to compete', 'join', 'participate'],
+    "division_rules": ['division', 'class', 'category', 'mens physique', 'bikini', 'bodybuilding',
+                       'figure', 'wellness', 'classic physique', 'womens physique'],
+    "sponsor": ['sponsor', 'vendor booth', 'exhibitor', 'partner', 'sponsorship package'],
+    "vendor_services": ['spray tan', 'tanning', 'photographer', 'photography', 'hair', 'makeup',
+                        'posing suit', 'coach', 'meal prep', 'hotel'],
+    "legacy": ['ronnie', 'history', 'legacy', 'mr olympia', 'brian dobson', 'branch warren'],
+    "first_timer": ['first time', 'beginner', 'new to', 'never competed', 'first show'],
+    "tickets": ['ticket', 'spectator', 'watch', 'attend', 'admission', 'seating']
+}
+
+HIGH_INTENT_SIGNALS = {
+    "sponsor_inquiry": ["sponsor", "vendor booth", "exhibitor", "partnership", "package", "how much"],
+    "competitor_registration": ["sign up", "register", "compete", "enter", "how do i join"],
+    "ticket_purchase": ["buy tickets", "ticket price", "how much", "cost", "purchase tickets"],
+    "vendor_inquiry": ["vendor booth", "booth space", "exhibit", "sell products"],
+    "coaching_inquiry": ["coach", "trainer", "prep coach", "hire coach"],
+    "first_timer_serious": ["ready to compete", "want to compete", "first show", "prepare for"]
+}
+
+# Both events-agent tables in one automaton: a message is scanned once per turn
+EVENTS_KEYWORD_MATCHER = KeywordMatcher({**INTENT_KEYWORDS, **HIGH_INTENT_SIGNALS})
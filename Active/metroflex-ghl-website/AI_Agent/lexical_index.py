@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Lexical Index
+In-memory BM25 index over the same documents as the vector database
+
+Questions that name an exact entity ("Ronnie Coleman Classic date",
+"Branch Warren hotel") are answered from this index alone when the best
+BM25 hit is a confident, clear winner, which skips the MiniLM encoder and
+the Chroma query. Otherwise the BM25 ranking is fused with the vector
+ranking (reciprocal rank fusion). RetrievalLatency records per-path timings
+so the saved encoder time is visible.
+"""
+
+import math
+import re
+import threading
+from collections import defaultdict, deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about am an and any are as at be been but by can could do does for from get
+had has have how i if in is it its me my of on or our should so than that the
+their them there these they this to us was we were what when where which who
+why will with would you your
+""".split())
+
+# Words that say which attribute of an entity is wanted ("Ronnie Coleman Classic
+# date") rather than name it; ignored in queries so they don't count as misses
+QUERY_ATTRIBUTE_WORDS = frozenset("""
+address cost date day detail fee info information location price schedule time venue
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords, with a light plural strip"""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    def __init__(self, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[Dict],
+                 k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            ids, documents, metadatas: Same (deduplicated) rows as the vector collection
+            k1, b: BM25 term-frequency saturation and length normalisation
+        """
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = list(metadatas)
+        self.k1 = k1
+        self.b = b
+
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)  # term -> [(doc, tf)]
+        self._lengths: List[int] = []
+        for position, document in enumerate(self.documents):
+            counts: Dict[str, int] = defaultdict(int)
+            tokens = tokenize(document)
+            for token in tokens:
+                counts[token] += 1
+            for token, count in counts.items():
+                self._postings[token].append((position, count))
+            self._lengths.append(len(tokens))
+
+        total = len(self.documents)
+        self._avg_length = (sum(self._lengths) / total) if total else 0.0
+        self._idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(self, query: str, n_results: int = 3, category: Optional[str] = None) -> List[Dict]:
+        """
+        Top documents by BM25 score
+
+        Returns:
+            [{"id", "document", "metadata", "score", "coverage"}] best first, where
+            coverage is the IDF-weighted share of the query's terms found in that
+            document (terms the index has never seen count as rare and unmatched)
+        """
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term not in QUERY_ATTRIBUTE_WORDS]
+        if not terms or not self.documents:
+            return []
+
+        unseen_idf = math.log(1 + (len(self.documents) + 0.5) / 0.5)
+        total_weight = sum(self._idf.get(term, unseen_idf) for term in terms)
+
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, float] = defaultdict(float)
+        for term in terms:
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for position, tf in self._postings[term]:
+                if category and self.metadatas[position].get("category") != category:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[position] / self._avg_length)
+                scores[position] += idf * tf * (self.k1 + 1) / (tf + norm)
+                matched[position] += idf
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        return [
+            {
+                "id": self.ids[position],
+                "document": self.documents[position],
+                "metadata": self.metadatas[position],
+                "score": score,
+                "coverage": matched[position] / total_weight
+            }
+            for position, score in ranked
+        ]
+
+    @staticmethod
+    def is_confident(hits: List[Dict], min_score: float = 4.0, min_coverage: float = 0.6,
+                     margin: float = 1.5) -> bool:
+        """
+        True when the top hit can be trusted without the vector search: a high
+        absolute score, most query terms present, and a clear lead over the runner-up
+        """
+        if not hits:
+            return False
+        top = hits[0]
+        if top["score"] < min_score or top["coverage"] < min_coverage:
+            return False
+        return len(hits) < 2 or top["score"] >= margin * hits[1]["score"]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """Merge several best-first id rankings into one (RRF)"""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class RetrievalLatency:
+    """Per-path, per-stage latency samples (most recent `window` of each)"""
+
+    def __init__(self, window: int = 1000):
+        self._samples: Dict[Tuple[str, str], deque] = {}
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._window = window
+        self._lock = threading.Lock()
+
+    def record(self, path: str, stages: Dict[str, float]):
+        """Record one retrieval: path name plus seconds spent in each stage"""
+        with self._lock:
+            self._counts[path] += 1
+            for stage, seconds in stages.items():
+                samples = self._samples.setdefault((path, stage), deque(maxlen=self._window))
+                samples.append(seconds)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            paths = {}
+            for (path, stage), samples in self._samples.items():
+                ordered = sorted(samples)
+                paths.setdefault(path, {"count": self._counts[path], "stages_ms": {}})["stages_ms"][stage] = {
+                    "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+                    "p50": round(ordered[len(ordered) // 2] * 1000, 3),
+                    "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3)
+                }
+            return paths
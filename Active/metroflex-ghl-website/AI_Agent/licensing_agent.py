@@ -3,14 +3,27 @@
 MetroFlex Licensing Qualification Agent
 Purpose: Qualify and nurture high-value licensing leads ($40,000-$60,000 per deal)
 Revenue Impact: $120k-$600k in Year 1
+
+The metroflex_licensing knowledge base is chunked once at init (one chunk
+per section, one per licensing package) and indexed in the "licensing"
+namespace of the shared retrieval service (retrieval_service.SectionContext).
+Each prompt carries only the LICENSING_CONTEXT_SECTIONS chunks closest to
+the question, as compact JSON, instead of the whole section pretty-printed.
+LICENSING_PROMPT_MODE=full restores the whole-KB prompt
+(benchmark_licensing_prompt.py compares both).
 """
 
+import asyncio
 import os
 import json
 import logging
 from typing import Dict, List, Optional
 from dataclasses import dataclass
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+from llm_gateway import INTERACTIVE, get_llm_gateway
+from metrics import record_llm_usage, record_prompt_tokens, time_stage
+from prompt_budget import message_tokens
+from retrieval_service import SectionContext
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -44,12 +57,26 @@ class LicensingQualificationAgent:
     5. High-intent detection → GHL webhook
     """
 
-    def __init__(self, openai_api_key: str, knowledge_base_path: str):
+    def __init__(self, openai_api_key: str, knowledge_base_path: str, retrieval=None):
+        """
+        Args:
+            openai_api_key: OpenAI API key
+            knowledge_base_path: KB JSON holding the metroflex_licensing section
+            retrieval: RetrievalService for the KB chunks (default: the process-wide one)
+        """
         self.api_key = openai_api_key
         self._client = None  # Lazy initialization
+        self._async_client = None
         self.knowledge_base = self._load_knowledge_base(knowledge_base_path)
         self.model = "gpt-4o-mini"
 
+        self.knowledge_context = SectionContext(
+            "licensing", self.knowledge_base, "licensing_packages", "package",
+            mode=os.getenv('LICENSING_PROMPT_MODE', 'retrieval').lower(),
+            limit=int(os.getenv('LICENSING_CONTEXT_SECTIONS', '3')),
+            retrieval=retrieval
+        )
+
     def _get_openai_client(self):
         """Get or create OpenAI client (lazy initialization)"""
         if self._client is None:
@@ -58,11 +85,22 @@ class LicensingQualificationAgent:
             self._client = OpenAI(api_key=self.api_key)
         return self._client
 
+    def _get_async_openai_client(self):
+        """Get or create AsyncOpenAI client (ASGI serving mode)"""
+        if self._async_client is None:
+            if not self.api_key:
+                raise ValueError("OPENAI_API_KEY not provided")
+            self._async_client = AsyncOpenAI(api_key=self.api_key)
+        return self._async_client
+
     def _load_knowledge_base(self, path: str) -> Dict:
         """Load licensing knowledge base"""
         with open(path, 'r') as f:
             kb = json.load(f)
-        return kb.get('metroflex_licensing', {})
+        licensing = kb.get('metroflex_licensing', {})
+        if not licensing:
+            logger.warning(f"⚠️ No metroflex_licensing section in {path}")
+        return licensing
 
     def calculate_qualification_score(self, lead: LicensingLead) -> Dict:
         """
@@ -163,25 +201,15 @@ class LicensingQualificationAgent:
 
         return {}
 
-    def generate_response(self, query: str, lead_data: Optional[Dict] = None) -> Dict:
-        """
-        Generate AI response for licensing inquiry
-
-        Returns:
-        {
-            'response': str,
-            'qualification_score': dict (if lead data provided),
-            'high_intent': bool,
-            'ghl_payload': dict (if high-intent)
-        }
-        """
+    def _build_messages(self, query: str) -> List[Dict]:
+        """System prompt with the relevant knowledge base sections plus the user query"""
         # Build system prompt with knowledge base
         system_prompt = f"""You are the MetroFlex Licensing Qualification Agent.
 
 Your mission: Qualify high-value licensing leads and guide them through the application process.
 
 KNOWLEDGE BASE:
-{json.dumps(self.knowledge_base, indent=2)}
+{self.knowledge_context.text(query)}
 
 TONE: Professional, encouraging, legacy-focused (Ronnie Coleman, Branch Warren heritage)
 
@@ -210,6 +238,15 @@ NEXT STEPS:
 
 Always calculate ROI and emphasize the MetroFlex legacy."""
 
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": query}
+        ]
+        record_prompt_tokens("licensing", sum(message_tokens(message) for message in messages))
+        return messages
+
+    def _build_result(self, query: str, ai_response: str, lead_data: Optional[Dict] = None) -> Dict:
+        """Attach high-intent detection, scoring and the GHL payload to the AI response"""
         # Detect high-intent
         high_intent_keywords = [
             'open a gym', 'franchise', 'licensing', 'licensee',
@@ -219,21 +256,6 @@ Always calculate ROI and emphasize the MetroFlex legacy."""
 
         high_intent = any(keyword in query.lower() for keyword in high_intent_keywords)
 
-        # Generate AI response
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": query}
-        ]
-
-        response = self._get_openai_client().chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=800
-        )
-
-        ai_response = response.choices[0].message.content
-
         result = {
             'response': ai_response,
             'high_intent': high_intent
@@ -277,12 +299,52 @@ Always calculate ROI and emphasize the MetroFlex legacy."""
 
         return result
 
+    def generate_response(self, query: str, lead_data: Optional[Dict] = None) -> Dict:
+        """
+        Generate AI response for licensing inquiry
+
+        Returns:
+        {
+            'response': str,
+            'qualification_score': dict (if lead data provided),
+            'high_intent': bool,
+            'ghl_payload': dict (if high-intent)
+        }
+        """
+        messages = self._build_messages(query)
+        with get_llm_gateway().slot(INTERACTIVE), time_stage("licensing", "llm_completion"):
+            response = self._get_openai_client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=800
+            )
+        record_llm_usage("licensing", response, self.model)
+
+        return self._build_result(query, response.choices[0].message.content, lead_data)
+
+    async def agenerate_response(self, query: str, lead_data: Optional[Dict] = None) -> Dict:
+        """Async variant of generate_response() for the ASGI server"""
+        # Query encoding runs in a worker thread, not on the event loop
+        messages = await asyncio.to_thread(self._build_messages, query)
+        async with get_llm_gateway().aslot(INTERACTIVE):
+            with time_stage("licensing", "llm_completion"):
+                response = await self._get_async_openai_client().chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=800
+                )
+        record_llm_usage("licensing", response, self.model)
+
+        return self._build_result(query, response.choices[0].message.content, lead_data)
+
 
 def main():
     """Test the Licensing Agent"""
     # Test configuration
     api_key = os.getenv('OPENAI_API_KEY')
-    kb_path = 'METROFLEX_EVENTS_KB_V3_EVENTS_ONLY.json'  # Will be updated with licensing KB
+    kb_path = 'METROFLEX_COMPLETE_KB_V3.json'  # Holds the metroflex_licensing section
 
     agent = LicensingQualificationAgent(api_key, kb_path)
 
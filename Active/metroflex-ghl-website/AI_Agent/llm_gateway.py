@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+MetroFlex LLM Gateway
+Process-wide admission control for every OpenAI call
+
+All agents share one OpenAI rate limit. Without coordination a burst of
+workflow generation (several completions per workflow) can use it up and
+leave the SMS objection handler and the chat agents waiting behind it.
+Every completion now takes a slot from the gateway first:
+
+  - priority classes: "interactive" (events/licensing/gym chat, SMS
+    conversation handling) is always dispatched before "batch" (workflow
+    generation, batch chat)
+  - per-class concurrency limits under one overall limit; keeping the batch
+    limit below the overall limit reserves slots for interactive traffic
+  - queue-depth shedding: when a class already has `max_queue` callers
+    waiting (or a caller waits longer than `max_wait_seconds`) the call
+    fails fast with LLMOverloaded, which the servers answer with
+    429 + Retry-After
+  - queue wait time per class in metroflex_llm_queue_wait_seconds
+
+Sync callers (Flask threads, job workers) and async callers (ASGI) share
+the same slots. Limits are per process: with several Gunicorn workers,
+divide the account's budget by the worker count.
+
+Usage:
+    with get_llm_gateway().slot(INTERACTIVE):
+        response = client.chat.completions.create(...)
+
+    async with get_llm_gateway().aslot(BATCH):
+        response = await async_client.chat.completions.create(...)
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional, Tuple
+
+from metrics import record_error, record_llm_queue_wait
+
+INTERACTIVE, BATCH = "interactive", "batch"
+# Highest priority first
+PRIORITIES = (INTERACTIVE, BATCH)
+
+
+class LLMOverloaded(Exception):
+    """Too many LLM calls queued for this priority; retry after `retry_after` seconds"""
+
+    def __init__(self, message: str, priority: str, retry_after: int):
+        super().__init__(message)
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+def overloaded_response(error: LLMOverloaded) -> Tuple[Dict, int, Dict]:
+    """(body, 429, headers) for a route whose LLM call was shed"""
+    body = {
+        "error": "Too many requests in progress, retry later",
+        "priority": error.priority,
+        "retry_after": error.retry_after
+    }
+    return body, 429, {"Retry-After": str(error.retry_after)}
+
+
+class _Ticket:
+    """One queued caller, woken through a threading.Event or an asyncio future"""
+
+    def __init__(self, priority: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        self.granted = False
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+
+    def grant(self):
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class LLMGateway:
+    def __init__(self, max_concurrency: int = 8, class_limits: Optional[Dict[str, int]] = None,
+                 max_queue: Optional[Dict[str, int]] = None, max_wait_seconds: float = 30.0):
+        """
+        Args:
+            max_concurrency: LLM calls in flight across all classes
+            class_limits: Calls in flight per priority class
+            max_queue: Callers allowed to wait per class before new ones are shed
+            max_wait_seconds: Longest a caller waits for a slot before it is shed
+        """
+        self.max_concurrency = max_concurrency
+        self.class_limits = {INTERACTIVE: max_concurrency, BATCH: max(1, max_concurrency // 4)}
+        self.class_limits.update(class_limits or {})
+        self.max_queue = {INTERACTIVE: 32, BATCH: 8}
+        self.max_queue.update(max_queue or {})
+        self.max_wait_seconds = max_wait_seconds
+
+        self._lock = threading.Lock()
+        self._active = {priority: 0 for priority in PRIORITIES}
+        self._waiting = {priority: deque() for priority in PRIORITIES}
+        # Moving average of how long a call holds its slot, for Retry-After
+        self._hold_seconds = {priority: 2.0 for priority in PRIORITIES}
+        self._counters = {priority: {"admitted": 0, "queued": 0, "shed": 0} for priority in PRIORITIES}
+
+    def _check_priority(self, priority: str):
+        if priority not in self._active:
+            raise ValueError(f"Unknown LLM priority class: {priority}")
+
+    def _can_run(self, priority: str) -> bool:
+        return (sum(self._active.values()) < self.max_concurrency
+                and self._active[priority] < self.class_limits[priority])
+
+    def _retry_after(self, priority: str) -> int:
+        backlog = len(self._waiting[priority]) + 1
+        return max(1, math.ceil(backlog * self._hold_seconds[priority] / self.class_limits[priority]))
+
+    def _shed(self, priority: str, reason: str) -> LLMOverloaded:
+        self._counters[priority]["shed"] += 1
+        record_error("llm_gateway", f"shed_{priority}")
+        return LLMOverloaded(f"LLM gateway overloaded ({priority}: {reason})", priority,
+                             self._retry_after(priority))
+
+    def _enter(self, priority: str, loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[_Ticket]:
+        """Take a slot now (None) or queue a ticket; raises LLMOverloaded when the queue is full"""
+        self._check_priority(priority)
+        with self._lock:
+            # Nobody of this class is queued ahead, and a queued higher class
+            # could only be blocked by limits that block this call too
+            if not self._waiting[priority] and self._can_run(priority):
+                self._active[priority] += 1
+                self._counters[priority]["admitted"] += 1
+                return None
+            if len(self._waiting[priority]) >= self.max_queue[priority]:
+                raise self._shed(priority, f"{len(self._waiting[priority])} queued")
+            ticket = _Ticket(priority, loop)
+            self._waiting[priority].append(ticket)
+            self._counters[priority]["queued"] += 1
+            return ticket
+
+    def _abandon(self, ticket: _Ticket) -> bool:
+        """Drop a ticket that stopped waiting; True if it was granted meanwhile (the caller owns a slot)"""
+        with self._lock:
+            if ticket.granted:
+                return True
+            self._waiting[ticket.priority].remove(ticket)
+            return False
+
+    def _dispatch(self):
+        # Called with the lock held: hand free slots to the highest classes first
+        for priority in PRIORITIES:
+            waiting = self._waiting[priority]
+            while waiting and self._can_run(priority):
+                ticket = waiting.popleft()
+                self._active[priority] += 1
+                self._counters[priority]["admitted"] += 1
+                ticket.grant()
+
+    def release(self, priority: str, held_seconds: float):
+        with self._lock:
+            self._active[priority] -= 1
+            self._hold_seconds[priority] = 0.8 * self._hold_seconds[priority] + 0.2 * held_seconds
+            self._dispatch()
+
+    def acquire(self, priority: str) -> float:
+        """
+        Wait for a slot in `priority`
+
+        Returns:
+            Seconds spent queued
+
+        Raises:
+            LLMOverloaded: the class queue is full or the wait exceeded max_wait_seconds
+        """
+        start_time = time.perf_counter()
+        ticket = self._enter(priority)
+        if ticket is not None and not ticket.event.wait(self.max_wait_seconds):
+            if not self._abandon(ticket):
+                with self._lock:
+                    raise self._shed(priority, f"waited {self.max_wait_seconds:g}s")
+        waited = time.perf_counter() - start_time
+        record_llm_queue_wait(priority, waited)
+        return waited
+
+    async def aacquire(self, priority: str) -> float:
+        """Async variant of acquire(); waiting does not hold a thread"""
+        start_time = time.perf_counter()
+        ticket = self._enter(priority, asyncio.get_running_loop())
+        if ticket is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket.future), self.max_wait_seconds)
+            except asyncio.TimeoutError:
+                if not self._abandon(ticket):
+                    with self._lock:
+                        raise self._shed(priority, f"waited {self.max_wait_seconds:g}s")
+            except asyncio.CancelledError:
+                # Client went away: give back a slot granted in the meantime
+                if self._abandon(ticket):
+                    self.release(priority, 0.0)
+                raise
+        waited = time.perf_counter() - start_time
+        record_llm_queue_wait(priority, waited)
+        return waited
+
+    @contextmanager
+    def slot(self, priority: str):
+        """Hold one LLM slot of `priority` for the `with` block"""
+        self.acquire(priority)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(priority, time.perf_counter() - start_time)
+
+    @asynccontextmanager
+    async def aslot(self, priority: str):
+        """Async variant of slot()"""
+        await self.aacquire(priority)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(priority, time.perf_counter() - start_time)
+
+    def check(self, priority: str):
+        """
+        Raise LLMOverloaded if a call of `priority` would be shed right now
+
+        Lets a caller refuse work up front (e.g. before queueing a webhook
+        job) instead of failing it halfway through.
+        """
+        self._check_priority(priority)
+        with self._lock:
+            if len(self._waiting[priority]) >= self.max_queue[priority]:
+                raise self._shed(priority, f"{len(self._waiting[priority])} queued")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_wait_seconds": self.max_wait_seconds,
+                "classes": {
+                    priority: {
+                        "active": self._active[priority],
+                        "waiting": len(self._waiting[priority]),
+                        "limit": self.class_limits[priority],
+                        "max_queue": self.max_queue[priority],
+                        "avg_hold_seconds": round(self._hold_seconds[priority], 3),
+                        **self._counters[priority]
+                    }
+                    for priority in PRIORITIES
+                }
+            }
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """
+    Process-wide LLM gateway configured from the environment
+
+    LLM_MAX_CONCURRENCY          OpenAI calls in flight per process (default 8)
+    LLM_INTERACTIVE_CONCURRENCY  of which chat/SMS (default: all of them)
+    LLM_BATCH_CONCURRENCY        of which workflow generation / batch chat (default 2);
+                                 /webhook/chat/batch never runs more than this at once
+    LLM_INTERACTIVE_MAX_QUEUE    chat/SMS callers waiting before 429 (default 32)
+    LLM_BATCH_MAX_QUEUE          batch callers waiting before 429 (default 8)
+    LLM_MAX_WAIT_SECONDS         longest wait for a slot before 429 (default 30)
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+            _gateway = LLMGateway(
+                max_concurrency=max_concurrency,
+                class_limits={
+                    INTERACTIVE: int(os.getenv("LLM_INTERACTIVE_CONCURRENCY", str(max_concurrency))),
+                    BATCH: int(os.getenv("LLM_BATCH_CONCURRENCY", "2"))
+                },
+                max_queue={
+                    INTERACTIVE: int(os.getenv("LLM_INTERACTIVE_MAX_QUEUE", "32")),
+                    BATCH: int(os.getenv("LLM_BATCH_MAX_QUEUE", "8"))
+                },
+                max_wait_seconds=float(os.getenv("LLM_MAX_WAIT_SECONDS", "30"))
+            )
+    return _gateway
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Markdown Cleaner
+Strips markdown from model output so the chat widget shows natural text
+
+clean_markdown_formatting() cleans a complete response. MarkdownStreamCleaner
+applies the same rules to a token stream: it emits text as soon as it can no
+longer be part of a markdown construct (an open **bold**, a [link](url) or a
+list/heading marker at the start of a line) and holds back only that tail.
+"""
+
+import re
+from typing import List, Optional
+
+_INLINE_RULES = [
+    (re.compile(r'\*\*([^*]+)\*\*'), r'\1'),  # **bold**
+    (re.compile(r'__([^_]+)__'), r'\1'),      # __bold__
+    (re.compile(r'\*([^*]+)\*'), r'\1'),      # *italic*
+    (re.compile(r'_([^_]+)_'), r'\1'),        # _italic_
+]
+_HEADING = re.compile(r'^#{1,6}\s+', re.MULTILINE)
+_LINK = re.compile(r'\[([^\]]+)\]\(([^\)]+)\)')
+_BULLET = re.compile(r'^[ \t]*[\*\-\+][ \t]+', re.MULTILINE)
+_NUMBERED = re.compile(r'^[ \t]*\d+\.[ \t]+', re.MULTILINE)
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+# A line that may still turn into a heading or list marker
+_PARTIAL_LINE_MARKER = re.compile(r'^[ \t]*(#{1,6}|[\*\-\+]|\d+\.?)?[ \t]*$')
+_MARKER_RUN = re.compile(r'\*+|_+')
+_BULLET_MARKER = re.compile(r'^[ \t]*([\*\-\+])[ \t]+', re.MULTILINE)
+
+
+def _clean_inline(text: str) -> str:
+    for pattern, replacement in _INLINE_RULES:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _clean_lines(text: str) -> str:
+    text = _HEADING.sub('', text)
+    text = _LINK.sub(r'\2', text)
+    text = _BULLET.sub('', text)
+    text = _NUMBERED.sub('', text)
+    return text
+
+
+def clean_markdown_formatting(text: str) -> str:
+    """
+    Remove markdown formatting to create clean, natural text responses
+    """
+    text = _clean_inline(text)
+    text = _clean_lines(text)
+    text = _BLANK_LINES.sub('\n\n', text)
+    return text.strip()
+
+
+class MarkdownStreamCleaner:
+    """
+    Incremental clean_markdown_formatting for streamed completions
+
+    Usage:
+        cleaner = MarkdownStreamCleaner()
+        for delta in stream:
+            yield cleaner.feed(delta)
+        yield cleaner.flush()
+    """
+
+    # Never hold back more than this many characters waiting for a closing marker
+    MAX_HOLD_CHARS = 200
+
+    def __init__(self):
+        self._pending = ""        # raw text not yet cleaned
+        self._held_whitespace = ""  # cleaned trailing whitespace not yet emitted
+        self._at_line_start = True
+        self._started = False
+        self._emitted: List[str] = []
+
+    @property
+    def text(self) -> str:
+        """Everything emitted so far"""
+        return "".join(self._emitted)
+
+    def feed(self, chunk: str) -> str:
+        """Add streamed text; returns the cleaned text that is safe to show now"""
+        if not chunk:
+            return ""
+        self._pending += chunk
+        cut = self._safe_cut(self._pending)
+        if cut <= 0:
+            return ""
+        segment, self._pending = self._pending[:cut], self._pending[cut:]
+        return self._emit(segment)
+
+    def flush(self) -> str:
+        """Clean and return whatever is left at the end of the stream"""
+        segment, self._pending = self._pending, ""
+        return self._emit(segment, final=True)
+
+    def _safe_cut(self, buffer: str) -> int:
+        # Only cut right after whitespace so words are never split
+        cut = max(buffer.rfind(' '), buffer.rfind('\n'), buffer.rfind('\t')) + 1
+        if cut <= 0:
+            return 0
+
+        # Hold a line that is still only whitespace or a possible list/heading marker
+        line_start = buffer.rfind('\n', 0, cut) + 1
+        if (line_start > 0 or self._at_line_start) and _PARTIAL_LINE_MARKER.match(buffer[line_start:cut]):
+            cut = line_start
+
+        hold = self._unclosed_marker(buffer[:cut])
+        if hold is not None and len(buffer) - hold <= self.MAX_HOLD_CHARS:
+            cut = min(cut, hold)
+
+        return cut
+
+    def _unclosed_marker(self, text: str) -> Optional[int]:
+        """Position of the earliest emphasis marker or link that is still open"""
+        positions = []
+
+        # A "* " at the start of a line is a bullet, not an emphasis marker
+        bullets = {
+            match.start(1) for match in _BULLET_MARKER.finditer(text)
+            if match.start() > 0 or self._at_line_start
+        }
+        stack = []
+        for run in _MARKER_RUN.finditer(text):
+            if run.start() in bullets:
+                continue
+            token = run.group()
+            if stack and stack[-1][0] == token:
+                stack.pop()
+            else:
+                stack.append((token, run.start()))
+        if stack:
+            positions.append(min(start for _, start in stack))
+
+        bracket = text.rfind('[')
+        if bracket >= 0:
+            tail = text[bracket:]
+            close = tail.find(']')
+            if close < 0:
+                positions.append(bracket)
+            elif tail[close + 1:close + 2] == '(' and ')' not in tail[close + 2:]:
+                positions.append(bracket)
+
+        return min(positions) if positions else None
+
+    def _clean_line_markers(self, text: str) -> str:
+        # The first line only starts a line if the previous segment ended with a newline
+        if self._at_line_start:
+            return _clean_lines(text)
+        head, newline, rest = text.partition('\n')
+        return _LINK.sub(r'\2', head) + newline + _clean_lines(rest) if newline else _LINK.sub(r'\2', text)
+
+    def _emit(self, segment: str, final: bool = False) -> str:
+        cleaned = _clean_inline(segment)
+        cleaned = self._clean_line_markers(cleaned)
+
+        if '\n' in segment:
+            self._at_line_start = segment[segment.rfind('\n') + 1:].strip() == ""
+        elif segment.strip():
+            self._at_line_start = False
+
+        text = _BLANK_LINES.sub('\n\n', self._held_whitespace + cleaned)
+        if not self._started:
+            text = text.lstrip()
+
+        body = text.rstrip()
+        self._held_whitespace = "" if final else text[len(body):]
+        if not body:
+            return ""
+
+        self._started = True
+        self._emitted.append(body)
+        return body
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Metrics
+Prometheus instrumentation for the agent servers
+
+Histograms time every stage of a chat turn (intent classification, lexical
+search, query encoding, vector search, OpenAI call, markdown cleaning, ...),
+every HTTP route, the budgeted prompt size, FAQ match distances and LLM
+gateway queue waits; counters track LLM tokens, cache hits/misses and
+errors. instrument_flask()/instrument_fastapi() add route timing and the
+/metrics endpoint scraped by docker/prometheus.yml.
+
+Under Gunicorn with several workers set PROMETHEUS_MULTIPROC_DIR to an empty
+directory so /metrics aggregates all workers (gunicorn.conf.py cleans up
+after exited workers).
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Sub-millisecond stages (keyword scans, BM25) up to multi-second LLM calls
+_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    "metroflex_stage_seconds", "Time spent in one stage of the chat pipeline",
+    ["agent", "stage"], buckets=_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "metroflex_http_request_seconds", "HTTP request latency by route",
+    ["app", "method", "route"], buckets=_BUCKETS
+)
+REQUESTS = Counter(
+    "metroflex_http_requests", "HTTP requests by route and status code",
+    ["app", "method", "route", "status"]
+)
+LLM_TOKENS = Counter(
+    "metroflex_llm_tokens", "OpenAI tokens used",
+    ["agent", "model", "kind"]
+)
+CACHE_LOOKUPS = Counter(
+    "metroflex_cache_lookups", "Cache lookups by cache and outcome",
+    ["cache", "result"]
+)
+PROMPT_TOKENS = Histogram(
+    "metroflex_prompt_tokens", "Input tokens per LLM request after prompt budgeting",
+    ["agent"], buckets=(250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+)
+FAQ_MATCH_DISTANCE = Histogram(
+    "metroflex_faq_match_distance", "Cosine distance from a question to its closest FAQ entry",
+    ["intent"], buckets=(0.02, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.4, 0.6, 1.0)
+)
+LLM_QUEUE_WAIT = Histogram(
+    "metroflex_llm_queue_wait_seconds", "Time an LLM call waited for an LLM gateway slot",
+    ["priority"], buckets=_BUCKETS
+)
+ERRORS = Counter(
+    "metroflex_errors", "Errors by component and stage",
+    ["agent", "stage"]
+)
+
+
+@contextmanager
+def time_stage(agent: str, stage: str):
+    """Observe the duration of the `with` block as one pipeline stage"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(agent, stage).observe(time.perf_counter() - start_time)
+
+
+def observe_stage(agent: str, stage: str, seconds: float):
+    STAGE_SECONDS.labels(agent, stage).observe(seconds)
+
+
+def record_cache(cache: str, hit: bool, count: int = 1):
+    if count:
+        CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc(count)
+
+
+def record_faq_distance(intent: str, distance: float):
+    FAQ_MATCH_DISTANCE.labels(intent).observe(distance)
+
+
+def record_llm_queue_wait(priority: str, seconds: float):
+    LLM_QUEUE_WAIT.labels(priority).observe(seconds)
+
+
+def record_error(agent: str, stage: str):
+    ERRORS.labels(agent, stage).inc()
+
+
+def record_prompt_tokens(agent: str, tokens: int):
+    PROMPT_TOKENS.labels(agent).observe(tokens)
+
+
+def record_llm_usage(agent: str, response, model: Optional[str] = None):
+    """Count prompt/completion tokens of an OpenAI chat completion response"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    model = model or getattr(response, "model", None) or "unknown"
+    LLM_TOKENS.labels(agent, model, "prompt").inc(usage.prompt_tokens or 0)
+    LLM_TOKENS.labels(agent, model, "completion").inc(usage.completion_tokens or 0)
+
+
+def metrics_payload():
+    """(body, content type) for a /metrics response, aggregated across workers if configured"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def _observe_request(app_name: str, method: str, route: str, status: int, seconds: float):
+    REQUEST_SECONDS.labels(app_name, method, route).observe(seconds)
+    REQUESTS.labels(app_name, method, route, str(status)).inc()
+
+
+def instrument_flask(app, app_name: str):
+    """Time every route of a Flask app and serve GET /metrics"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start_time = g.pop("metrics_start", None)
+        if start_time is not None and request.path != "/metrics":
+            # Route template, not the raw path, to keep label cardinality bounded
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            _observe_request(app_name, request.method, route, response.status_code, time.perf_counter() - start_time)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        """Prometheus scrape endpoint"""
+        body, content_type = metrics_payload()
+        return Response(body, mimetype=content_type)
+
+    return app
+
+
+def instrument_fastapi(app, app_name: str):
+    """Time every route of a FastAPI app and serve GET /metrics"""
+    from fastapi import Request
+    from fastapi.responses import Response
+
+    @app.middleware("http")
+    async def _record_request(request: Request, call_next):
+        start_time = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            if request.url.path != "/metrics":
+                route = request.scope.get("route")
+                _observe_request(app_name, request.method, route.path if route else "unmatched",
+                                 status, time.perf_counter() - start_time)
+
+    @app.get('/metrics')
+    async def prometheus_metrics():
+        body, content_type = metrics_payload()
+        return Response(body, media_type=content_type)
+
+    return app
@@ -19,6 +19,7 @@ import openai
 from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.utils import embedding_functions
+from session_store import create_session_store
 
 class MetroFlexAIAgent:
     def __init__(self, knowledge_base_path: str, openai_api_key: str):
@@ -54,8 +55,8 @@ class MetroFlexAIAgent:
         # Agent personality and instructions
         self.system_prompt = self._create_system_prompt()
 
-        # Conversation memory
-        self.conversation_history = {}
+        # Conversation memory (bounded, idle sessions expire)
+        self.conversation_history = create_session_store()
 
     def _load_knowledge_base(self) -> Dict:
         """Load the MetroFlex knowledge base JSON"""
@@ -272,8 +273,6 @@ Remember: You represent 38+ years of champion-making excellence. Be confident, h
 
         # Get or create conversation history
         conv_key = f"{user_id}_{conversation_id}" if conversation_id else user_id
-        if conv_key not in self.conversation_history:
-            self.conversation_history[conv_key] = []
 
         # Build messages for OpenAI
         messages = [
@@ -282,7 +281,7 @@ Remember: You represent 38+ years of champion-making excellence. Be confident, h
         ]
 
         # Add conversation history (last 5 exchanges for context window management)
-        messages.extend(self.conversation_history[conv_key][-10:])
+        messages.extend(self.conversation_history.get(conv_key)[-10:])
 
         # Add current user message
         messages.append({"role": "user", "content": user_message})
@@ -299,8 +298,11 @@ Remember: You represent 38+ years of champion-making excellence. Be confident, h
             assistant_message = response.choices[0].message['content']
 
             # Update conversation history
-            self.conversation_history[conv_key].append({"role": "user", "content": user_message})
-            self.conversation_history[conv_key].append({"role": "assistant", "content": assistant_message})
+            self.conversation_history.append(
+                conv_key,
+                {"role": "user", "content": user_message},
+                {"role": "assistant", "content": assistant_message}
+            )
 
             return {
                 "response": assistant_message,
@@ -320,13 +322,12 @@ Remember: You represent 38+ years of champion-making excellence. Be confident, h
     def get_conversation_history(self, user_id: str, conversation_id: str = None) -> List[Dict]:
         """Retrieve conversation history for a user"""
         conv_key = f"{user_id}_{conversation_id}" if conversation_id else user_id
-        return self.conversation_history.get(conv_key, [])
+        return self.conversation_history.get(conv_key)
 
     def clear_conversation(self, user_id: str, conversation_id: str = None):
         """Clear conversation history for a user"""
         conv_key = f"{user_id}_{conversation_id}" if conversation_id else user_id
-        if conv_key in self.conversation_history:
-            del self.conversation_history[conv_key]
+        self.conversation_history.delete(conv_key)
 
 
 # Flask webhook for GHL integration
@@ -11,16 +11,35 @@ NEW FEATURES:
 - Improved context relevance scoring
 """
 
+import asyncio
+import hmac
 import json
 import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import AsyncIterator, List, Dict, Iterator, Optional, Tuple
 import openai
 from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.utils import embedding_functions
-import requests
+from retrieval_service import get_retrieval_service
+from vector_index import assign_content_ids, content_id, sync_collection
+from response_cache import SemanticResponseCache, normalize_query
+from single_flight import SingleFlight
+from markdown_cleaner import MarkdownStreamCleaner, clean_markdown_formatting
+from keyword_matcher import EVENTS_KEYWORD_MATCHER, HIGH_INTENT_SIGNALS
+from session_store import create_session_store
+from ghl_outbox import get_outbox
+from lexical_index import BM25Index, RetrievalLatency, reciprocal_rank_fusion
+from query_cache import QueryCache
+from division_index import DivisionIndex
+from event_calendar import EventCalendar
+from faq_answers import FAQDirectAnswers, faq_document, parse_intent_thresholds
+from llm_gateway import BATCH, INTERACTIVE, LLMOverloaded, get_llm_gateway, overloaded_response
+from metrics import (instrument_flask, observe_stage, record_cache, record_error, record_llm_usage,
+                     record_prompt_tokens, time_stage)
+from prompt_budget import PromptBudget
 
 class MetroFlexAIAgentEnhanced:
     def __init__(self, knowledge_base_path: str, openai_api_key: str):
@@ -28,68 +47,92 @@ class MetroFlexAIAgentEnhanced:
         Initialize Enhanced MetroFlex AI Agent with world-class RAG capabilities
 
         Args:
-            knowledge_base_path: Path to METROFLEX_COMPLETE_KB_V3.json (includes all menu items)
+            knowledge_base_path: Path to the events knowledge base: the events-only
+                layout (METROFLEX_EVENTS_KB_V3_EVENTS_ONLY.json) or the research
+                layout (2025_2026_events, npc_divisions_detailed, faq_quick_reference, ...)
             openai_api_key: OpenAI API key for GPT-4o-mini
         """
         self.knowledge_base_path = knowledge_base_path
+        self._kb_mtime = self._knowledge_base_mtime()
         self.knowledge_base = self._load_knowledge_base()
+        self.kb_version = 0
+        self._reload_lock = threading.Lock()
 
         # Initialize OpenAI client (v1.0+ syntax)
-        from openai import OpenAI
+        from openai import AsyncOpenAI, OpenAI
         self.openai_client = OpenAI(api_key=openai_api_key)
+        self.async_openai_client = AsyncOpenAI(api_key=openai_api_key)  # ASGI serving mode
         self.model = "gpt-4o-mini"  # Cost-optimized
 
-        # Initialize vector database
-        self.chroma_client = chromadb.Client()
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
+        # Encoder and persistent vector index are shared with the other agents
+        # in this process (see retrieval_service.py); this agent owns the
+        # "events" and "faq" namespaces
+        self.retrieval = get_retrieval_service()
+        self.embedding_function = self.retrieval.embedding_function
+        self.collection = self.retrieval.namespace("events")
+
+        # Lexical fast path thresholds (see lexical_index.BM25Index.is_confident)
+        self.lexical_fastpath = {
+            "min_score": float(os.getenv("LEXICAL_FASTPATH_MIN_SCORE", "4.0")),
+            "min_coverage": float(os.getenv("LEXICAL_FASTPATH_MIN_COVERAGE", "0.6")),
+            "margin": float(os.getenv("LEXICAL_FASTPATH_MARGIN", "1.5"))
+        }
+        self.retrieval_latency = RetrievalLatency()
+
+        # Query embedding + retrieval result LRUs for repeated questions
+        self.query_cache = QueryCache(
+            embedding_entries=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048")),
+            result_entries=int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+        )
+
+        # Semantic response cache for repeated first-turn questions
+        self.response_cache = SemanticResponseCache(
+            similarity_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95")),
+            ttl_seconds=int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
         )
 
-        # Create or get collection
-        self.collection = self.chroma_client.get_or_create_collection(
-            name="metroflex_knowledge_enhanced",
-            embedding_function=self.embedding_function
+        # Input-token budget for system prompt + retrieved context + history
+        self.prompt_budget = PromptBudget(
+            max_tokens=int(os.getenv("PROMPT_TOKEN_BUDGET", "3000")),
+            max_context_tokens=int(os.getenv("PROMPT_CONTEXT_TOKENS", "1200")),
+            max_history_messages=int(os.getenv("PROMPT_HISTORY_MESSAGES", "10"))
         )
 
+        # Verbatim FAQ questions are answered from the knowledge base, no LLM call
+        self.faq_answers = FAQDirectAnswers(
+            self.retrieval.namespace("faq"),
+            max_distance=float(os.getenv("FAQ_DIRECT_ANSWER_DISTANCE", "0.1")),
+            intent_thresholds=parse_intent_thresholds(os.getenv("FAQ_DIRECT_ANSWER_INTENTS", ""))
+        )
+
+        # Identical first-turn questions in flight at the same time share one completion
+        self.llm_flights = SingleFlight()
+
         # Build enhanced vector database
         self._build_vector_database()
 
         # Agent personality
         self.system_prompt = self._create_system_prompt()
 
-        # GHL webhook configuration
+        # GHL webhook configuration (leads are delivered through the durable outbox)
         self.ghl_webhook_url = os.getenv("GHL_LEAD_CAPTURE_WEBHOOK", "")
+        # Not started here: the agent may be built in a preloading Gunicorn master
+        self.ghl_outbox = get_outbox(start=False) if self.ghl_webhook_url else None
 
-        # Conversation history for multi-turn support
-        self.conversation_history = {}
+        # Conversation history for multi-turn support (bounded, idle sessions expire)
+        self.conversation_history = create_session_store()
+
+        # Pick up knowledge base edits without a redeploy (0 disables the watcher)
+        kb_reload_interval = float(os.getenv("KB_RELOAD_INTERVAL_SECONDS", "0"))
+        if kb_reload_interval > 0:
+            self.start_kb_watcher(kb_reload_interval)
 
     def clean_markdown_formatting(self, text: str) -> str:
         """
         Remove markdown formatting to create clean, natural text responses
         """
-        import re
-
-        # Remove bold/italic markdown
-        text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)  # **bold**
-        text = re.sub(r'__([^_]+)__', r'\1', text)      # __bold__
-        text = re.sub(r'\*([^*]+)\*', r'\1', text)      # *italic*
-        text = re.sub(r'_([^_]+)_', r'\1', text)        # _italic_
-
-        # Remove heading markers
-        text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
-
-        # Convert markdown links [text](url) to plain URLs
-        text = re.sub(r'\[([^\]]+)\]\(([^\)]+)\)', r'\2', text)
-
-        # Remove list markers but keep the content
-        text = re.sub(r'^\s*[\*\-\+]\s+', '', text, flags=re.MULTILINE)
-        text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
-
-        # Clean up extra whitespace
-        text = re.sub(r'\n{3,}', '\n\n', text)
-        text = text.strip()
-
-        return text
+        return clean_markdown_formatting(text)
 
     def _load_knowledge_base(self) -> Dict:
         """Load the MetroFlex knowledge base JSON"""
@@ -108,10 +151,10 @@ class MetroFlexAIAgentEnhanced:
                 "requires_structured_flow": bool  # Multi-turn conversation needed
             }
         """
-        query_lower = query.lower()
+        matched = EVENTS_KEYWORD_MATCHER.categories(query)
 
         # Date/time queries - prioritize event data
-        if any(word in query_lower for word in ['when', 'date', 'schedule', 'time', 'day', 'next event', 'upcoming']):
+        if "datetime" in matched:
             return {
                 "intent": "datetime",
                 "filter_category": "event",
@@ -120,7 +163,7 @@ class MetroFlexAIAgentEnhanced:
             }
 
         # Registration queries - prioritize procedures + trigger flow
-        if any(word in query_lower for word in ['register', 'sign up', 'entry', 'how to compete', 'join', 'participate']):
+        if "registration" in matched:
             return {
                 "intent": "registration",
                 "filter_category": "procedures",
@@ -129,9 +172,7 @@ class MetroFlexAIAgentEnhanced:
             }
 
         # Division/rules queries - prioritize division rules
-        division_keywords = ['division', 'class', 'category', 'mens physique', 'bikini', 'bodybuilding',
-                            'figure', 'wellness', 'classic physique', 'womens physique']
-        if any(word in query_lower for word in division_keywords):
+        if "division_rules" in matched:
             return {
                 "intent": "division_rules",
                 "filter_category": "division",
@@ -140,7 +181,7 @@ class MetroFlexAIAgentEnhanced:
             }
 
         # Sponsor queries - prioritize sponsor info + HIGH INTENT
-        if any(word in query_lower for word in ['sponsor', 'vendor booth', 'exhibitor', 'partner', 'sponsorship package']):
+        if "sponsor" in matched:
             return {
                 "intent": "sponsor",
                 "filter_category": "sponsor",
@@ -149,8 +190,7 @@ class MetroFlexAIAgentEnhanced:
             }
 
         # Vendor/service queries - prioritize vendor database
-        if any(word in query_lower for word in ['spray tan', 'tanning', 'photographer', 'photography', 'hair', 'makeup',
-                                                  'posing suit', 'coach', 'meal prep', 'hotel']):
+        if "vendor_services" in matched:
             return {
                 "intent": "vendor_services",
                 "filter_category": "vendor",
@@ -159,7 +199,7 @@ class MetroFlexAIAgentEnhanced:
             }
 
         # Legacy/history queries - prioritize legacy
-        if any(word in query_lower for word in ['ronnie', 'history', 'legacy', 'mr olympia', 'brian dobson', 'branch warren']):
+        if "legacy" in matched:
             return {
                 "intent": "legacy",
                 "filter_category": "legacy",
@@ -168,7 +208,7 @@ class MetroFlexAIAgentEnhanced:
             }
 
         # First-timer queries - prioritize guide + trigger flow
-        if any(word in query_lower for word in ['first time', 'beginner', 'new to', 'never competed', 'first show']):
+        if "first_timer" in matched:
             return {
                 "intent": "first_timer",
                 "filter_category": "first_timer",
@@ -177,7 +217,7 @@ class MetroFlexAIAgentEnhanced:
             }
 
         # Ticket/spectator queries
-        if any(word in query_lower for word in ['ticket', 'spectator', 'watch', 'attend', 'admission', 'seating']):
+        if "tickets" in matched:
             return {
                 "intent": "tickets",
                 "filter_category": "event",
@@ -205,21 +245,8 @@ class MetroFlexAIAgentEnhanced:
                 "lead_category": str
             }
         """
-        query_lower = query.lower()
-
-        high_intent_signals = {
-            "sponsor_inquiry": ["sponsor", "vendor booth", "exhibitor", "partnership", "package", "how much"],
-            "competitor_registration": ["sign up", "register", "compete", "enter", "how do i join"],
-            "ticket_purchase": ["buy tickets", "ticket price", "how much", "cost", "purchase tickets"],
-            "vendor_inquiry": ["vendor booth", "booth space", "exhibit", "sell products"],
-            "coaching_inquiry": ["coach", "trainer", "prep coach", "hire coach"],
-            "first_timer_serious": ["ready to compete", "want to compete", "first show", "prepare for"]
-        }
-
-        detected_intents = []
-        for intent_type, keywords in high_intent_signals.items():
-            if any(keyword in query_lower for keyword in keywords):
-                detected_intents.append(intent_type)
+        matched = EVENTS_KEYWORD_MATCHER.categories(query)
+        detected_intents = [intent_type for intent_type in HIGH_INTENT_SIGNALS if intent_type in matched]
 
         # Determine lead category
         lead_category = "general"
@@ -241,7 +268,10 @@ class MetroFlexAIAgentEnhanced:
 
     def create_ghl_contact(self, contact_data: Dict, intent_tags: List[str], lead_category: str) -> bool:
         """
-        Send contact to GHL for lead nurturing
+        Queue contact for delivery to GHL for lead nurturing
+
+        The payload is written to the durable outbox and posted by its
+        background worker (with retries), so the chat reply never waits on GHL.
 
         Args:
             contact_data: {email, phone, name, conversation_id}
@@ -249,7 +279,7 @@ class MetroFlexAIAgentEnhanced:
             lead_category: sponsor_vendor, competitor, spectator, coaching
 
         Returns:
-            True if successful, False otherwise
+            True if queued, False otherwise
         """
         if not self.ghl_webhook_url:
             print("⚠️ GHL webhook URL not configured")
@@ -274,41 +304,286 @@ class MetroFlexAIAgentEnhanced:
         }
 
         try:
-            response = requests.post(self.ghl_webhook_url, json=payload, timeout=5)
-            if response.status_code == 200:
-                print(f"✅ GHL lead captured: {contact_data.get('email')} ({lead_category})")
-                return True
-            else:
-                print(f"⚠️ GHL webhook failed: {response.status_code}")
-                return False
+            with time_stage("events", "ghl_enqueue"):
+                self.ghl_outbox.enqueue(self.ghl_webhook_url, payload)
+            print(f"📬 GHL lead queued: {contact_data.get('email')} ({lead_category})")
+            return True
         except Exception as e:
+            record_error("events", "ghl_enqueue")
             print(f"❌ GHL contact creation failed: {e}")
             return False
 
-    def _build_vector_database(self):
-        """Build enhanced vector database with vendor data and improved indexing"""
+    def _build_vector_database(self, knowledge_base: Optional[Dict] = None) -> Dict:
+        """
+        Sync the persistent vector index with the knowledge base
+
+        Documents are keyed by a hash of their content, so only new or changed
+        documents are embedded; an unchanged knowledge base loads straight from disk.
+
+        Returns:
+            sync_collection() stats plus "seconds"
+        """
+        knowledge_base = self.knowledge_base if knowledge_base is None else knowledge_base
+        start_time = time.perf_counter()
+        documents, metadatas = self._collect_documents(knowledge_base)
+        sync_stats = sync_collection(self.collection, documents, metadatas)
+        faq_stats = self.faq_answers.sync(self._faq_by_question(knowledge_base))
+
+        # BM25 index over exactly the rows stored in the collection
+        self.lexical_index = BM25Index(*assign_content_ids(documents, metadatas))
+        # Height/weight class placement over the full class lists
+        self.division_index = DivisionIndex(self._divisions_with_limits(knowledge_base))
+        # Date-sorted events for "next event" / "events in May" / "days until" questions
+        self.event_calendar = EventCalendar(self._events_by_key(knowledge_base))
+        elapsed = time.perf_counter() - start_time
+
+        # Cached answers and retrievals may quote documents that just changed;
+        # the version bump also stops requests still in flight from caching them
+        self.kb_version += 1
+        self.response_cache.invalidate()
+        self.query_cache.invalidate()
+
+        print(f"✅ Enhanced vector database ready with {sync_stats['total']} documents in {elapsed:.2f}s")
+        print(f"   - {sync_stats['added']} embedded, {sync_stats['unchanged']} reused, {sync_stats['removed']} removed")
+        print(f"   - {len([m for m in metadatas if m['category'] == 'event'])} event docs")
+        print(f"   - {len([m for m in metadatas if m['category'] == 'vendor'])} vendor docs")
+        print(f"   - {len([m for m in metadatas if m['category'] == 'sponsor'])} sponsor docs")
+        print(f"   - {len([m for m in metadatas if m['category'] == 'division'])} division docs")
+        print(f"   - {faq_stats['total']} FAQ questions for direct answers")
+        if self.event_calendar.undated:
+            print(f"⚠️ Events without a parseable date (not in the calendar): {', '.join(self.event_calendar.undated)}")
+        if self.division_index.skipped:
+            print(f"⚠️ Class limits not indexed for: {', '.join(self.division_index.skipped)}")
+
+        return {**sync_stats, "seconds": round(elapsed, 3)}
+
+    def reload_knowledge_base(self) -> Dict:
+        """
+        Re-read the knowledge base JSON and apply it without a restart
+
+        Only documents whose content changed are embedded, removed ones are
+        deleted, then the BM25 index and KB dict are swapped in. Requests in
+        flight keep using the objects they started with. If the file is not
+        valid the current knowledge base stays live and the error is raised.
+
+        Returns:
+            {"reloaded": bool, "changed_sections": [...], "kb_version": int, ...sync stats}
+        """
+        with self._reload_lock:
+            self._kb_mtime = self._knowledge_base_mtime()
+            knowledge_base = self._load_knowledge_base()
+            changed_sections = sorted(
+                key for key in set(self.knowledge_base) | set(knowledge_base)
+                if self.knowledge_base.get(key) != knowledge_base.get(key)
+            )
+            if not changed_sections:
+                return {"reloaded": False, "changed_sections": [], "kb_version": self.kb_version}
+
+            print(f"🔄 Reloading knowledge base ({', '.join(changed_sections)} changed)")
+            try:
+                sync_stats = self._build_vector_database(knowledge_base)
+            except KeyError as e:
+                raise ValueError(f"Knowledge base is missing required key {e}") from e
+            self.knowledge_base = knowledge_base
+            return {"reloaded": True, "changed_sections": changed_sections, "kb_version": self.kb_version, **sync_stats}
+
+    def _knowledge_base_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.knowledge_base_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def start_kb_watcher(self, interval: float):
+        """
+        Poll the knowledge base file every `interval` seconds and reload it on change
+
+        The watcher is restarted in forked (preloaded Gunicorn) workers, so every
+        worker picks up the change.
+        """
+        def watch():
+            while True:
+                time.sleep(interval)
+                if self._knowledge_base_mtime() == self._kb_mtime:
+                    continue
+                try:
+                    self.reload_knowledge_base()
+                except Exception as e:
+                    print(f"❌ Knowledge base reload failed, keeping the current version: {e}")
+
+        def start():
+            threading.Thread(target=watch, name="kb-watcher", daemon=True).start()
+
+        start()
+        os.register_at_fork(after_in_child=start)
+
+    @staticmethod
+    def _events_by_key(knowledge_base: Dict) -> Dict[str, Dict]:
+        """Events keyed like 2025_2026_events (the events-only KB lists them under metroflex_events)"""
+        if '2025_2026_events' in knowledge_base:
+            return knowledge_base['2025_2026_events']
+        return {
+            re.sub(r"[^a-z0-9]+", "_", event['name'].lower()).strip("_"): {**event, 'official_name': event['name']}
+            for event in knowledge_base['metroflex_events']['events']
+        }
+
+    @staticmethod
+    def _faq_by_question(knowledge_base: Dict) -> Dict[str, str]:
+        """faq_quick_reference, or the events-only KB's common_questions as question -> answer"""
+        if 'faq_quick_reference' in knowledge_base:
+            return knowledge_base['faq_quick_reference']
+        return {item['question']: item['answer'] for item in knowledge_base['common_questions']}
+
+    @staticmethod
+    def _divisions_with_limits(knowledge_base: Dict) -> Dict[str, Dict]:
+        """
+        npc_divisions_detailed, or the events-only KB's open classes in that shape
+
+        The events-only KB writes classes as labels ("Open Lightweight (143 to
+        154 lbs)", "Open Class B (over 5'7\" up to 5'9\")"); only the open
+        (or only) weight and height classes carry limits DivisionIndex can
+        place. Divisions without them are kept (empty) so a question naming
+        one is not placed in a related division instead.
+        """
+        if 'npc_divisions_detailed' in knowledge_base:
+            return knowledge_base['npc_divisions_detailed']
+
+        def split(label: str) -> Tuple[str, str]:
+            match = re.match(r"(.+?)\s*\((.+)\)\s*$", label)
+            return (match.group(1), match.group(2)) if match else (label, "")
+
+        divisions = {}
+        sections = knowledge_base.get('divisions_and_classes', {})
+        for group in ('mens_divisions', 'womens_divisions'):
+            for division_key, division_data in sections.get(group, {}).items():
+                class_types = division_data.get('class_types', {})
+                division = {}
+                # Women's bodybuilding has only "weight_classes"
+                weight_labels = class_types.get('open_weight_classes') or class_types.get('weight_classes')
+                if weight_labels:
+                    # "over 125 lbs up to 140 lbs" is a range, "over 140 lbs" a minimum
+                    division['weight_classes'] = [
+                        {"class": name, ("min_weight" if limits.lower().startswith("over") and "up to" not in limits.lower()
+                                         else "weight_range"): limits}
+                        for name, limits in map(split, weight_labels)
+                    ]
+                if class_types.get('open_height_classes'):
+                    division['height_classes'] = [
+                        {"class": name, "height": limits}
+                        for name, limits in map(split, class_types['open_height_classes'])
+                    ]
+                divisions[division_key.lower()] = division
+        return divisions
+
+    def _collect_events_only_documents(self, knowledge_base: Dict) -> Tuple[List[str], List[Dict]]:
+        """Document set of the events-only KB (METROFLEX_EVENTS_KB_V3_EVENTS_ONLY.json)"""
+        documents = []
+        metadatas = []
+
+        contact = knowledge_base['metroflex_contact']
+        documents.append(f"MetroFlex Events: {knowledge_base['metroflex_events']['overview']} Contact: {contact['general_inquiries']}, {contact['phone']}. Website: {contact['events_website']}. Address: {contact['address']}")
+        metadatas.append({"category": "organization", "type": "about"})
+
+        for event_key, event_data in self._events_by_key(knowledge_base).items():
+            event_text = f"{event_data['official_name']}: {event_data.get('date', 'TBD')} at {event_data.get('location', 'TBD')}. "
+            if event_data.get('formerly_known_as'):
+                event_text += f"Formerly the {event_data['formerly_known_as']}. "
+            if event_data.get('status'):
+                event_text += f"{event_data['status']}. "
+            event_text += f"{event_data.get('description', '')} "
+            if event_data.get('special_features'):
+                event_text += f"Highlights: {', '.join(event_data['special_features'])}. "
+            if event_data.get('registration_url'):
+                event_text += f"Competitor registration (MuscleWare): {event_data['registration_url']}. "
+            if event_data.get('ticketing_url'):
+                event_text += f"Spectator tickets (TicketSpice): {event_data['ticketing_url']}."
+            documents.append(event_text)
+            metadatas.append({"category": "event", "event_name": event_key, "date": event_data.get('date', 'TBD')})
+
+        # Competitor registration
+        registration = knowledge_base['competitor_registration']
+        steps = "; ".join(f"{step['step']}. {step['action']}" for step in registration['registration_process'])
+        documents.append(f"Competitor registration via {registration['platform']}: {registration['overview']} {registration['key_principle']} Steps: {steps}")
+        metadatas.append({"category": "procedures", "type": "registration"})
+
+        membership = registration['npc_membership']
+        documents.append(f"NPC membership: {membership['requirement']}. How to get it: {membership['how_to_get']}. Required registration fields: {', '.join(registration['required_fields'])}")
+        metadatas.append({"category": "procedures", "type": "npc_card"})
+
+        tiers = "; ".join(f"{tier['tier']}: {tier['typical_pricing']} ({tier['description']})" for tier in registration['pricing_tiers'])
+        documents.append(f"Competitor registration fees: {tiers}")
+        metadatas.append({"category": "procedures", "type": "registration_fees"})
+
+        music = knowledge_base['music_requirements']
+        documents.append("Music requirements: " + ". ".join(f"{key.replace('_', ' ').capitalize()}: {value}" for key, value in music.items()))
+        metadatas.append({"category": "procedures", "type": "music"})
+
+        for item in knowledge_base['troubleshooting']:
+            documents.append(f"Registration troubleshooting - {item['issue']}: {item['solution']}")
+            metadatas.append({"category": "procedures", "type": "troubleshooting"})
+
+        # Spectator tickets
+        ticketing = knowledge_base['spectator_ticketing']
+        ticket_types = "; ".join(f"{ticket['type']} {ticket['price']}: {ticket['description']} (includes {', '.join(ticket['includes'])})"
+                                 for ticket in ticketing['ticket_types'])
+        documents.append(f"Spectator tickets via {ticketing['platform']}: {ticketing['overview']} Ticket types: {ticket_types}. Refunds: {ticketing['refund_policy']} Groups: {ticketing['group_bookings']}")
+        metadatas.append({"category": "event", "type": "tickets"})
+
+        # Vendor booths
+        booths = knowledge_base['vendor_booths']
+        for package in booths['booth_packages']:
+            documents.append(f"Vendor booth - {package['package']}: {package['price']}, {package['size']}. Includes: {', '.join(package['includes'])}. Ideal for: {package['ideal_for']}")
+            metadatas.append({"category": "vendor", "type": "booth_package", "package": package['package']})
+        booking = "; ".join(f"{step['step']}. {step['action']}" for step in booths['booking_process'])
+        discounts = ", ".join(f"{key.replace('_', ' ')}: {value}" for key, value in booths['multi_event_discounts'].items())
+        documents.append(f"Vendor booths: {booths['overview']} Booking: {booking}. Multi-event discounts: {discounts}")
+        metadatas.append({"category": "vendor", "type": "booth_booking"})
+
+        # Sponsorship tiers
+        sponsorship = knowledge_base['sponsorship_opportunities']
+        for tier in sponsorship['sponsorship_tiers']:
+            documents.append(f"{tier['tier']} Sponsorship: {tier['investment']} ({tier.get('availability', 'available')}). Benefits: {', '.join(tier['benefits'])}")
+            metadatas.append({"category": "sponsor", "type": "packages", "package": tier['tier']})
+        documents.append(f"Sponsorship: {sponsorship['overview']} {sponsorship['custom_packages']}")
+        metadatas.append({"category": "sponsor", "type": "overview"})
+
+        # Divisions
+        divisions = knowledge_base['divisions_and_classes']
+        for group in ('mens_divisions', 'womens_divisions'):
+            for division_key, division_data in divisions[group].items():
+                division_text = f"{division_key.replace('_', ' ')}: {division_data['description']}. "
+                for class_type, classes in division_data.get('class_types', {}).items():
+                    classes = ', '.join(classes) if isinstance(classes, list) else classes
+                    division_text += f"{class_type.replace('_', ' ').capitalize()}: {classes}. "
+                documents.append(division_text)
+                metadatas.append({"category": "division", "division": division_key.lower()})
+
+        for question, answer in self._faq_by_question(knowledge_base).items():
+            documents.append(faq_document(question, answer))
+            metadatas.append({"category": "faq", "question": question})
+
+        return documents, metadatas
+
+    def _collect_documents(self, knowledge_base: Dict) -> Tuple[List[str], List[Dict]]:
+        """Build enhanced document set with vendor data and improved indexing"""
+        if 'metroflex_events' in knowledge_base:
+            return self._collect_events_only_documents(knowledge_base)
+
         documents = []
         metadatas = []
-        ids = []
-        doc_id = 0
 
         # Index organization info
-        org = self.knowledge_base['organization']
+        org = knowledge_base['organization']
         documents.append(f"MetroFlex Events: {org['mission']}. Founded by {org['founder']} in {org['established']}. Contact: {org['contact']['email']}, {org['contact']['phone']}")
         metadatas.append({"category": "organization", "type": "about"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
 
         # Index Ronnie Coleman legacy (IMPORTANT for brand)
-        ronnie_story = self.knowledge_base['metroflex_ronnie_coleman_story']
+        ronnie_story = knowledge_base['metroflex_ronnie_coleman_story']
         ronnie_text = f"Ronnie Coleman's legendary story: In {ronnie_story['year']}, {ronnie_story['ronnie_profession']} Ronnie Coleman visited MetroFlex. {ronnie_story['brian_dobson_first_impression']}. Brian Dobson made the famous offer: '{ronnie_story['the_famous_offer']}'. Result: {ronnie_story['first_competition']['result']} at {ronnie_story['first_competition']['event']}. Career: {ronnie_story['career_progression']['total_olympia_titles']} Mr. Olympia titles ({ronnie_story['career_progression']['consecutive_wins']}). Training stories: {ronnie_story['training_stories']['equipment_evolution']}"
         documents.append(ronnie_text)
         metadatas.append({"category": "legacy", "type": "ronnie_coleman"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
 
         # Index all 2025/2026 events with PRIORITY on dates
-        for event_key, event_data in self.knowledge_base['2025_2026_events'].items():
+        for event_key, event_data in knowledge_base['2025_2026_events'].items():
             # Primary event document (date-focused)
             event_name = event_data.get('official_name', event_key.replace('_', ' ').title())
             event_date = event_data.get('date', 'TBD')
@@ -332,8 +607,6 @@ class MetroFlexAIAgentEnhanced:
 
             documents.append(event_text)
             metadatas.append({"category": "event", "event_name": event_key, "date": event_data['date']})
-            ids.append(f"doc_{doc_id}")
-            doc_id += 1
 
             # Services document (vendor-focused)
             if 'services_offered' in event_data:
@@ -348,11 +621,9 @@ class MetroFlexAIAgentEnhanced:
 
                 documents.append(services_text)
                 metadatas.append({"category": "vendor", "event_name": event_key, "type": "event_services"})
-                ids.append(f"doc_{doc_id}")
-                doc_id += 1
 
         # Index NPC divisions in detail
-        for division_key, division_data in self.knowledge_base['npc_divisions_detailed'].items():
+        for division_key, division_data in knowledge_base['npc_divisions_detailed'].items():
             division_text = f"{division_key.replace('_', ' ').title()}: {division_data['description']}. "
 
             if 'weight_classes' in division_data:
@@ -376,56 +647,42 @@ class MetroFlexAIAgentEnhanced:
 
             documents.append(division_text)
             metadatas.append({"category": "division", "division": division_key})
-            ids.append(f"doc_{doc_id}")
-            doc_id += 1
 
         # Index competition procedures
-        procedures = self.knowledge_base['competition_procedures']
+        procedures = knowledge_base['competition_procedures']
 
         # NPC card requirement
         npc_card = procedures['npc_card_requirement']
         documents.append(f"NPC Card: {npc_card['purpose']}. Required: {npc_card['required']}. How to get: {npc_card['how_to_obtain']}. Cost: {npc_card['cost_difference']}. Recommendation: {npc_card['recommendation']}")
         metadatas.append({"category": "procedures", "type": "npc_card"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
 
         # Registration process
         reg_process = procedures['registration_process']
         documents.append(f"Registration: Methods: {', '.join(reg_process['methods'])}. Required info: {', '.join(reg_process['required_information'])}. Benefits of early registration: {', '.join(reg_process['early_registration_benefits'])}. {reg_process['late_fees']}")
         metadatas.append({"category": "procedures", "type": "registration"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
 
         # Competition day schedule
         schedule = procedures['competition_day_schedule']['typical_timeline']
         documents.append(f"Competition day schedule: Check-in: {schedule['check_in']}. Weigh-ins: {schedule['weigh_ins']}. Prejudging: {schedule['prejudging']}. Finals: {schedule['finals']}. Event ends: {schedule['event_end']}. {procedures['competition_day_schedule']['weigh_in_rules']}")
         metadatas.append({"category": "procedures", "type": "schedule"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
 
         # What to bring
         bring = procedures['what_to_bring']
         documents.append(f"What to bring on competition day: Required: {', '.join(bring['required'])}. Recommended: {', '.join(bring['recommended'][:5])}. Not allowed: {', '.join(bring['not_allowed'])}")
         metadatas.append({"category": "procedures", "type": "what_to_bring"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
 
         # Pro card qualification
         pro_card = procedures['pro_card_qualification']
         documents.append(f"IFBB Pro Card: {pro_card['requirement']}. National qualifiers: {', '.join(pro_card['national_qualifiers'][:4])}. Path: {pro_card['qualification_path']}. {pro_card['metroflex_events_role']}. {pro_card['pro_cards_awarded_through_metroflex']}")
         metadatas.append({"category": "procedures", "type": "pro_card"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
 
         # Index sponsor information (HIGH VALUE)
-        sponsor_info = self.knowledge_base['sponsor_information']
+        sponsor_info = knowledge_base['sponsor_information']
 
         # Audience demographics
         demographics = sponsor_info['audience_demographics']
         documents.append(f"Sponsor audience: {demographics['annual_reach']}. Per event: {demographics['per_event_average']}. Demographics: {demographics['age_range']}, {demographics['gender_split']['male']} male / {demographics['gender_split']['female']} female. Interests: {', '.join(demographics['interests'])}. Geographic reach: {demographics['geographic_reach']}. Spending power: {demographics['competitor_spending_power']}")
         metadatas.append({"category": "sponsor", "type": "demographics"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
 
         # Sponsorship packages
         packages = sponsor_info['sponsorship_packages_better_bodies']
@@ -435,37 +692,27 @@ class MetroFlexAIAgentEnhanced:
             package_text = f"{package_name.replace('_', ' ').title()} Sponsorship: {price_str}. Benefits: {', '.join(package_data['benefits'][:3])}..."
             documents.append(package_text)
             metadatas.append({"category": "sponsor", "type": "packages", "package": package_name})
-            ids.append(f"doc_{doc_id}")
-            doc_id += 1
 
         # ROI expectations
         roi = sponsor_info['roi_expectations']
         documents.append(f"Sponsor ROI: Brand awareness increase: {roi['brand_awareness_increase']}. Leads per event: {roi['leads_per_event']}. Conversion rate: {roi['lead_to_customer_conversion']}. Social media: {roi['social_media_impressions']}. Repeat sponsorship rate: {roi['repeat_sponsorship_rate']}")
         metadatas.append({"category": "sponsor", "type": "roi"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
 
         # Index first-time competitor guide
-        first_timer = self.knowledge_base['first_time_competitor_guide']
+        first_timer = knowledge_base['first_time_competitor_guide']
         for step in first_timer['10_steps_to_success']:
             documents.append(f"Step {step['step']}: {step['title']}. {step['description']} Timing: {step['timing']}. {step.get('cost', step.get('recommendation', ''))}")
             metadatas.append({"category": "first_timer", "step": step['step'], "type": "guide"})
-            ids.append(f"doc_{doc_id}")
-            doc_id += 1
 
         # Common mistakes
         mistakes_text = "Common mistakes first-time competitors make: " + "; ".join(first_timer['common_mistakes'][:5])
         documents.append(mistakes_text)
         metadatas.append({"category": "first_timer", "type": "mistakes"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
 
         # Expected costs
         costs = first_timer['expected_costs']
         documents.append(f"Cost to compete (first show): Total estimate: {costs['total_estimate']}. Breakdown: NPC card ${costs['npc_card']}, Registration ${costs['registration']}, Suit ${costs['posing_suit']}, Tan ${costs['tanning']}, Coach ${costs['coach']}, Travel ${costs['travel_hotel']}")
         metadatas.append({"category": "first_timer", "type": "costs"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
 
         # Index vendor/service providers (NEW!)
         # Extract vendors from event services
@@ -475,27 +722,21 @@ class MetroFlexAIAgentEnhanced:
         protan_text = "ProTan USA: Professional spray tanning service. Available onsite at all MetroFlex Events (Better Bodies, Ronnie Coleman Classic, Branch Warren Classic). Services: Competition spray tanning for bodybuilders and fitness competitors. Provides dark, stage-ready tan."
         documents.append(protan_text)
         metadatas.append({"category": "vendor", "type": "spray_tanning", "vendor_name": "ProTan USA"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
         vendors_indexed.add("ProTan USA")
 
         # Physique Visuals (photography)
         physique_text = "Physique Visuals: Professional photography, videography, and live streaming for bodybuilding competitions. Available at all MetroFlex Events. Services: Professional photos of competitors on stage, video coverage, live stream production."
         documents.append(physique_text)
         metadatas.append({"category": "vendor", "type": "photography", "vendor_name": "Physique Visuals"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
         vendors_indexed.add("Physique Visuals")
 
         # Hair & Makeup services
         hair_makeup_text = "Professional Hair & Makeup Services: Available at all MetroFlex Events. Services: Competition hair styling and makeup application. Cost: Typically $50-150. Can be booked on-site or in advance."
         documents.append(hair_makeup_text)
         metadatas.append({"category": "vendor", "type": "hair_makeup"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
 
         # Hotel partners
-        hotel_recs = self.knowledge_base['hotel_recommendations']
+        hotel_recs = knowledge_base['hotel_recommendations']
         for event_key, hotel_data in hotel_recs.items():
             hotel_text = f"{event_key.replace('_', ' ').title()} Hotel: {hotel_data.get('partner', 'Hotel partner available')}. "
             if 'group_code' in hotel_data:
@@ -505,53 +746,78 @@ class MetroFlexAIAgentEnhanced:
 
             documents.append(hotel_text)
             metadatas.append({"category": "vendor", "type": "hotel", "event": event_key})
-            ids.append(f"doc_{doc_id}")
-            doc_id += 1
 
         # Coaching referrals
         coaching_text = "Coaching Services: MetroFlex can provide referrals to qualified prep coaches for diet, training, posing, and competition strategy. Cost: $200-1,000+ depending on coaching level. Contact brian@metroflexgym.com for coach referrals in Texas."
         documents.append(coaching_text)
         metadatas.append({"category": "vendor", "type": "coaching"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
 
         # Posing suit vendors (from guide)
         suit_text = "Posing Suit Vendors: Recommended vendors include Angel Competition Bikinis, Suits by J'Adore, Musclewear. Cost: $50-150. Allow 4-6 weeks for custom suits. Order 8-10 weeks before show."
         documents.append(suit_text)
         metadatas.append({"category": "vendor", "type": "posing_suits"})
-        ids.append(f"doc_{doc_id}")
-        doc_id += 1
 
         # Index FAQ for quick lookups
-        faq = self.knowledge_base['faq_quick_reference']
-        for question, answer in faq.items():
-            faq_text = f"Q: {question.replace('_', ' ').title()}? A: {answer}"
-            documents.append(faq_text)
+        for question, answer in self._faq_by_question(knowledge_base).items():
+            documents.append(faq_document(question, answer))
             metadatas.append({"category": "faq", "question": question})
-            ids.append(f"doc_{doc_id}")
-            doc_id += 1
-
-        # Add all documents to ChromaDB
-        if len(documents) > 0:
-            self.collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
 
-        print(f"✅ Enhanced vector database built with {len(documents)} documents")
-        print(f"   - {len([m for m in metadatas if m['category'] == 'event'])} event docs")
-        print(f"   - {len([m for m in metadatas if m['category'] == 'vendor'])} vendor docs")
-        print(f"   - {len([m for m in metadatas if m['category'] == 'sponsor'])} sponsor docs")
-        print(f"   - {len([m for m in metadatas if m['category'] == 'division'])} division docs")
+        return documents, metadatas
+
+    def embed_query(self, query: str):
+        """Encode a query once so retrieval and the response cache can share it"""
+        return self.query_cache.embed(query, lambda text: self.embedding_function([text])[0])
 
-    def retrieve_relevant_context(self, query: str, intent_info: Dict, n_results: int = 3) -> Tuple[List[str], List[Dict]]:
+    def embed_queries(self, queries: List[str]) -> List:
+        """Encode several queries in one SentenceTransformer batch (cached ones are reused)"""
+        encoded = []
+
+        def encode(texts: List[str]) -> List:
+            encoded.extend(texts)
+            return list(self.embedding_function(texts))
+
+        embeddings = self.query_cache.embed_many(queries, encode)
+        record_cache("query_embedding", True, len(queries) - len(encoded))
+        record_cache("query_embedding", False, len(encoded))
+        return embeddings
+
+    def _lexical_confident(self, lexical_hits: List[Dict]) -> bool:
+        return BM25Index.is_confident(lexical_hits, **self.lexical_fastpath)
+
+    def retrieve_relevant_context(self, query: str, intent_info: Dict, n_results: int = 3,
+                                  query_embedding=None, lexical_hits: Optional[List[Dict]] = None,
+                                  timings: Optional[Dict[str, float]] = None) -> Tuple[List[str], List[Dict]]:
         """
         Enhanced retrieval with intent-based filtering
 
+        A confident BM25 hit is returned without touching the encoder or Chroma
+        (lexical fast path); otherwise BM25 and vector rankings are fused.
+        `timings` carries stage durations already spent by the caller
+        (lexical search, query encoding) into the per-path latency stats.
+
         Returns:
             (documents, metadatas)
         """
+        timings = dict(timings or {})
+        kb_version = self.kb_version
+        if lexical_hits is None:
+            start_time = time.perf_counter()
+            lexical_hits = self.lexical_index.search(query, n_results=n_results, category=intent_info["filter_category"])
+            timings["lexical"] = time.perf_counter() - start_time
+
+        if self._lexical_confident(lexical_hits):
+            self.retrieval_latency.record("lexical_fastpath", timings)
+            return ([hit["document"] for hit in lexical_hits[:n_results]],
+                    [hit["metadata"] for hit in lexical_hits[:n_results]])
+
+        # Identical (normalized) questions reuse the last retrieval
+        cache_key = self.query_cache.result_key(query, intent_info["filter_category"], n_results)
+        cached = self.query_cache.get_results(cache_key)
+        record_cache("retrieval", cached is not None)
+        if cached is not None:
+            self.retrieval_latency.record("retrieval_cache", timings)
+            return cached
+
         # Build metadata filter based on intent
         where_filter = None
         if intent_info["filter_category"]:
@@ -559,15 +825,35 @@ class MetroFlexAIAgentEnhanced:
 
         # Query ChromaDB
         try:
+            if query_embedding is None:
+                start_time = time.perf_counter()
+                query_embedding = self.embed_query(query)
+                timings["encode"] = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
             results = self.collection.query(
-                query_texts=[query],
+                query_embeddings=[query_embedding],
                 n_results=n_results,
                 where=where_filter if where_filter else None
             )
-
-            if results['documents'] and len(results['documents']) > 0:
-                return results['documents'][0], results['metadatas'][0]
+            timings["vector"] = time.perf_counter() - start_time
+            observe_stage("events", "vector_search", timings["vector"])
+
+            vector_ids = results['ids'][0] if results['ids'] else []
+            rows = {doc_id: (doc, meta) for doc_id, doc, meta in
+                    zip(vector_ids, results['documents'][0], results['metadatas'][0])} if vector_ids else {}
+            rows.update({hit["id"]: (hit["document"], hit["metadata"]) for hit in lexical_hits})
+
+            fused = reciprocal_rank_fusion([vector_ids, [hit["id"] for hit in lexical_hits]])[:n_results]
+            self.retrieval_latency.record("hybrid", timings)
+            if fused:
+                documents = [rows[doc_id][0] for doc_id in fused]
+                metadatas = [rows[doc_id][1] for doc_id in fused]
+                if kb_version == self.kb_version:
+                    self.query_cache.put_results(cache_key, documents, metadatas)
+                return documents, metadatas
         except Exception as e:
+            record_error("events", "retrieval")
             print(f"⚠️ RAG retrieval error: {e}")
 
         return [], []
@@ -632,6 +918,348 @@ When users ask about sponsorship, registration, or vendor booths, provide the re
 
 Remember: You represent 38+ years of champion-making excellence. Be confident, helpful, and professional."""
 
+    def _analyze_queries(self, user_messages: List[str]) -> List[Dict]:
+        """
+        Intent, lexical hits and query embedding for each message
+
+        Exact-entity questions are served by the lexical index alone; all other
+        messages are encoded together in one batch (the embedding is shared by
+        the response cache and retrieval).
+        """
+        analyses = []
+        kb_version = self.kb_version
+        for user_message in user_messages:
+            with time_stage("events", "intent_classification"):
+                intent_info = self.classify_query_intent(user_message)
+            start_time = time.perf_counter()
+            lexical_hits = self.lexical_index.search(user_message, n_results=3, category=intent_info["filter_category"])
+            observe_stage("events", "lexical_search", time.perf_counter() - start_time)
+            analyses.append({
+                "intent_info": intent_info,
+                "lexical_hits": lexical_hits,
+                "timings": {"lexical": time.perf_counter() - start_time},
+                "query_embedding": None,
+                "kb_version": kb_version
+            })
+
+        pending = [i for i, analysis in enumerate(analyses) if not self._lexical_confident(analysis["lexical_hits"])]
+        if pending:
+            try:
+                start_time = time.perf_counter()
+                embeddings = self.embed_queries([user_messages[i] for i in pending])
+                encode_seconds = (time.perf_counter() - start_time) / len(pending)
+                observe_stage("events", "query_encoding", time.perf_counter() - start_time)
+                for i, embedding in zip(pending, embeddings):
+                    analyses[i]["query_embedding"] = embedding
+                    analyses[i]["timings"]["encode"] = encode_seconds
+            except Exception as e:
+                record_error("events", "query_encoding")
+                print(f"⚠️ Query encoding error: {e}")
+
+        return analyses
+
+    def _prepare_turn(self, user_message: str, user_id: str, conversation_id: str = None,
+                      analysis: Optional[Dict] = None) -> Dict:
+        """
+        Everything a chat turn needs before the LLM call: intent, history,
+        cached answer or retrieved context, and the OpenAI message list
+
+        `analysis` is this message's entry from _analyze_queries() when the
+        caller has already analyzed a whole batch.
+        """
+        if analysis is None:
+            analysis = self._analyze_queries([user_message])[0]
+        intent_info = analysis["intent_info"]
+        lexical_hits = analysis["lexical_hits"]
+        timings = analysis["timings"]
+        query_embedding = analysis["query_embedding"]
+
+        # Get or create conversation history
+        conv_key = self._conversation_key(user_id, conversation_id)
+        history = self.conversation_history.get(conv_key)
+        is_first_turn = len(history) == 0
+
+        turn = {
+            "user_message": user_message,
+            "kb_version": analysis["kb_version"],
+            "intent_info": intent_info,
+            "conv_key": conv_key,
+            "is_first_turn": is_first_turn,
+            "query_embedding": query_embedding,
+            "cached": None,
+            "faq_answer": False,
+            "division_placement": None,
+            "calendar_context": None,
+            "cache_intent": intent_info['intent'],
+            "messages": None
+        }
+
+        # Height/weight questions get their class placed deterministically
+        with time_stage("events", "division_lookup"):
+            turn["division_placement"] = self.division_index.lookup(user_message)
+
+        # Date questions are answered against today's calendar; their cached
+        # answers ("in 34 days") are only reused the same day
+        if intent_info['intent'] == "datetime":
+            with time_stage("events", "calendar_lookup"):
+                today = datetime.now().date()
+                turn["calendar_context"] = self.event_calendar.context(user_message, today)
+            turn["cache_intent"] = f"datetime@{today.isoformat()}"
+
+        # Repeated first-turn questions are answered from the semantic cache
+        # (not placement questions: "5'8 and 180" and "5'9 and 180" embed alike)
+        if is_first_turn and not turn["division_placement"]:
+            with time_stage("events", "response_cache_lookup"):
+                turn["cached"] = self.response_cache.lookup(turn["cache_intent"], query_embedding, user_message)
+            record_cache("response", turn["cached"] is not None)
+
+        # Verbatim FAQ questions are answered straight from the knowledge base
+        if not turn["cached"] and not turn["division_placement"]:
+            faq_match = self._match_faq(user_message, intent_info, query_embedding, lexical_hits)
+            if faq_match:
+                turn["faq_answer"] = True
+                turn["cached"] = {
+                    "response": self.clean_markdown_formatting(faq_match["answer"]),
+                    "relevant_sources": [faq_match["document"]],
+                    "relevant_metadata": [faq_match["metadata"]]
+                }
+
+        if turn["cached"]:
+            turn["relevant_docs"] = turn["cached"]['relevant_sources']
+            turn["relevant_metadata"] = turn["cached"]['relevant_metadata']
+            return turn
+
+        # Retrieve relevant context with intent-based filtering
+        relevant_docs, relevant_metadata = self.retrieve_relevant_context(
+            user_message, intent_info, n_results=3, query_embedding=query_embedding,
+            lexical_hits=lexical_hits, timings=timings
+        )
+        if turn["calendar_context"]:
+            relevant_docs = [turn["calendar_context"]] + relevant_docs
+            relevant_metadata = [{"category": "event", "type": "calendar"}] + relevant_metadata
+        if turn["division_placement"]:
+            relevant_docs = [DivisionIndex.format(turn["division_placement"])] + relevant_docs
+            relevant_metadata = [{"category": "division", "type": "class_placement"}] + relevant_metadata
+
+        # Build messages for OpenAI: system prompt, context (best documents first)
+        # and the newest history that fits the token budget, then the user message
+        with time_stage("events", "prompt_assembly"):
+            messages, prompt_stats = self.prompt_budget.assemble(
+                self.system_prompt,
+                f"Retrieved Context (Intent: {intent_info['intent']}):",
+                relevant_docs,
+                history,
+                user_message
+            )
+        record_prompt_tokens("events", prompt_stats["total_tokens"])
+        print(f"🧮 Prompt {prompt_stats['total_tokens']}/{prompt_stats['budget']} tokens "
+              f"(context {prompt_stats['context_tokens']}, {prompt_stats['documents_used']} docs; "
+              f"history {prompt_stats['history_tokens']}, {prompt_stats['history_messages_kept']} kept, "
+              f"{prompt_stats['history_messages_dropped']} dropped)")
+
+        turn["prompt_stats"] = prompt_stats
+        turn["relevant_docs"] = relevant_docs
+        turn["relevant_metadata"] = relevant_metadata
+        turn["messages"] = messages
+        return turn
+
+    def _match_faq(self, user_message: str, intent_info: Dict, query_embedding,
+                   lexical_hits: List[Dict]) -> Optional[Dict]:
+        """FAQ entry the message asks (nearly) verbatim, if direct answers are on for its intent"""
+        intent = intent_info['intent']
+        if not self.faq_answers.enabled(intent):
+            return None
+
+        if query_embedding is None:
+            # The lexical fast path skipped the encoder; only pay for it when BM25 points at an FAQ too
+            if not lexical_hits or lexical_hits[0]["metadata"].get("category") != "faq":
+                return None
+            query_embedding = self.embed_query(user_message)
+
+        with time_stage("events", "faq_match"):
+            match = self.faq_answers.match(intent, query_embedding)
+        if match:
+            print(f"📖 FAQ direct answer: {match['question']} (distance {match['distance']:.3f})")
+        return match
+
+    def _lead_capture_prompt(self, high_intent_analysis: Dict) -> Optional[str]:
+        """Follow-up asking for contact details when high intent is detected"""
+        if not (high_intent_analysis["has_high_intent"] and high_intent_analysis["should_capture_lead"]):
+            return None
+
+        if high_intent_analysis["lead_category"] == "sponsor_vendor":
+            return "\n\n💡 I'd love to connect you with our team for detailed sponsorship/vendor information. Would you mind sharing your email or phone number so Brian Dobson can reach out directly with personalized package details?"
+        elif high_intent_analysis["lead_category"] == "competitor":
+            return "\n\n💪 Ready to compete? I can have our team reach out with registration guidance and prep resources. What's the best email or phone to contact you?"
+        elif high_intent_analysis["lead_category"] == "coaching":
+            return "\n\n🏋️ I can connect you with qualified prep coaches in Texas. Share your email or phone and we'll send you coach referral information."
+        return None
+
+    def _complete_turn(self, turn: Dict, assistant_message: str) -> Dict:
+        """
+        Everything after the LLM call: response caching, high-intent detection,
+        lead capture prompt and conversation history
+        """
+        user_message = turn["user_message"]
+        intent_info = turn["intent_info"]
+
+        # Only context-free answers are safe to reuse for other users (and only
+        # if the knowledge base wasn't reloaded while this one was generated)
+        if (not turn["cached"] and not turn["division_placement"] and turn["is_first_turn"]
+                and turn["kb_version"] == self.kb_version):
+            self.response_cache.store(turn["cache_intent"], user_message, turn["query_embedding"], {
+                "response": assistant_message,
+                "relevant_sources": turn["relevant_docs"],
+                "relevant_metadata": turn["relevant_metadata"]
+            })
+
+        # Detect high intent for lead capture
+        with time_stage("events", "high_intent_detection"):
+            high_intent_analysis = self.detect_high_intent(user_message, assistant_message, intent_info)
+
+        # Add lead capture prompt if high intent detected
+        lead_capture_prompt = self._lead_capture_prompt(high_intent_analysis)
+        if lead_capture_prompt:
+            assistant_message += lead_capture_prompt
+
+        # Update conversation history
+        with time_stage("events", "session_update"):
+            self.conversation_history.append(
+                turn["conv_key"],
+                {"role": "user", "content": user_message},
+                {"role": "assistant", "content": assistant_message}
+            )
+
+        return {
+            "response": assistant_message,
+            "relevant_sources": turn["relevant_docs"],
+            "relevant_metadata": turn["relevant_metadata"],
+            "conversation_id": turn["conv_key"],
+            "timestamp": datetime.now().isoformat(),
+            "model": self.model,
+            "intent": intent_info,
+            "high_intent_detected": high_intent_analysis["has_high_intent"],
+            "requires_lead_capture": high_intent_analysis["should_capture_lead"],
+            "lead_category": high_intent_analysis.get("lead_category"),
+            "intent_types": high_intent_analysis.get("intent_types", []),
+            "lead_capture_prompt": lead_capture_prompt,
+            "cache_hit": turn["cached"] is not None and not turn["faq_answer"],
+            "faq_answer": turn["faq_answer"],
+            "division_placement": turn["division_placement"]
+        }
+
+    def _stream_summary(self, result: Dict) -> Dict:
+        """Payload of the final `done` event of a streamed turn"""
+        return {
+            "conversation_id": result["conversation_id"],
+            "timestamp": result["timestamp"],
+            "intent": result["intent"],
+            "high_intent_detected": result["high_intent_detected"],
+            "requires_lead_capture": result["requires_lead_capture"],
+            "lead_category": result["lead_category"],
+            "lead_capture_prompt": result["lead_capture_prompt"],
+            "cache_hit": result["cache_hit"],
+            "faq_answer": result["faq_answer"]
+        }
+
+    @staticmethod
+    def _conversation_key(user_id: str, conversation_id: str = None) -> str:
+        return f"{user_id}_{conversation_id}" if conversation_id else user_id
+
+    @staticmethod
+    def _error_result(error: Exception) -> Dict:
+        record_error("events", "chat")
+        return {
+            "response": f"I apologize, but I'm experiencing technical difficulties. Please contact Brian Dobson directly at brian@metroflexgym.com or call 817-465-9331.",
+            "error": str(error),
+            "timestamp": datetime.now().isoformat()
+        }
+
+    @classmethod
+    def _batch_error_result(cls, error: Exception) -> Dict:
+        """Result of a batch item that got no answer; items shed by the LLM gateway are marked retryable"""
+        if not isinstance(error, LLMOverloaded):
+            return cls._error_result(error)
+        # No canned reply: the item was never answered, and its conversation
+        # history is untouched, so the caller can send it again
+        return {
+            "response": None,
+            "error": str(error),
+            "overloaded": True,
+            "retry_after": error.retry_after,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    @staticmethod
+    def _stream_error(error: Exception) -> Dict:
+        # Headers are already sent when the gateway sheds a stream: pass Retry-After in the event
+        data = {
+            "response": f"I apologize, but I'm experiencing technical difficulties. Please contact Brian Dobson directly at brian@metroflexgym.com or call 817-465-9331.",
+            "error": str(error),
+            "timestamp": datetime.now().isoformat()
+        }
+        if isinstance(error, LLMOverloaded):
+            data["retry_after"] = error.retry_after
+        return data
+
+    @staticmethod
+    def _flight_key(turn: Dict) -> Optional[Tuple]:
+        """
+        Single-flight key of a turn: only first turns (no history) have a prompt
+        fully determined by the question, retrieved documents and intent
+        """
+        if not turn["is_first_turn"]:
+            return None
+        doc_ids = tuple(content_id(doc, meta) for doc, meta in zip(turn["relevant_docs"], turn["relevant_metadata"]))
+        return (normalize_query(turn["user_message"]), doc_ids, turn["intent_info"]["intent"])
+
+    def _generate(self, turn: Dict, priority: str = INTERACTIVE) -> str:
+        """
+        Cached or FAQ answer, or a cleaned GPT-4o-mini completion for the turn's
+        messages (through the LLM gateway at `priority`)
+        """
+        if turn["cached"]:
+            return turn["cached"]['response']
+
+        def complete() -> str:
+            # Call OpenAI GPT-4o-mini (v1.0+ syntax)
+            with get_llm_gateway().slot(priority), time_stage("events", "llm_completion"):
+                response = self.openai_client.chat.completions.create(
+                    model=self.model,
+                    messages=turn["messages"],
+                    temperature=0.7,
+                    max_tokens=400  # Increased for better responses
+                )
+            record_llm_usage("events", response, self.model)
+
+            # Clean markdown formatting for natural responses
+            with time_stage("events", "markdown_cleaning"):
+                return self.clean_markdown_formatting(response.choices[0].message.content)
+
+        flight_key = self._flight_key(turn)
+        return complete() if flight_key is None else self.llm_flights.do(flight_key, complete)
+
+    async def _agenerate(self, turn: Dict, priority: str = INTERACTIVE) -> str:
+        """Async variant of _generate()"""
+        if turn["cached"]:
+            return turn["cached"]['response']
+
+        async def complete() -> str:
+            async with get_llm_gateway().aslot(priority):
+                with time_stage("events", "llm_completion"):
+                    response = await self.async_openai_client.chat.completions.create(
+                        model=self.model,
+                        messages=turn["messages"],
+                        temperature=0.7,
+                        max_tokens=400
+                    )
+            record_llm_usage("events", response, self.model)
+            with time_stage("events", "markdown_cleaning"):
+                return self.clean_markdown_formatting(response.choices[0].message.content)
+
+        flight_key = self._flight_key(turn)
+        return await complete() if flight_key is None else await self.llm_flights.ado(flight_key, complete)
+
     def chat(self, user_message: str, user_id: str = "default", conversation_id: str = None) -> Dict:
         """
         Process user message with enhanced RAG and lead capture
@@ -649,84 +1277,194 @@ Remember: You represent 38+ years of champion-making excellence. Be confident, h
                 "lead_capture_prompt": Optional[str]
             }
         """
-        # Classify query intent
-        intent_info = self.classify_query_intent(user_message)
+        turn = self._prepare_turn(user_message, user_id, conversation_id)
 
-        # Retrieve relevant context with intent-based filtering
-        relevant_docs, relevant_metadata = self.retrieve_relevant_context(user_message, intent_info, n_results=3)
-        context = "\n\n".join([f"[Knowledge Base]: {doc}" for doc in relevant_docs])
+        try:
+            return self._complete_turn(turn, self._generate(turn))
 
-        # Get or create conversation history
-        conv_key = f"{user_id}_{conversation_id}" if conversation_id else user_id
-        if conv_key not in self.conversation_history:
-            self.conversation_history[conv_key] = []
+        except LLMOverloaded:
+            # The server answers 429 + Retry-After
+            raise
+        except Exception as e:
+            return self._error_result(e)
 
-        # Build messages for OpenAI
-        messages = [
-            {"role": "system", "content": self.system_prompt},
-            {"role": "system", "content": f"Retrieved Context (Intent: {intent_info['intent']}):\n{context}"}
-        ]
+    def chat_stream(self, user_message: str, user_id: str = "default", conversation_id: str = None) -> Iterator[Dict]:
+        """
+        Streaming variant of chat()
 
-        # Add conversation history (last 10 exchanges)
-        messages.extend(self.conversation_history[conv_key][-10:])
+        Yields events as the completion is generated:
+            {"event": "token", "data": {"text": str}}  - cleaned text, in order
+            {"event": "done", "data": {...}}           - intent, high-intent and lead capture prompt
+            {"event": "error", "data": {...}}          - on failure
+        """
+        try:
+            turn = self._prepare_turn(user_message, user_id, conversation_id)
 
-        # Add current user message
-        messages.append({"role": "user", "content": user_message})
+            if turn["cached"]:
+                assistant_message = turn["cached"]['response']
+                yield {"event": "token", "data": {"text": assistant_message}}
+            else:
+                # The gateway slot is held until the last chunk has arrived
+                with get_llm_gateway().slot(INTERACTIVE):
+                    stream = self.openai_client.chat.completions.create(
+                        model=self.model,
+                        messages=turn["messages"],
+                        temperature=0.7,
+                        max_tokens=400,
+                        stream=True
+                    )
+
+                    # Clean markdown incrementally so tokens can be forwarded immediately
+                    cleaner = MarkdownStreamCleaner()
+                    for chunk in stream:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        text = cleaner.feed(delta) if delta else ""
+                        if text:
+                            yield {"event": "token", "data": {"text": text}}
+
+                text = cleaner.flush()
+                if text:
+                    yield {"event": "token", "data": {"text": text}}
+                assistant_message = cleaner.text
+
+            result = self._complete_turn(turn, assistant_message)
+            yield {"event": "done", "data": self._stream_summary(result)}
+
+        except Exception as e:
+            record_error("events", "chat_stream")
+            yield {"event": "error", "data": self._stream_error(e)}
+
+    async def achat(self, user_message: str, user_id: str = "default", conversation_id: str = None) -> Dict:
+        """
+        Async variant of chat() for the ASGI server
+
+        Query encoding and retrieval run in a worker thread; the OpenAI call
+        is awaited, so no thread is held while the completion is generated.
+        """
+        turn = await asyncio.to_thread(self._prepare_turn, user_message, user_id, conversation_id)
 
         try:
-            # Call OpenAI GPT-4o-mini (v1.0+ syntax)
-            response = self.openai_client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=400  # Increased for better responses
-            )
+            return self._complete_turn(turn, await self._agenerate(turn))
 
-            assistant_message = response.choices[0].message.content
+        except LLMOverloaded:
+            raise
+        except Exception as e:
+            return self._error_result(e)
 
-            # Clean markdown formatting for natural responses
-            assistant_message = self.clean_markdown_formatting(assistant_message)
+    async def achat_stream(self, user_message: str, user_id: str = "default", conversation_id: str = None) -> AsyncIterator[Dict]:
+        """Async variant of chat_stream(); yields the same events"""
+        try:
+            turn = await asyncio.to_thread(self._prepare_turn, user_message, user_id, conversation_id)
 
-            # Detect high intent for lead capture
-            high_intent_analysis = self.detect_high_intent(user_message, assistant_message, intent_info)
+            if turn["cached"]:
+                assistant_message = turn["cached"]['response']
+                yield {"event": "token", "data": {"text": assistant_message}}
+            else:
+                async with get_llm_gateway().aslot(INTERACTIVE):
+                    stream = await self.async_openai_client.chat.completions.create(
+                        model=self.model,
+                        messages=turn["messages"],
+                        temperature=0.7,
+                        max_tokens=400,
+                        stream=True
+                    )
+
+                    cleaner = MarkdownStreamCleaner()
+                    async for chunk in stream:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        text = cleaner.feed(delta) if delta else ""
+                        if text:
+                            yield {"event": "token", "data": {"text": text}}
+
+                text = cleaner.flush()
+                if text:
+                    yield {"event": "token", "data": {"text": text}}
+                assistant_message = cleaner.text
+
+            result = self._complete_turn(turn, assistant_message)
+            yield {"event": "done", "data": self._stream_summary(result)}
 
-            # Add lead capture prompt if high intent detected
-            lead_capture_prompt = None
-            if high_intent_analysis["has_high_intent"] and high_intent_analysis["should_capture_lead"]:
-                if high_intent_analysis["lead_category"] == "sponsor_vendor":
-                    lead_capture_prompt = "\n\n💡 I'd love to connect you with our team for detailed sponsorship/vendor information. Would you mind sharing your email or phone number so Brian Dobson can reach out directly with personalized package details?"
-                elif high_intent_analysis["lead_category"] == "competitor":
-                    lead_capture_prompt = "\n\n💪 Ready to compete? I can have our team reach out with registration guidance and prep resources. What's the best email or phone to contact you?"
-                elif high_intent_analysis["lead_category"] == "coaching":
-                    lead_capture_prompt = "\n\n🏋️ I can connect you with qualified prep coaches in Texas. Share your email or phone and we'll send you coach referral information."
+        except Exception as e:
+            record_error("events", "chat_stream")
+            yield {"event": "error", "data": self._stream_error(e)}
 
-                if lead_capture_prompt:
-                    assistant_message += lead_capture_prompt
+    def _batch_waves(self, items: List[Dict]) -> List[List[int]]:
+        """
+        Split batch items into waves holding at most one message per
+        conversation, so follow-up messages see the earlier answers
+        """
+        waves: List[List[int]] = []
+        occurrences: Dict[str, int] = {}
+        for index, item in enumerate(items):
+            conv_key = self._conversation_key(item.get("user_id", "default"), item.get("conversation_id"))
+            wave = occurrences.get(conv_key, 0)
+            occurrences[conv_key] = wave + 1
+            if wave == len(waves):
+                waves.append([])
+            waves[wave].append(index)
+        return waves
+
+    def _prepare_batch(self, items: List[Dict], indices: List[int], results: List[Optional[Dict]]) -> Dict[int, Dict]:
+        """Prepare the turns of one wave; items that fail get their error result directly"""
+        analyses = self._analyze_queries([items[i]["message"] for i in indices])
+        turns = {}
+        for i, analysis in zip(indices, analyses):
+            item = items[i]
+            try:
+                turns[i] = self._prepare_turn(item["message"], item.get("user_id", "default"),
+                                              item.get("conversation_id"), analysis)
+            except Exception as e:
+                results[i] = self._batch_error_result(e)
+        return turns
+
+    def chat_batch(self, items: List[Dict], max_concurrency: int = 8) -> List[Dict]:
+        """
+        Answer many messages at once (e.g. queued inbound questions after a campaign)
 
-            # Update conversation history
-            self.conversation_history[conv_key].append({"role": "user", "content": user_message})
-            self.conversation_history[conv_key].append({"role": "assistant", "content": assistant_message})
+        Args:
+            items: [{"message", "user_id", "conversation_id"}]
+            max_concurrency: Completions in flight at the same time
 
-            return {
-                "response": assistant_message,
-                "relevant_sources": relevant_docs,
-                "relevant_metadata": relevant_metadata,
-                "conversation_id": conv_key,
-                "timestamp": datetime.now().isoformat(),
-                "model": self.model,
-                "intent": intent_info,
-                "high_intent_detected": high_intent_analysis["has_high_intent"],
-                "requires_lead_capture": high_intent_analysis["should_capture_lead"],
-                "lead_category": high_intent_analysis.get("lead_category"),
-                "intent_types": high_intent_analysis.get("intent_types", [])
-            }
+        Intents, lexical hits and query embeddings are computed for the whole
+        batch up front (one encoder batch), then the completions run
+        concurrently. Messages of the same conversation are answered in order.
 
-        except Exception as e:
-            return {
-                "response": f"I apologize, but I'm experiencing technical difficulties. Please contact Brian Dobson directly at brian@metroflexgym.com or call 817-465-9331.",
-                "error": str(e),
-                "timestamp": datetime.now().isoformat()
-            }
+        Returns:
+            One chat() result per item, in input order; an item the LLM gateway
+            shed has "overloaded": True and "retry_after" instead of a response
+        """
+        results: List[Optional[Dict]] = [None] * len(items)
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="chat-batch") as pool:
+            for wave in self._batch_waves(items):
+                turns = self._prepare_batch(items, wave, results)
+                futures = {i: pool.submit(self._generate, turn, BATCH) for i, turn in turns.items()}
+                for i, future in futures.items():
+                    try:
+                        results[i] = self._complete_turn(turns[i], future.result())
+                    except Exception as e:
+                        results[i] = self._batch_error_result(e)
+        return results
+
+    async def achat_batch(self, items: List[Dict], max_concurrency: int = 8) -> List[Dict]:
+        """Async variant of chat_batch(); completions are awaited under a semaphore"""
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def generate(turn: Dict) -> str:
+            async with semaphore:
+                return await self._agenerate(turn, BATCH)
+
+        results: List[Optional[Dict]] = [None] * len(items)
+        for wave in self._batch_waves(items):
+            turns = await asyncio.to_thread(self._prepare_batch, items, wave, results)
+            outputs = await asyncio.gather(*(generate(turn) for turn in turns.values()), return_exceptions=True)
+            for (i, turn), output in zip(turns.items(), outputs):
+                try:
+                    if isinstance(output, Exception):
+                        raise output
+                    results[i] = self._complete_turn(turn, output)
+                except Exception as e:
+                    results[i] = self._batch_error_result(e)
+        return results
 
     def capture_lead(self, user_id: str, contact_info: Dict, conversation_id: str = None) -> bool:
         """
@@ -740,12 +1478,13 @@ Remember: You represent 38+ years of champion-making excellence. Be confident, h
         Returns:
             True if captured successfully
         """
-        conv_key = f"{user_id}_{conversation_id}" if conversation_id else user_id
+        conv_key = self._conversation_key(user_id, conversation_id)
 
         # Get last message metadata to determine intent
-        if conv_key in self.conversation_history and len(self.conversation_history[conv_key]) > 0:
+        history = self.conversation_history.get(conv_key)
+        if len(history) > 0:
             # Re-analyze last exchange for intent
-            last_user_msg = next((msg['content'] for msg in reversed(self.conversation_history[conv_key]) if msg['role'] == 'user'), "")
+            last_user_msg = next((msg['content'] for msg in reversed(history) if msg['role'] == 'user'), "")
             intent_info = self.classify_query_intent(last_user_msg)
             high_intent = self.detect_high_intent(last_user_msg, "", intent_info)
 
@@ -767,7 +1506,7 @@ Remember: You represent 38+ years of champion-making excellence. Be confident, h
 
 
 # Flask webhook for GHL integration
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 
@@ -776,13 +1515,124 @@ load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
+instrument_flask(app, "events")
 
 # Initialize enhanced agent
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
-KNOWLEDGE_BASE_PATH = "METROFLEX_EVENTS_KB_V2_RESEARCH_BASED.json"
+# Events-only layout; METROFLEX_EVENTS_KB_V2_RESEARCH_BASED.json lacks sections the agent indexes
+KNOWLEDGE_BASE_PATH = os.getenv("EVENTS_KB_PATH", "METROFLEX_EVENTS_KB_V3_EVENTS_ONLY.json")
 
 agent = MetroFlexAIAgentEnhanced(KNOWLEDGE_BASE_PATH, OPENAI_API_KEY)
 
+
+def start_background_work():
+    """Start delivering leads still queued in the outbox from before a restart"""
+    if agent.ghl_outbox is not None:
+        agent.ghl_outbox.start()
+
+
+# Under a preloading Gunicorn master (AGENT_WARMUP_AFTER_FORK, see
+# gunicorn.conf.py) this runs in each worker from post_fork instead
+if os.getenv("AGENT_WARMUP_AFTER_FORK", "false").lower() != "true":
+    start_background_work()
+
+# Shared secret for /admin endpoints (sent as X-Admin-Key); unset disables them
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "")
+
+
+def admin_authorized(provided_key: Optional[str]) -> bool:
+    return bool(ADMIN_API_KEY) and hmac.compare_digest(provided_key or "", ADMIN_API_KEY)
+
+# Batch endpoint limits (a client may ask for less concurrency, never more).
+# Batch chat completions run in the LLM gateway's batch class, so the
+# effective concurrency is also capped by LLM_BATCH_CONCURRENCY (default 2):
+# raise both to scale batch throughput
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "500"))
+CHAT_BATCH_MAX_CONCURRENCY = int(os.getenv("CHAT_BATCH_MAX_CONCURRENCY", "8"))
+
+
+def chat_payload(response_data: Dict) -> Dict:
+    """Webhook response for one chat() result"""
+    if response_data.get('overloaded'):
+        return {
+            "success": False,
+            "retryable": True,
+            "error": response_data['error'],
+            "retry_after": response_data['retry_after'],
+            "timestamp": response_data['timestamp']
+        }
+    payload = {
+        "success": True,
+        "response": response_data['response'],
+        "timestamp": response_data['timestamp'],
+        "intent": response_data.get('intent', {}),
+        "high_intent_detected": response_data.get('high_intent_detected', False),
+        "requires_lead_capture": response_data.get('requires_lead_capture', False)
+    }
+    if 'error' in response_data:
+        payload["error"] = response_data['error']
+    return payload
+
+
+def batch_payload(results: List[Dict], max_concurrency: int) -> Tuple[Dict, int, Dict]:
+    """
+    (body, status, headers) of a /webhook/chat/batch response
+
+    The body reports the concurrency the batch actually ran with. Items shed
+    by the LLM gateway are marked retryable and Retry-After is set to the
+    longest of their waits; the status is 429 when every item was shed, else
+    200 (the answered items must not be sent again).
+    """
+    shed = [result['retry_after'] for result in results if result.get('overloaded')]
+    body = {
+        "success": len(shed) < len(results),
+        "max_concurrency": max_concurrency,
+        "results": [chat_payload(result) for result in results]
+    }
+    if not shed:
+        return body, 200, {}
+    body["shed"] = len(shed)
+    body["retry_after"] = max(shed)
+    return body, 429 if len(shed) == len(results) else 200, {"Retry-After": str(max(shed))}
+
+
+def parse_batch_request(data: Dict) -> Tuple[List[Dict], int]:
+    """
+    Validate a /webhook/chat/batch body
+
+    Returns:
+        (items, max_concurrency): the concurrency asked for, capped by
+        CHAT_BATCH_MAX_CONCURRENCY and the gateway's batch class limit
+
+    Raises:
+        ValueError: with a message suitable for a 400 response
+    """
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError("No items provided")
+    if len(items) > CHAT_BATCH_MAX_ITEMS:
+        raise ValueError(f"Too many items ({len(items)}), the limit is {CHAT_BATCH_MAX_ITEMS}")
+
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('message'):
+            raise ValueError(f"items[{index}]: No message provided")
+        parsed.append({
+            "message": item['message'],
+            "user_id": item.get('user_id', 'anonymous'),
+            "conversation_id": item.get('conversation_id')
+        })
+
+    try:
+        max_concurrency = int(data.get('max_concurrency', CHAT_BATCH_MAX_CONCURRENCY))
+    except (TypeError, ValueError):
+        raise ValueError("max_concurrency must be an integer")
+    # More threads than batch slots would only queue in the gateway (and
+    # fill the batch queue that workflow generation shares)
+    batch_slots = get_llm_gateway().class_limits[BATCH]
+    return parsed, max(1, min(max_concurrency, CHAT_BATCH_MAX_CONCURRENCY, batch_slots))
+
+
 @app.route('/webhook/chat', methods=['POST'])
 def ghl_webhook():
     """
@@ -822,18 +1672,72 @@ def ghl_webhook():
         # Process message with enhanced AI agent
         response_data = agent.chat(user_message, user_id, conversation_id)
 
-        return jsonify({
-            "success": True,
-            "response": response_data['response'],
-            "timestamp": response_data['timestamp'],
-            "intent": response_data.get('intent', {}),
-            "high_intent_detected": response_data.get('high_intent_detected', False),
-            "requires_lead_capture": response_data.get('requires_lead_capture', False)
-        })
+        return jsonify(chat_payload(response_data))
+
+    except LLMOverloaded as e:
+        body, status, headers = overloaded_response(e)
+        return jsonify(body), status, headers
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/webhook/chat/batch', methods=['POST'])
+def ghl_webhook_batch():
+    """
+    Batch chat endpoint, for replaying queued GHL messages in one request
+
+    Expected payload:
+    {
+        "items": [{"message": "...", "user_id": "...", "conversation_id": "..."}, ...],
+        "max_concurrency": 8  (optional, capped by CHAT_BATCH_MAX_CONCURRENCY and LLM_BATCH_CONCURRENCY)
+    }
+
+    Returns {"success": true, "max_concurrency": N, "results": [...]} with
+    the concurrency actually used and one /webhook/chat style result per
+    item, in input order. Lead capture (contact_info) stays on
+    /webhook/chat. Items shed under load come back as {"success": false,
+    "retryable": true, "retry_after": N} with a Retry-After header (429 if
+    every item was shed); send only those again.
+    """
+    try:
+        items, max_concurrency = parse_batch_request(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        results = agent.chat_batch(items, max_concurrency)
+        body, status, headers = batch_payload(results, max_concurrency)
+        return jsonify(body), status, headers
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/webhook/chat/stream', methods=['POST'])
+def ghl_webhook_stream():
+    """
+    Streaming chat endpoint (Server-Sent Events)
+
+    Same payload as /webhook/chat. Emits `token` events with cleaned text as
+    the model generates it, then one `done` event carrying intent, high-intent
+    detection and the lead capture prompt (or an `error` event).
+    """
+    data = request.json or {}
+    user_message = data.get('message', '')
+    user_id = data.get('user_id', 'anonymous')
+    conversation_id = data.get('conversation_id')
+
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+
+    def generate():
+        for event in agent.chat_stream(user_message, user_id, conversation_id):
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -844,6 +1748,44 @@ def health_check():
         "features": ["intent_classification", "lead_capture", "vendor_database", "rag_optimization"]
     })
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Semantic response cache, query embedding / retrieval cache, single-flight and FAQ direct-answer counters"""
+    return jsonify({**agent.response_cache.stats(), **agent.query_cache.stats(),
+                    "single_flight": agent.llm_flights.stats(),
+                    "faq_direct_answers": agent.faq_answers.stats()})
+
+@app.route('/sessions/stats', methods=['GET'])
+def session_stats():
+    """Conversation store size and eviction counters"""
+    return jsonify(agent.conversation_history.stats())
+
+@app.route('/outbox/stats', methods=['GET'])
+def outbox_stats():
+    """GHL lead outbox queue depth and delivery lag"""
+    return jsonify(get_outbox().stats())
+
+@app.route('/retrieval/stats', methods=['GET'])
+def retrieval_stats():
+    """Per-path retrieval latency (lexical fast path vs hybrid) and shared index namespaces"""
+    return jsonify({**agent.retrieval_latency.stats(), "index": agent.retrieval.stats()})
+
+@app.route('/admin/reload-kb', methods=['POST'])
+def reload_knowledge_base():
+    """
+    Re-read the knowledge base JSON and sync the index without a restart
+
+    Requires the X-Admin-Key header. Only reloads the worker that serves the
+    request; set KB_RELOAD_INTERVAL_SECONDS to have every worker watch the file.
+    """
+    if not admin_authorized(request.headers.get('X-Admin-Key')):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    try:
+        return jsonify({"success": True, **agent.reload_knowledge_base()})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/webhook/test-intent', methods=['POST'])
 def test_intent_classification():
     """Test endpoint for intent classification"""
@@ -867,7 +1809,15 @@ if __name__ == "__main__":
     print("📊 Vector database ready with intent classification")
     print("🎯 Lead capture system active")
     print("💬 Chat endpoint: POST /webhook/chat")
+    print("📡 Streaming chat: POST /webhook/chat/stream (SSE)")
+    print("📦 Batch chat: POST /webhook/chat/batch")
     print("🧪 Test intent: POST /webhook/test-intent")
+    print("🗄️  Cache stats: GET /cache/stats")
+    print("🧵 Session stats: GET /sessions/stats")
+    print("📬 GHL outbox stats: GET /outbox/stats")
+    print("⏱️  Retrieval latency: GET /retrieval/stats")
+    print("🔄 Reload knowledge base: POST /admin/reload-kb")
+    print("📈 Prometheus metrics: GET /metrics")
     print("❤️  Health check: GET /health")
     print("")
     print("✨ NEW FEATURES:")
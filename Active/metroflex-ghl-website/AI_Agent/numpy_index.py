@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+MetroFlex NumPy Vector Index
+Brute-force cosine retrieval for small knowledge bases
+
+The METROFLEX knowledge bases hold a few hundred documents, where one
+matrix-vector product over every embedding is cheaper than Chroma's HNSW
+graph, SQLite metadata layer and client overhead. Embeddings live
+L2-normalised in one contiguous float32 matrix; metadata filters such as
+{"category": "event"} (or several under "$and") become cached boolean masks.
+
+NumpyVectorIndex implements the subset of the Chroma collection API the
+agents use (get/add/upsert/delete/query/count), so it drops in wherever a
+collection is expected, including vector_index.sync_collection. With a
+`path` it persists to embeddings.npy + rows.json and reloads on restart;
+with `mmap=True` the matrix is served read-only from the memory-mapped
+file, so every Gunicorn worker on the host shares one copy in the page cache.
+
+Several processes may write the same directory (workers re-syncing after a
+knowledge base reload, agents in other processes adding their namespaces).
+Every write is a read-modify-write under an exclusive lock on the
+directory's .lock file: the process first reloads rows.json and the matrix
+if another one saved since, applies its change on top, saves and re-maps,
+so rows and matrix always come from the same save and no writer drops rows
+it never loaded.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, one writer per directory
+    fcntl = None
+
+
+class NumpyVectorIndex:
+    def __init__(self, embedding_function: Optional[Callable] = None, path: Optional[str] = None,
+                 dimensions: Optional[int] = None, mmap: bool = False):
+        """
+        Args:
+            embedding_function: Callable(list of texts) -> list of vectors; needed
+                when documents/query_texts are passed without embeddings
+            path: Directory to persist the index in (None keeps it in memory)
+            dimensions: Embedding size, if known before the first insert
+            mmap: Memory-map embeddings.npy instead of reading it into the heap
+                (only with `path`)
+        """
+        self.embedding_function = embedding_function
+        self.path = path
+        self.mmap = bool(mmap and path)
+        self._lock = threading.RLock()
+
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._positions: Dict[str, int] = {}
+        self._matrix = np.zeros((0, dimensions or 0), dtype=np.float32)
+        self._masks: Dict[tuple, np.ndarray] = {}
+        # rows.json as of this process's last load or save, see _refresh()
+        self._version: Optional[tuple] = None
+
+        if path:
+            with self._file_lock():
+                self._refresh()
+
+    # ------------------------------------------------------------------ storage
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the index directory, held from reading the files to replacing them"""
+        if not self.path or fcntl is None:
+            yield
+            return
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _disk_version(self) -> Optional[tuple]:
+        if not self.path:
+            return None
+        try:
+            stat = os.stat(os.path.join(self.path, "rows.json"))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        """Reload from disk if another process saved since this one last did (call under _file_lock)"""
+        version = self._disk_version()
+        if version is not None and version != self._version:
+            self._load()
+            self._version = version
+
+    def _load(self):
+        with open(os.path.join(self.path, "rows.json"), "r") as f:
+            rows = json.load(f)
+        self._ids = rows["ids"]
+        self._documents = rows["documents"]
+        self._metadatas = rows["metadatas"]
+        self._positions = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        self._matrix = self._load_matrix()
+        self._masks.clear()
+
+    def _load_matrix(self) -> np.ndarray:
+        matrix_path = os.path.join(self.path, "embeddings.npy")
+        if self.mmap:
+            return np.load(matrix_path, mmap_mode="r")
+        return np.ascontiguousarray(np.load(matrix_path), dtype=np.float32)
+
+    def _save(self):
+        """Write both files (call under _file_lock, after _refresh)"""
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        # Write-then-rename so a reader never sees a half-written file
+        suffix = f".{os.getpid()}.tmp"
+        matrix_path = os.path.join(self.path, "embeddings.npy")
+        rows_path = os.path.join(self.path, "rows.json")
+        with open(matrix_path + suffix, "wb") as f:
+            np.save(f, self._matrix)
+        with open(rows_path + suffix, "w") as f:
+            json.dump({"ids": self._ids, "documents": self._documents, "metadatas": self._metadatas}, f)
+        os.replace(matrix_path + suffix, matrix_path)
+        os.replace(rows_path + suffix, rows_path)
+        self._version = self._disk_version()
+        if self.mmap:
+            # Serve from the new file's pages rather than this process's heap
+            # copy; still under the lock, so it is the matrix just written
+            self._matrix = self._load_matrix()
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[np.newaxis, :]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _embed(self, texts: Sequence[str]) -> np.ndarray:
+        if self.embedding_function is None:
+            raise ValueError("NumpyVectorIndex needs an embedding_function to embed texts")
+        return self._normalize(self.embedding_function(list(texts)))
+
+    # ------------------------------------------------------- Chroma-style API
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            include: Optional[List[str]] = None) -> Dict:
+        include = ["documents", "metadatas"] if include is None else include
+        with self._lock:
+            positions = range(len(self._ids)) if ids is None else [self._positions[i] for i in ids if i in self._positions]
+            mask = self._mask(where)
+            if mask is not None:
+                positions = [p for p in positions if mask[p]]
+            result = {"ids": [self._ids[p] for p in positions]}
+            if "documents" in include:
+                result["documents"] = [self._documents[p] for p in positions]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[p] for p in positions]
+            return result
+
+    def upsert(self, ids: List[str], documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict]] = None, embeddings=None):
+        """Insert or replace rows (embeds `documents` when no embeddings are given)"""
+        documents = documents if documents is not None else [""] * len(ids)
+        metadatas = metadatas if metadatas is not None else [{} for _ in ids]
+        vectors = self._normalize(embeddings) if embeddings is not None else self._embed(documents)
+
+        with self._lock, self._file_lock():
+            self._refresh()
+            new_rows = []
+            for i, doc_id in enumerate(ids):
+                position = self._positions.get(doc_id)
+                if position is None:
+                    new_rows.append(i)
+                    continue
+                if not self._matrix.flags.writeable:
+                    self._matrix = np.array(self._matrix)
+                self._matrix[position] = vectors[i]
+                self._documents[position] = documents[i]
+                self._metadatas[position] = metadatas[i]
+
+            if new_rows:
+                start = len(self._ids)
+                for offset, i in enumerate(new_rows):
+                    self._positions[ids[i]] = start + offset
+                    self._ids.append(ids[i])
+                    self._documents.append(documents[i])
+                    self._metadatas.append(metadatas[i])
+                existing = self._matrix if self._matrix.shape[0] else np.zeros((0, vectors.shape[1]), dtype=np.float32)
+                self._matrix = np.ascontiguousarray(np.vstack([existing, vectors[new_rows]]))
+
+            self._masks.clear()
+            self._save()
+
+    add = upsert
+
+    def delete(self, ids: List[str]):
+        with self._lock, self._file_lock():
+            self._refresh()
+            doomed = {self._positions[i] for i in ids if i in self._positions}
+            if not doomed:
+                return
+            keep = [p for p in range(len(self._ids)) if p not in doomed]
+            self._ids = [self._ids[p] for p in keep]
+            self._documents = [self._documents[p] for p in keep]
+            self._metadatas = [self._metadatas[p] for p in keep]
+            self._positions = {doc_id: i for i, doc_id in enumerate(self._ids)}
+            self._matrix = np.ascontiguousarray(self._matrix[keep])
+            self._masks.clear()
+            self._save()
+
+    def _mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Boolean row mask for equality filters (optionally under $and), cached per (field, value)"""
+        if not where:
+            return None
+        mask = None
+        for field, value in where.items():
+            if field == "$and":
+                for condition in value:
+                    condition_mask = self._mask(condition)
+                    if condition_mask is not None:
+                        mask = condition_mask if mask is None else mask & condition_mask
+                continue
+            if field.startswith("$") or isinstance(value, dict):
+                raise ValueError(f"NumpyVectorIndex only supports equality and $and filters, got {where}")
+            key = (field, value)
+            field_mask = self._masks.get(key)
+            if field_mask is None:
+                field_mask = np.fromiter((meta.get(field) == value for meta in self._metadatas),
+                                         dtype=bool, count=len(self._metadatas))
+                self._masks[key] = field_mask
+            mask = field_mask if mask is None else mask & field_mask
+        return mask
+
+    def query(self, query_embeddings=None, query_texts: Optional[List[str]] = None,
+              n_results: int = 10, where: Optional[Dict] = None, include: Optional[List[str]] = None) -> Dict:
+        """
+        Top-k rows by cosine similarity, one matrix-vector product per query
+
+        Returns Chroma's shape: {"ids", "documents", "metadatas", "distances"},
+        each a list with one inner list per query; distances are cosine distances.
+        """
+        queries = self._normalize(query_embeddings) if query_embeddings is not None else self._embed(query_texts)
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        with self._lock:
+            mask = self._mask(where)
+            candidates = int(mask.sum()) if mask is not None else len(self._ids)
+            k = min(n_results, candidates)
+
+            for query in queries:
+                if k == 0:
+                    top = np.zeros(0, dtype=np.int64)
+                    similarities = np.zeros(0, dtype=np.float32)
+                else:
+                    similarities = self._matrix @ query
+                    if mask is not None:
+                        similarities = np.where(mask, similarities, -np.inf)
+                    top = np.argpartition(-similarities, k - 1)[:k] if k < len(similarities) else np.arange(len(similarities))
+                    top = top[np.argsort(-similarities[top], kind="stable")]
+
+                result["ids"].append([self._ids[p] for p in top])
+                result["documents"].append([self._documents[p] for p in top])
+                result["metadatas"].append([self._metadatas[p] for p in top])
+                result["distances"].append([float(1.0 - similarities[p]) for p in top])
+
+        return result
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Prompt Budget
+Token-budgeted assembly of chat prompts
+
+Fits the system prompt, retrieved context and conversation history into a
+fixed input-token budget so long sessions don't send ever larger prompts:
+  - the system prompt and the current user message are always sent
+  - retrieved documents are added best-first up to the context allowance;
+    the first one that doesn't fit is truncated, the rest are dropped
+  - history fills what is left, newest exchange first; older exchanges that
+    don't fit are replaced by a one-line summary of the earlier questions
+
+Tokens are counted locally with tiktoken (o200k_base, GPT-4o's encoding)
+when it is installed and its encoding files are available, otherwise
+estimated at ~4 characters per token.
+"""
+
+import math
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Per-message framing overhead of the chat format, plus the reply primer
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_PRIMER_TOKENS = 3
+
+# A truncated document shorter than this is not worth sending
+MIN_DOCUMENT_TOKENS = 40
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            # Not installed, or the encoding can't be downloaded: estimate instead
+            _encoding = None
+    return _encoding
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """Token count of `text` (exact with tiktoken, estimated otherwise)"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of `text` within `max_tokens`, cut at a word boundary"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _get_encoding()
+    if encoding is not None:
+        prefix = encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    else:
+        prefix = text[:max_tokens * 4]
+    cut = prefix.rfind(" ")
+    return (prefix[:cut] if cut > len(prefix) // 2 else prefix).rstrip() + "..."
+
+
+def message_tokens(message: Dict) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+class PromptBudget:
+    def __init__(self, max_tokens: int = 3000, max_context_tokens: int = 1200, max_history_messages: int = 10):
+        """
+        Args:
+            max_tokens: Input-token budget for the whole prompt
+            max_context_tokens: Upper bound for retrieved context within that budget
+            max_history_messages: Most recent history messages considered at all
+        """
+        self.max_tokens = max_tokens
+        self.max_context_tokens = max_context_tokens
+        self.max_history_messages = max_history_messages
+
+    def _fit_context(self, header: str, documents: List[str], allowance: int) -> Tuple[Optional[str], int]:
+        """Context message text within `allowance` tokens, and how many documents made it in"""
+        parts = []
+        used = count_tokens(header) + MESSAGE_OVERHEAD_TOKENS
+        for document in documents:
+            text = f"[Knowledge Base]: {document}"
+            cost = count_tokens(text) + 1
+            if used + cost <= allowance:
+                parts.append(text)
+                used += cost
+                continue
+            # Documents arrive best-first: trim the first one that doesn't fit, drop the rest
+            remaining = allowance - used - 1
+            if remaining >= MIN_DOCUMENT_TOKENS:
+                parts.append(truncate_to_tokens(text, remaining))
+            break
+
+        if not parts:
+            return None, 0
+        return header + "\n" + "\n\n".join(parts), len(parts)
+
+    @staticmethod
+    def _summary(dropped: List[Dict], allowance: int) -> Optional[Dict]:
+        """One system message recalling the most recent of the dropped user questions"""
+        prefix = "Earlier in this conversation the user asked: "
+        remaining = allowance - MESSAGE_OVERHEAD_TOKENS - count_tokens(prefix)
+        questions: List[str] = []
+        for message in reversed(dropped):
+            if message["role"] != "user":
+                continue
+            cost = count_tokens(message["content"]) + 1
+            if cost > remaining:
+                break
+            questions.insert(0, message["content"])
+            remaining -= cost
+
+        if not questions:
+            return None
+        return {"role": "system", "content": prefix + " | ".join(questions)}
+
+    def assemble(self, system_prompt: str, context_header: str, documents: List[str],
+                 history: List[Dict], user_message: str) -> Tuple[List[Dict], Dict]:
+        """
+        Build the OpenAI message list within the budget
+
+        Returns:
+            (messages, stats) where stats has the token count of each part and
+            how many documents / history messages were kept or dropped
+        """
+        system = {"role": "system", "content": system_prompt}
+        user = {"role": "user", "content": user_message}
+        fixed = message_tokens(system) + message_tokens(user) + REPLY_PRIMER_TOKENS
+        available = max(0, self.max_tokens - fixed)
+
+        context_text, documents_used = self._fit_context(
+            context_header, documents, min(self.max_context_tokens, available)
+        )
+        context = {"role": "system", "content": context_text} if context_text else None
+        context_tokens = message_tokens(context) if context else 0
+        available -= context_tokens
+
+        # Newest complete exchanges first; an exchange is kept or dropped as a whole
+        recent = history[-self.max_history_messages:]
+        kept: List[Dict] = []
+        history_tokens = 0
+        cut = len(recent)
+        while cut > 0:
+            start = cut - 2 if cut >= 2 and recent[cut - 2]["role"] == "user" else cut - 1
+            cost = sum(message_tokens(message) for message in recent[start:cut])
+            if history_tokens + cost > available:
+                break
+            kept[:0] = recent[start:cut]
+            history_tokens += cost
+            cut = start
+
+        dropped = history[:len(history) - len(recent)] + recent[:cut]
+        summary = self._summary(dropped, available - history_tokens) if dropped else None
+        summary_tokens = message_tokens(summary) if summary else 0
+
+        messages = [system]
+        if context:
+            messages.append(context)
+        if summary:
+            messages.append(summary)
+        messages.extend(kept)
+        messages.append(user)
+
+        stats = {
+            "total_tokens": fixed + context_tokens + summary_tokens + history_tokens,
+            "budget": self.max_tokens,
+            "system_tokens": message_tokens(system),
+            "context_tokens": context_tokens,
+            "history_tokens": history_tokens + summary_tokens,
+            "user_tokens": message_tokens(user),
+            "documents_used": documents_used,
+            "documents_dropped": len(documents) - documents_used,
+            "history_messages_kept": len(kept),
+            "history_messages_dropped": len(dropped),
+            "history_summarized": summary is not None
+        }
+        return messages, stats
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Query Cache
+Two-level cache in front of query encoding and vector retrieval
+
+Level 1 maps normalized query text to its embedding, so repeated questions
+skip the SentenceTransformer encoder. Level 2 maps (normalized query,
+filter_category, n_results) to the retrieved documents and metadata, so they
+also skip the Chroma search. Both are bounded LRUs and are cleared whenever
+the vector index is rebuilt.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from response_cache import normalize_query
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe least-recently-used mapping with hit/miss counters"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class QueryCache:
+    def __init__(self, embedding_entries: int = 2048, result_entries: int = 1024):
+        """
+        Args:
+            embedding_entries: Capacity of the query text -> embedding cache
+            result_entries: Capacity of the retrieval result cache
+        """
+        self.embeddings = LRUCache(embedding_entries)
+        self.results = LRUCache(result_entries)
+        self.invalidations = 0
+
+    def embed(self, query: str, encode: Callable[[str], object]):
+        """Embedding for a query, computed with `encode` only on a miss"""
+        key = normalize_query(query)
+        embedding = self.embeddings.get(key)
+        if embedding is None:
+            embedding = encode(query)
+            self.embeddings.put(key, embedding)
+        return embedding
+
+    def embed_many(self, queries: List[str], encode_batch: Callable[[List[str]], List]) -> List:
+        """Embeddings for several queries; all misses are encoded in one `encode_batch` call"""
+        keys = [normalize_query(query) for query in queries]
+        found = {key: self.embeddings.get(key) for key in dict.fromkeys(keys)}
+        missing = {key: query for key, query in zip(keys, queries) if found[key] is None}
+
+        if missing:
+            for key, embedding in zip(missing, encode_batch(list(missing.values()))):
+                self.embeddings.put(key, embedding)
+                found[key] = embedding
+        return [found[key] for key in keys]
+
+    @staticmethod
+    def result_key(query: str, filter_category: Optional[str], n_results: int) -> Tuple:
+        return (normalize_query(query), filter_category, n_results)
+
+    def get_results(self, key: Tuple) -> Optional[Tuple[List[str], List[Dict]]]:
+        return self.results.get(key)
+
+    def put_results(self, key: Tuple, documents: List[str], metadatas: List[Dict]):
+        self.results.put(key, (documents, metadatas))
+
+    def invalidate(self):
+        """Drop both levels (call whenever the vector index is rebuilt)"""
+        self.embeddings.clear()
+        self.results.clear()
+        self.invalidations += 1
+
+    def stats(self) -> Dict:
+        return {
+            "query_embeddings": self.embeddings.stats(),
+            "retrieval_results": self.results.stats(),
+            "invalidations": self.invalidations
+        }
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Semantic Response Cache
+Serves repeated questions without another GPT-4o-mini round trip
+
+Entries are keyed on the query embedding plus the classified intent. A lookup
+is a hit when a cached question with the same intent is at least
+`similarity_threshold` cosine-similar to the new one. Entries expire after
+`ttl_seconds`, the least recently used entry is evicted once `max_entries`
+is reached, and the whole cache is dropped whenever the knowledge base changes.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    text = re.sub(r'\s+', ' ', text.lower()).strip()
+    return text.rstrip('?!. ')
+
+
+def _unit_vector(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticResponseCache:
+    def __init__(self, similarity_threshold: float = 0.95, ttl_seconds: int = 3600, max_entries: int = 512):
+        """
+        Args:
+            similarity_threshold: Minimum cosine similarity for a semantic hit
+            ttl_seconds: Lifetime of a cached response
+            max_entries: LRU capacity
+        """
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()  # (intent, normalized query) -> entry
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(self, intent: str, query_embedding=None, query_text: Optional[str] = None) -> Optional[Dict]:
+        """
+        Return the cached response for a matching question, or None
+
+        An exact (intent, normalized text) match is tried first, then the
+        most similar cached embedding with the same intent.
+        """
+        now = time.time()
+        query_vector = _unit_vector(query_embedding) if query_embedding is not None else None
+
+        with self._lock:
+            self._expire(now)
+
+            entry = None
+            if query_text is not None:
+                entry = self._entries.get((intent, normalize_query(query_text)))
+
+            if entry is None and query_vector is not None:
+                best_similarity = self.similarity_threshold
+                for candidate in self._entries.values():
+                    if candidate["intent"] != intent or candidate["vector"] is None:
+                        continue
+                    similarity = float(np.dot(candidate["vector"], query_vector))
+                    if similarity >= best_similarity:
+                        best_similarity = similarity
+                        entry = candidate
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(entry["key"])
+            self.hits += 1
+            return entry["response"]
+
+    def store(self, intent: str, query_text: str, query_embedding, response: Dict):
+        """Cache a response for (intent, query); without an embedding only exact matches hit"""
+        key = (intent, normalize_query(query_text))
+        entry = {
+            "key": key,
+            "intent": intent,
+            "vector": _unit_vector(query_embedding) if query_embedding is not None else None,
+            "response": response,
+            "created_at": time.time()
+        }
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drop every entry (call whenever the knowledge base changes)"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "similarity_threshold": self.similarity_threshold,
+                "ttl_seconds": self.ttl_seconds
+            }
+
+    def _expire(self, now: float):
+        expired = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Retrieval Service
+One embedding model and one vector index shared by every agent in a process
+
+Each agent used to load its own SentenceTransformer("all-MiniLM-L6-v2") and
+open its own collection, so hosting the events agent next to the licensing
+and gym agents in the unified server meant another copy of the encoder per
+agent. RetrievalService loads the encoder once and keeps a single index
+(Chroma or NumPy, see VECTOR_BACKEND) whose rows carry a "namespace"
+metadata field: events, gym, licensing, faq, ...
+
+Agents get a NamespaceView, which behaves like a Chroma collection
+(get/add/upsert/delete/query/count, so vector_index.sync_collection works
+on it) but only ever sees its own namespace: IDs are prefixed with the
+namespace on the way in and stripped on the way out, and every get/query
+is filtered on the namespace. Adding an agent adds a namespace, not a model.
+With the NumPy backend every namespace lives in one index directory; its
+writes are read-modify-write under a file lock (numpy_index.py), so a
+process that loaded fewer namespaces never drops the others on disk.
+
+SectionContext is the retrieval-scoped prompt context of the agents whose
+knowledge base is one JSON section (licensing, gym): the section is chunked
+once (one chunk per key, one per item of its main list), synced into the
+agent's namespace, and each prompt gets only the chunks closest to the
+question, as compact JSON.
+
+Usage:
+    retrieval = get_retrieval_service()
+    events = retrieval.namespace("events")
+    sync_collection(events, documents, metadatas)
+    events.query(query_embeddings=[retrieval.embed_query(text)], n_results=3,
+                 where={"category": "event"})
+
+    context = SectionContext("gym", kb["metroflex_gym_miami"], "membership_tiers", "tier")
+    context.text(question)
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from chromadb.utils import embedding_functions
+
+from metrics import observe_stage, record_error
+from vector_index import open_collection, sync_collection
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE_FIELD = "namespace"
+
+
+def _namespace_filter(namespace: str, where: Optional[Dict]) -> Dict:
+    """Restrict a Chroma-style `where` to one namespace"""
+    conditions = [{NAMESPACE_FIELD: namespace}]
+    if where:
+        if "$and" in where:
+            conditions.extend(where["$and"])
+        elif any(field.startswith("$") for field in where):
+            conditions.append(where)
+        else:
+            # Chroma wants one condition per dict inside $and
+            conditions.extend({field: value} for field, value in where.items())
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+class NamespaceView:
+    """Collection-like view of one namespace of the shared index"""
+
+    def __init__(self, collection, name: str):
+        self.collection = collection
+        self.name = name
+        self._prefix = f"{name}:"
+
+    def _scoped(self, ids: List[str]) -> List[str]:
+        return [self._prefix + doc_id for doc_id in ids]
+
+    def _unscoped(self, doc_id: str) -> str:
+        return doc_id[len(self._prefix):] if doc_id.startswith(self._prefix) else doc_id
+
+    def _strip(self, metadata: Optional[Dict]) -> Optional[Dict]:
+        if metadata is None:
+            return None
+        return {key: value for key, value in metadata.items() if key != NAMESPACE_FIELD}
+
+    def count(self) -> int:
+        return len(self.get(include=[])["ids"])
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            include: Optional[List[str]] = None) -> Dict:
+        include = ["documents", "metadatas"] if include is None else include
+        results = self.collection.get(
+            ids=self._scoped(ids) if ids is not None else None,
+            where=_namespace_filter(self.name, where),
+            include=include
+        )
+        view = {"ids": [self._unscoped(doc_id) for doc_id in results["ids"]]}
+        if "documents" in include:
+            view["documents"] = results["documents"]
+        if "metadatas" in include:
+            view["metadatas"] = [self._strip(meta) for meta in results["metadatas"]]
+        return view
+
+    def upsert(self, ids: List[str], documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict]] = None, embeddings=None):
+        metadatas = metadatas if metadatas is not None else [{} for _ in ids]
+        kwargs = {
+            "ids": self._scoped(ids),
+            "metadatas": [{**meta, NAMESPACE_FIELD: self.name} for meta in metadatas]
+        }
+        if documents is not None:
+            kwargs["documents"] = documents
+        if embeddings is not None:
+            kwargs["embeddings"] = embeddings
+        self.collection.upsert(**kwargs)
+
+    add = upsert
+
+    def delete(self, ids: List[str]):
+        if ids:
+            self.collection.delete(ids=self._scoped(ids))
+
+    def query(self, query_embeddings=None, query_texts: Optional[List[str]] = None,
+              n_results: int = 10, where: Optional[Dict] = None) -> Dict:
+        """Chroma-shaped top-k results restricted to this namespace"""
+        kwargs = {"n_results": n_results, "where": _namespace_filter(self.name, where)}
+        if query_embeddings is not None:
+            kwargs["query_embeddings"] = query_embeddings
+        else:
+            kwargs["query_texts"] = query_texts
+        results = self.collection.query(**kwargs)
+        return {
+            "ids": [[self._unscoped(doc_id) for doc_id in ids] for ids in results["ids"]],
+            "documents": results["documents"],
+            "metadatas": [[self._strip(meta) for meta in metas] for metas in results["metadatas"]],
+            "distances": results["distances"]
+        }
+
+
+class RetrievalService:
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", index_name: str = "metroflex_shared",
+                 persistent: bool = True, backend: Optional[str] = None):
+        """
+        Args:
+            model_name: SentenceTransformer model, loaded once for all agents
+            index_name: Collection (or NumPy index directory) holding every namespace
+            persistent: Keep the index on disk across restarts
+            backend: "chroma" or "numpy" (defaults to VECTOR_BACKEND)
+        """
+        self.model_name = model_name
+        self.index_name = index_name
+        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
+            model_name=model_name
+        )
+        self.collection = open_collection(index_name, self.embedding_function,
+                                          persistent=persistent, backend=backend)
+        self._namespaces: Dict[str, NamespaceView] = {}
+        self._lock = threading.Lock()
+
+    def namespace(self, name: str) -> NamespaceView:
+        """The view of one namespace (created on first use)"""
+        with self._lock:
+            view = self._namespaces.get(name)
+            if view is None:
+                view = self._namespaces[name] = NamespaceView(self.collection, name)
+            return view
+
+    def embed(self, texts: List[str]) -> List:
+        return list(self.embedding_function(list(texts)))
+
+    def embed_query(self, text: str):
+        return self.embedding_function([text])[0]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            names = list(self._namespaces)
+        return {
+            "model": self.model_name,
+            "index": self.index_name,
+            "namespaces": {name: self._namespaces[name].count() for name in names}
+        }
+
+
+def compact_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def chunk_sections(sections: Dict, list_section: str, item_key: str) -> Tuple[List[str], List[Dict]]:
+    """
+    One document per knowledge base section, and one per item of `list_section`
+
+    Items are labelled by item[item_key] (or item["name"]).
+
+    Returns:
+        (documents, metadatas); metadata "order" keeps the KB's section order
+    """
+    documents, metadatas = [], []
+    for section, value in sections.items():
+        if section == list_section and isinstance(value, list):
+            for item in value:
+                name = item.get(item_key, item.get('name', '')) if isinstance(item, dict) else ''
+                documents.append(f"{section} / {name}: {compact_json(item)}")
+                metadatas.append({"section": section, item_key: name, "order": len(documents)})
+            continue
+        documents.append(f"{section}: {compact_json(value)}")
+        metadatas.append({"section": section, "order": len(documents)})
+    return documents, metadatas
+
+
+class SectionContext:
+    def __init__(self, agent: str, sections: Dict, list_section: str, item_key: str,
+                 mode: str = "retrieval", limit: int = 3, retrieval: Optional["RetrievalService"] = None):
+        """
+        Args:
+            agent: Agent name: the namespace, and the label of its metrics
+            sections: The agent's knowledge base section
+            list_section, item_key: Section chunked per item, and the item field naming it
+            mode: "retrieval", or "full" for the whole section in every prompt
+            limit: Chunks per prompt
+            retrieval: RetrievalService to index in (default: the process-wide one)
+        """
+        self.agent = agent
+        self.sections = sections
+        self.mode = mode
+        self.limit = limit
+        self.retrieval = None
+        self.collection = None
+        if mode == "retrieval":
+            self._index(list_section, item_key, retrieval)
+
+    def _index(self, list_section: str, item_key: str, retrieval: Optional["RetrievalService"]):
+        """Sync the chunks into the agent's namespace; without an encoder, fall back to full mode"""
+        start_time = time.perf_counter()
+        try:
+            retrieval = retrieval or get_retrieval_service()
+            collection = retrieval.namespace(self.agent)
+            stats = sync_collection(collection, *chunk_sections(self.sections, list_section, item_key))
+        except Exception as e:
+            record_error(self.agent, "index_knowledge_base")
+            logger.warning(f"⚠️ {self.agent.title()} KB not indexed ({e}), sending the full KB in prompts")
+            self.mode = "full"
+            return
+
+        self.retrieval, self.collection = retrieval, collection
+        logger.info(f"✅ {self.agent.title()} KB indexed: {stats['total']} chunks ({stats['added']} embedded) "
+                    f"in {time.perf_counter() - start_time:.2f}s")
+
+    def relevant(self, query: str) -> List[str]:
+        """The chunks closest to the query, in knowledge base order"""
+        start_time = time.perf_counter()
+        results = self.collection.query(
+            query_embeddings=[self.retrieval.embed_query(query)],
+            n_results=self.limit
+        )
+        observe_stage(self.agent, "context_retrieval", time.perf_counter() - start_time)
+        if not results['ids'] or not results['ids'][0]:
+            return []
+        hits = sorted(zip(results['documents'][0], results['metadatas'][0]), key=lambda hit: hit[1]['order'])
+        return [document for document, _ in hits]
+
+    def text(self, query: str) -> str:
+        """Prompt text: the relevant chunks, or the whole section pretty-printed in full mode"""
+        if self.mode == "retrieval":
+            try:
+                chunks = self.relevant(query)
+            except Exception as e:
+                record_error(self.agent, "context_retrieval")
+                logger.warning(f"⚠️ {self.agent.title()} context retrieval failed ({e}), sending the full KB")
+                chunks = []
+            if chunks:
+                return "\n".join(chunks)
+        return json.dumps(self.sections, indent=2)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_retrieval_service() -> RetrievalService:
+    """
+    Process-wide retrieval service configured from the environment
+
+    EMBEDDING_MODEL        SentenceTransformer model (default all-MiniLM-L6-v2)
+    RETRIEVAL_INDEX_NAME   shared collection / index directory (default metroflex_shared)
+
+    The backend and on-disk location follow VECTOR_BACKEND,
+    METROFLEX_VECTOR_DB_PATH and METROFLEX_NUMPY_INDEX_PATH (vector_index.py).
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = RetrievalService(
+                model_name=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+                index_name=os.getenv("RETRIEVAL_INDEX_NAME", "metroflex_shared")
+            )
+    return _service
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Session Store
+Bounded, evictable conversation history for multi-turn chat
+
+Both backends keep at most `max_messages` messages per session, expire
+sessions idle for longer than `ttl_seconds` and evict the least recently
+used session once `max_sessions` is reached:
+
+- MemorySessionStore: per-process OrderedDict (default)
+- SQLiteSessionStore: one SQLite file in WAL mode, so sessions survive
+  restarts and are shared by every Gunicorn worker on the host
+
+Pick one with SESSION_STORE_BACKEND=memory|sqlite (see create_session_store).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List
+
+
+class SessionStore(ABC):
+    """Interface shared by the session backends"""
+
+    backend: str
+
+    def __init__(self, max_sessions: int = 5000, ttl_seconds: int = 21600, max_messages: int = 40):
+        """
+        Args:
+            max_sessions: LRU capacity (number of conversations kept)
+            ttl_seconds: Idle time after which a conversation is forgotten
+            max_messages: Messages kept per conversation (oldest dropped first)
+
+        Raises:
+            ValueError: if max_messages is below 1 (a session must keep the
+                        turn it was just given)
+        """
+        if max_messages < 1:
+            raise ValueError(f"max_messages must be at least 1, got {max_messages}")
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.evictions = 0
+        self.expirations = 0
+
+    @abstractmethod
+    def get(self, key: str) -> List[Dict]:
+        """Conversation history for a session ([] if unknown or expired)"""
+
+    @abstractmethod
+    def append(self, key: str, *messages: Dict):
+        """Add messages to a session, creating it if needed"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Forget a session"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of sessions stored"""
+
+    def stats(self) -> Dict:
+        """Size and eviction counters for monitoring"""
+        return {
+            "backend": self.backend,
+            "sessions": len(self),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "max_messages": self.max_messages,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+class MemorySessionStore(SessionStore):
+    backend = "memory"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._sessions = OrderedDict()  # key -> {"messages": [...], "last_active": float}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> List[Dict]:
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                return []
+            if time.time() - session["last_active"] > self.ttl_seconds:
+                del self._sessions[key]
+                self.expirations += 1
+                return []
+            return list(session["messages"])
+
+    def append(self, key: str, *messages: Dict):
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None or now - session["last_active"] > self.ttl_seconds:
+                session = {"messages": [], "last_active": now}
+                self._sessions[key] = session
+
+            session["messages"].extend(messages)
+            del session["messages"][:-self.max_messages]
+            session["last_active"] = now
+            self._sessions.move_to_end(key)
+
+            self._expire(now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expire(self, now: float):
+        # Sessions are ordered by last activity, so idle ones are at the front
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if now - session["last_active"] <= self.ttl_seconds:
+                break
+            del self._sessions[key]
+            self.expirations += 1
+
+
+class SQLiteSessionStore(SessionStore):
+    backend = "sqlite"
+
+    # Expire/evict at most once per this many appends (keeps writes cheap)
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str = "./sessions.db", **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = threading.local()
+        self._appends = 0
+
+        with self._connection() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS sessions (
+                       session_key TEXT PRIMARY KEY,
+                       messages TEXT NOT NULL,
+                       last_active REAL NOT NULL
+                   )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_active ON sessions (last_active)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> List[Dict]:
+        row = self._connection().execute(
+            "SELECT messages, last_active FROM sessions WHERE session_key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return []
+        if time.time() - row[1] > self.ttl_seconds:
+            self.delete(key)
+            self.expirations += 1
+            return []
+        return json.loads(row[0])
+
+    def append(self, key: str, *messages: Dict):
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT messages, last_active FROM sessions WHERE session_key = ?", (key,)
+            ).fetchone()
+            history = json.loads(row[0]) if row and now - row[1] <= self.ttl_seconds else []
+            history.extend(messages)
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_key, messages, last_active) VALUES (?, ?, ?)",
+                (key, json.dumps(history[-self.max_messages:]), now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._appends += 1
+        if self._appends % self.PRUNE_EVERY == 1:
+            self.prune(now)
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM sessions WHERE session_key = ?", (key,))
+
+    def prune(self, now: float = None):
+        """Drop expired sessions, then the least recently used beyond max_sessions"""
+        now = now or time.time()
+        conn = self._connection()
+        expired = conn.execute("DELETE FROM sessions WHERE last_active < ?", (now - self.ttl_seconds,)).rowcount
+        evicted = conn.execute(
+            """DELETE FROM sessions WHERE session_key IN (
+                   SELECT session_key FROM sessions ORDER BY last_active DESC LIMIT -1 OFFSET ?
+               )""",
+            (self.max_sessions,)
+        ).rowcount
+        self.expirations += expired
+        self.evictions += evicted
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_session_store() -> SessionStore:
+    """
+    Session store configured from the environment
+
+    SESSION_STORE_BACKEND  memory (default) | sqlite
+    SESSION_STORE_PATH     SQLite file (default ./sessions.db)
+    SESSION_MAX_SESSIONS   LRU capacity (default 5000)
+    SESSION_TTL_SECONDS    idle expiry (default 21600 = 6 hours)
+    SESSION_MAX_MESSAGES   messages kept per session (default 40)
+    """
+    options = {
+        "max_sessions": int(os.getenv("SESSION_MAX_SESSIONS", "5000")),
+        "ttl_seconds": int(os.getenv("SESSION_TTL_SECONDS", "21600")),
+        "max_messages": int(os.getenv("SESSION_MAX_MESSAGES", "40"))
+    }
+
+    backend = os.getenv("SESSION_STORE_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteSessionStore(path=os.getenv("SESSION_STORE_PATH", "./sessions.db"), **options)
+    if backend != "memory":
+        raise ValueError(f"Unknown SESSION_STORE_BACKEND: {backend}")
+    return MemorySessionStore(**options)
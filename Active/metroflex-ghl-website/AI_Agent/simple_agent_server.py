@@ -10,8 +10,10 @@ from datetime import datetime
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from openai import OpenAI
-import chromadb
-from chromadb.utils import embedding_functions
+from llm_gateway import INTERACTIVE, LLMOverloaded, get_llm_gateway, overloaded_response
+from retrieval_service import get_retrieval_service
+from session_store import create_session_store
+from vector_index import sync_collection
 
 app = Flask(__name__)
 CORS(app)
@@ -24,24 +26,14 @@ client = OpenAI(api_key=OPENAI_API_KEY)
 with open("METROFLEX_KNOWLEDGE_BASE.json", 'r') as f:
     kb = json.load(f)
 
-# Initialize ChromaDB
-chroma_client = chromadb.Client()
-embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name="all-MiniLM-L6-v2"
-)
-
-collection = chroma_client.get_or_create_collection(
-    name="metroflex_simple",
-    embedding_function=embedding_function
-)
+# Shared encoder + vector index (see retrieval_service.py), own namespace
+collection = get_retrieval_service().namespace("simple")
 
 # Build simple vector database
 def build_simple_vectordb():
     """Build a simple vector database from knowledge base"""
     docs = []
-    ids = []
     metadatas = []
-    doc_id = 0
 
     # Add events
     for event_name, event_data in kb.get('events', {}).items():
@@ -49,9 +41,7 @@ def build_simple_vectordb():
         if 'registration_url' in event_data:
             doc_text += f" Register at: {event_data['registration_url']}"
         docs.append(doc_text)
-        ids.append(f"doc_{doc_id}")
         metadatas.append({"category": "event", "event_name": event_name})
-        doc_id += 1
 
     # Add NPC divisions (simplified)
     for division, rules in kb.get('npc_division_rules', {}).items():
@@ -60,31 +50,24 @@ def build_simple_vectordb():
             classes = [wc.get('class', '') for wc in rules['weight_classes']]
             doc_text += f" Weight classes: {', '.join(classes)}"
         docs.append(doc_text)
-        ids.append(f"doc_{doc_id}")
         metadatas.append({"category": "division", "division": division})
-        doc_id += 1
 
     # Add registration info
     reg = kb.get('competition_procedures', {}).get('registration', {})
     doc_text = f"Registration: Methods: {', '.join(reg.get('methods', []))}. NPC card required: {reg.get('npc_card_required', 'Yes')}"
     docs.append(doc_text)
-    ids.append(f"doc_{doc_id}")
     metadatas.append({"category": "registration"})
-    doc_id += 1
 
     # Add music requirements
     music = kb.get('competition_procedures', {}).get('posing_music', {})
     doc_text = f"Posing music: Required for {', '.join(music.get('required_for', []))}. Max length: {music.get('max_length', '60 seconds')}. Format: {', '.join(music.get('format', []))}"
     docs.append(doc_text)
-    ids.append(f"doc_{doc_id}")
     metadatas.append({"category": "music"})
-    doc_id += 1
 
-    # Add to collection
-    if docs:
-        collection.add(documents=docs, ids=ids, metadatas=metadatas)
+    # Content-addressed sync: the shared index is persistent, so only new docs are embedded
+    stats = sync_collection(collection, docs, metadatas)
 
-    print(f"✅ Built vector database with {len(docs)} documents")
+    print(f"✅ Built vector database with {stats['total']} documents ({stats['added']} embedded)")
 
 # Build database on startup
 try:
@@ -110,8 +93,41 @@ Key information:
 Be concise, accurate, and always include relevant registration links or contact information when applicable.
 """
 
-# Conversation memory
-conversations = {}
+# Conversation memory (bounded, idle sessions expire - see session_store.py)
+conversations = create_session_store()
+
+def build_messages(message: str, session_id: str) -> list:
+    """Retrieve context and assemble the OpenAI message list for one turn"""
+    # Retrieve relevant context
+    try:
+        results = collection.query(query_texts=[message], n_results=3)
+        context_docs = results['documents'][0] if results['documents'] else []
+        context = "\n".join([f"[Context]: {doc}" for doc in context_docs])
+    except:
+        context = ""
+
+    # Build messages
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+    ]
+
+    if context:
+        messages.append({"role": "system", "content": f"Retrieved Information:\n{context}"})
+
+    # Add conversation history (last 5 exchanges)
+    messages.extend(conversations.get(session_id)[-10:])
+
+    # Add current message
+    messages.append({"role": "user", "content": message})
+    return messages
+
+def record_turn(session_id: str, message: str, assistant_message: str):
+    """Append one exchange to the session's conversation history"""
+    conversations.append(
+        session_id,
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": assistant_message}
+    )
 
 @app.route('/webhook/chat', methods=['POST'])
 def chat():
@@ -124,45 +140,21 @@ def chat():
         if not message:
             return jsonify({"error": "No message provided"}), 400
 
-        # Retrieve relevant context
-        try:
-            results = collection.query(query_texts=[message], n_results=3)
-            context_docs = results['documents'][0] if results['documents'] else []
-            context = "\n".join([f"[Context]: {doc}" for doc in context_docs])
-        except:
-            context = ""
-
-        # Get or create conversation history
-        if session_id not in conversations:
-            conversations[session_id] = []
-
-        # Build messages
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-        ]
-
-        if context:
-            messages.append({"role": "system", "content": f"Retrieved Information:\n{context}"})
-
-        # Add conversation history (last 5 exchanges)
-        messages.extend(conversations[session_id][-10:])
-
-        # Add current message
-        messages.append({"role": "user", "content": message})
+        messages = build_messages(message, session_id)
 
-        # Call OpenAI
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=300
-        )
+        # Call OpenAI (through the shared LLM gateway)
+        with get_llm_gateway().slot(INTERACTIVE):
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0.7,
+                max_tokens=300
+            )
 
         assistant_message = response.choices[0].message.content
 
         # Update conversation history
-        conversations[session_id].append({"role": "user", "content": message})
-        conversations[session_id].append({"role": "assistant", "content": assistant_message})
+        record_turn(session_id, message, assistant_message)
 
         return jsonify({
             "success": True,
@@ -170,6 +162,9 @@ def chat():
             "timestamp": datetime.now().isoformat()
         })
 
+    except LLMOverloaded as e:
+        body, status, headers = overloaded_response(e)
+        return jsonify(body), status, headers
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({
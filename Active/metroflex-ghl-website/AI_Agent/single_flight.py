@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Single-Flight
+Coalesces identical in-flight calls into one upstream request
+
+After an event announcement dozens of users send the same first question
+within a second, before the response cache has an answer to serve. The first
+caller for a key runs the call; every caller that arrives while it is still
+running waits for that result instead of issuing its own OpenAI completion.
+Nothing is cached once the call finishes. If an asyncio leader is cancelled
+(its client disconnected), its followers do not inherit the cancellation:
+one of them runs the call again and the rest wait for that one.
+
+Usage:
+    flights = SingleFlight()
+    answer = flights.do(key, lambda: call_openai(...))            # threads
+    answer = await flights.ado(key, lambda: acall_openai(...))    # asyncio
+"""
+
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class _LeaderCancelled(Exception):
+    """Set on a shared future whose leader was cancelled: followers retry"""
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable):
+        """Run `fn()` unless a call for `key` is in flight; then share its result (or error)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """Async variant of do(); coalesces callers on the same event loop"""
+        while True:
+            with self._lock:
+                future = self._futures.get(key)
+                leader = future is None
+                if leader:
+                    future = self._futures[key] = asyncio.get_running_loop().create_future()
+                    # Errors nobody waited for must not be reported as "never retrieved"
+                    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                    self.leaders += 1
+                else:
+                    self.coalesced += 1
+
+            if leader:
+                break
+            try:
+                # shield: a disconnecting follower must not cancel the shared call
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                # The first follower to wake up leads the next attempt
+                continue
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._futures[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            calls = self.leaders + self.coalesced
+            return {
+                "upstream_calls": self.leaders,
+                "coalesced_calls": self.coalesced,
+                "in_flight": len(self._calls) + len(self._futures),
+                "coalesced_rate": round(self.coalesced / calls, 4) if calls else 0.0
+            }
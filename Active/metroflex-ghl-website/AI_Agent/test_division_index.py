@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Test Script for the MetroFlex Division Index
+Height/weight parsing and NPC class placement
+
+Run directly (python test_division_index.py) or with pytest.
+"""
+
+from division_index import DivisionIndex, parse_height, parse_weight
+
+DIVISIONS = {
+    "mens_bodybuilding": {
+        "weight_classes": [
+            {"class": "Bantamweight", "max_weight": "143 lbs"},
+            {"class": "Lightweight", "max_weight": "154 lbs"},
+            {"class": "Middleweight", "max_weight": "176 lbs"},
+            {"class": "Light Heavyweight", "max_weight": "198 lbs"},
+            {"class": "Heavyweight", "max_weight": "225 lbs"},
+            {"class": "Super Heavyweight", "min_weight": "over 225 lbs"}
+        ]
+    },
+    "mens_physique": {
+        "height_classes": [
+            {"class": "A", "height": "up to 5'7\""},
+            {"class": "B", "height": "5'7\" to 5'9\""},
+            {"class": "C", "height": "5'9\" to 5'11\""},
+            {"class": "D", "height": "over 5'11\""}
+        ]
+    },
+    "classic_physique": {
+        "height_weight_classes": [
+            {"height": "5'7\" to 5'8\"", "max_weight": "187 lbs"},
+            {"height": "5'8\" to 5'9\"", "max_weight": "193 lbs"}
+        ]
+    },
+    "bikini": {
+        "height_classes": [{"class": "A", "height": "shorter competitors"}]
+    }
+}
+
+
+def test_parse_height_formats():
+    assert parse_height("I'm 5'8\" and 180")[0] == 68
+    assert parse_height("5 ft 10.5 in")[0] == 70.5
+    assert parse_height("six foot? I'm 6 feet 1 inch")[0] == 73
+    assert parse_height("5’11”")[0] == 71
+    assert parse_height("68 inches tall")[0] == 68
+    assert parse_height("what classes are there?") == (None, None)
+
+
+def test_weight_digits_are_not_inches():
+    # "6 foot 215" used to parse as 6'21" (93 in), "6' 200" as 6'20" (92 in)
+    height, span = parse_height("6 foot 215 pounds")
+    assert height == 72
+    assert parse_weight("6 foot 215 pounds", span) == 215
+
+    height, span = parse_height("I'm 6' 200 lbs")
+    assert height == 72
+    assert parse_weight("I'm 6' 200 lbs", span) == 200
+
+    height, span = parse_height("5' 8 180")
+    assert (height, parse_weight("5' 8 180", span)) == (68, 180)
+
+
+def test_heights_out_of_range_are_rejected():
+    assert parse_height("7'11\"") == (None, None)
+    assert parse_height("4'0\"")[0] == 48
+    assert parse_height("30 inches") == (None, None)
+
+
+def test_parse_weight():
+    assert parse_weight("I weigh 82 kg") == 180.8
+    assert parse_weight("180 lbs") == 180
+    # A bare number is only a weight when a height was given
+    assert parse_weight("I am 180") is None
+    assert parse_weight("45 lbs") is None
+
+
+def test_weight_class_placement():
+    index = DivisionIndex(DIVISIONS)
+    result = index.lookup("what bodybuilding class at 180 lbs?")
+    assert result["weight_lbs"] == 180
+    assert [(p["division"], p["class"]) for p in result["placements"]] == [("mens_bodybuilding", "Light Heavyweight")]
+    assert result["placements"][0]["limits"] == "over 176 lbs up to 198 lbs"
+
+    heavy = index.place(None, 240)
+    assert heavy[0]["class"] == "Super Heavyweight"
+    # Limits are inclusive upper bounds
+    assert index.place(None, 154)[0]["class"] == "Lightweight"
+
+
+def test_height_and_height_weight_placement():
+    index = DivisionIndex(DIVISIONS)
+    result = index.lookup("classic physique at 5'8\" 190 lbs")
+    assert [p["division"] for p in result["placements"]] == ["classic_physique"]
+    placement = result["placements"][0]
+    assert placement["max_weight"] == 187 and placement["within_limit"] is False
+
+    tall = index.place(74, None, ["mens_physique"])
+    assert tall[0]["class"] == "D"
+
+
+def test_mentioned_divisions():
+    index = DivisionIndex(DIVISIONS)
+    assert index.mentioned_divisions("Classic Physique or men's physique?") == ["mens_physique", "classic_physique"]
+    assert index.mentioned_divisions("classic physique") == ["classic_physique"]
+
+
+def test_named_division_without_limits_is_not_placed_elsewhere():
+    # Events-only KB shape: classic physique has no readable limits
+    index = DivisionIndex({
+        "mens_physique": {"height_classes": [{"class": "Open Class B", "height": "over 5'7\" up to 5'9\""}]},
+        "womens_physique": {"height_classes": [{"class": "Open Class D", "height": "over 5'7\""}]},
+        "mens_classic_physique": {}
+    })
+    assert index.aliases["mens_physique"] == ["mens physique"]
+    assert index.mentioned_divisions("classic physique 5'10 190") == ["mens_classic_physique"]
+    assert index.lookup("classic physique 5'10 190") is None
+    assert index.lookup("what physique class at 5'8?") is None
+    assert index.lookup("I'm 5'8 and 180, what class am I?") is None
+
+    result = index.lookup("men's physique at 5'8")
+    assert [p["division"] for p in result["placements"]] == ["mens_physique"]
+    assert DivisionIndex.format(result) == (
+        "NPC class placement for 5'8\" (computed from the official class limits): "
+        "Mens Physique: Open Class B (over 5'7\" up to 5'9\")."
+    )
+
+
+def test_unreadable_limits_are_skipped():
+    index = DivisionIndex(DIVISIONS)
+    assert index.skipped == ["bikini"]
+    assert index.lookup("how tall is tall?") is None
+
+
+def main():
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n✅ ALL {len(tests)} DIVISION INDEX TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
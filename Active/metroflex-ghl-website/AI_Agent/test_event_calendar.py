@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test Script for the MetroFlex Event Calendar
+Date parsing, next-event and month lookups, and the calendar context document
+
+Run directly (python test_event_calendar.py) or with pytest.
+"""
+
+from datetime import date
+
+from event_calendar import EventCalendar, parse_event_date
+
+EVENTS = {
+    "ronnie_coleman_classic": {
+        "official_name": "NPC Ronnie Coleman Classic",
+        "date": "May 16, 2026",
+        "venue": "Round Up Inn",
+        "location": "Fort Worth, TX"
+    },
+    "better_bodies_classic": {
+        "official_name": "NPC Better Bodies Classic",
+        "date": "2026-03-14",
+        "venue": "Arlington Convention Center"
+    },
+    "branch_warren_classic": {
+        "official_name": "NPC Branch Warren Classic",
+        "date": "Saturday, June 20th, 2026",
+        "city": "Houston, TX"
+    },
+    "muscle_mayhem": {"official_name": "Muscle Mayhem", "date": "TBD"}
+}
+
+TODAY = date(2026, 3, 1)
+
+
+def test_parse_event_date_formats():
+    assert parse_event_date("2026-05-16") == date(2026, 5, 16)
+    assert parse_event_date("May 16, 2026") == date(2026, 5, 16)
+    assert parse_event_date("Saturday, June 20th, 2026") == date(2026, 6, 20)
+    assert parse_event_date("06/20/2026") == date(2026, 6, 20)
+    assert parse_event_date("TBD") is None
+    assert parse_event_date(None) is None
+
+
+def test_events_are_sorted_and_undated_kept_aside():
+    cal = EventCalendar(EVENTS)
+    assert [entry["key"] for entry in cal.events] == [
+        "better_bodies_classic", "ronnie_coleman_classic", "branch_warren_classic"
+    ]
+    assert cal.undated == ["muscle_mayhem"]
+    assert cal.events[2]["location"] == "Houston, TX"
+
+
+def test_upcoming():
+    cal = EventCalendar(EVENTS)
+    assert [e["key"] for e in cal.upcoming(TODAY, limit=2)] == ["better_bodies_classic", "ronnie_coleman_classic"]
+    # An event today still counts as upcoming
+    assert cal.upcoming(date(2026, 5, 16))[0]["key"] == "ronnie_coleman_classic"
+    assert cal.upcoming(date(2026, 7, 1)) == []
+
+
+def test_in_month():
+    cal = EventCalendar(EVENTS)
+    assert [e["key"] for e in cal.in_month(2026, 5)] == ["ronnie_coleman_classic"]
+    assert cal.in_month(2026, 4) == []
+    assert cal.in_month(2025, 12) == []
+
+
+def test_find_by_short_name():
+    cal = EventCalendar(EVENTS)
+    assert cal.find("when is better bodies?")["key"] == "better_bodies_classic"
+    assert cal.find("Ronnie Coleman Classic tickets")["key"] == "ronnie_coleman_classic"
+    assert cal.find("what shows are coming up?") is None
+
+
+def test_find_by_leading_words_of_the_name():
+    # Events-only KB entries: no venue, the location names it
+    cal = EventCalendar({
+        "npc_branch_warren_classic_houston": {"official_name": "NPC Branch Warren Classic Houston",
+                                              "date": "June 20, 2026", "venue": None,
+                                              "location": "Houston, TX (Location TBD)"},
+        "ronnie_coleman_classic": {"official_name": "NPC Ronnie Coleman Classic", "date": "May 16, 2026"},
+        "ronnie_coleman_classic_masters": {"official_name": "NPC Ronnie Coleman Classic Masters", "date": "May 17, 2026"}
+    })
+    assert cal.find("branch warren classic date")["key"] == "npc_branch_warren_classic_houston"
+    assert cal.find("is branch warren sold out?")["key"] == "npc_branch_warren_classic_houston"
+    # A short name both Ronnie Coleman shows start with names neither
+    assert cal.find("ronnie coleman tickets") is None
+    assert cal.find("ronnie coleman classic tickets")["key"] == "ronnie_coleman_classic"
+    assert cal.find("ronnie coleman classic masters tickets")["key"] == "ronnie_coleman_classic_masters"
+
+    text = cal.context("branch warren classic date", today=TODAY)
+    assert "NPC Branch Warren Classic Houston: Saturday, June 20, 2026 at Houston, TX (Location TBD) (in 111 days)." in text
+    assert "TBD," not in text and "None" not in text
+
+
+def test_may_as_a_verb_is_not_a_month():
+    cal = EventCalendar(EVENTS)
+    assert cal._mentioned_month("may I bring a guest?", TODAY) is None
+    assert cal._mentioned_month("anything in may?", TODAY) == (2026, 5)
+    assert cal._mentioned_month("events in February", TODAY) == (2027, 2)
+    assert cal._mentioned_month("June 2026 shows", TODAY) == (2026, 6)
+
+
+def test_context_document():
+    cal = EventCalendar(EVENTS)
+    text = cal.context("how many days until the Ronnie Coleman Classic?", today=TODAY)
+    assert text.startswith("Event calendar as of today, Sunday, March 01, 2026:")
+    assert "Asked about: NPC Ronnie Coleman Classic: Saturday, May 16, 2026 at Round Up Inn, Fort Worth, TX (in 76 days)." in text
+    assert "Next upcoming: NPC Better Bodies Classic" in text
+
+    assert "No events scheduled in April 2026." in cal.context("anything in april?", today=TODAY)
+    assert "No upcoming events are scheduled yet." in cal.context("next show?", today=date(2026, 7, 1))
+    assert EventCalendar({}).context("next show?") is None
+
+
+def main():
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n✅ ALL {len(tests)} EVENT CALENDAR TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Test Script for the MetroFlex FAQ Direct Answers
+FAQ document text and per-intent threshold parsing
+
+Run directly (python test_faq_answers.py) or with pytest.
+"""
+
+from faq_answers import faq_document, parse_intent_thresholds
+
+
+def test_faq_document_from_a_key():
+    assert faq_document("how_to_register", "Online via MuscleWare.") == "Q: How to register? A: Online via MuscleWare."
+
+
+def test_faq_document_keeps_the_question_as_written():
+    # Events-only KB questions already end with "?" and name the NPC
+    assert faq_document("Do I need an NPC membership to compete?", "Yes.") == \
+        "Q: Do I need an NPC membership to compete? A: Yes."
+
+
+def test_parse_intent_thresholds():
+    assert parse_intent_thresholds("sponsor:0, datetime:0.05,") == {"sponsor": 0.0, "datetime": 0.05}
+    assert parse_intent_thresholds("") == {}
+
+
+def main():
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n✅ ALL {len(tests)} FAQ ANSWERS TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
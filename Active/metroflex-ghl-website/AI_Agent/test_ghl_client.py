@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test Script for the MetroFlex GHL Client
+Token bucket, circuit breaker and 429 handling, without calling GHL
+
+Run directly (python test_ghl_client.py) or with pytest.
+"""
+
+import time
+
+import requests
+
+from ghl_client import CircuitBreaker, GHLClient, GHLUnavailable, TokenBucket
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, headers: dict = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeSession:
+    """Answers every POST with the next queued status code (or raises a queued exception)"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.posts = 0
+
+    def post(self, url, **kwargs):
+        self.posts += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def make_client(session: FakeSession, **kwargs) -> GHLClient:
+    client = GHLClient(**kwargs)
+    client._http = lambda: session
+    return client
+
+
+def expire(breaker: CircuitBreaker):
+    """Pretend reset_seconds have passed since the circuit opened"""
+    breaker.opened_at = time.monotonic() - breaker.reset_seconds - 1
+
+
+def test_token_bucket_burst_then_wait():
+    bucket = TokenBucket(rate=10.0, capacity=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    wait = bucket.acquire()
+    assert 0 < wait <= 0.1
+    assert bucket.acquire(timeout=0.2) == 0.0
+
+
+def test_breaker_opens_after_consecutive_failures():
+    session = FakeSession(FakeResponse(502), FakeResponse(503), requests.ConnectionError("down"))
+    client = make_client(session, failure_threshold=3)
+    client.post("https://ghl.example/hook")
+    client.post("https://ghl.example/hook")
+    try:
+        client.post("https://ghl.example/hook")
+    except requests.ConnectionError:
+        pass
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    try:
+        client.post("https://ghl.example/hook")
+        raise AssertionError("open circuit let a call through")
+    except GHLUnavailable as e:
+        assert e.retry_after >= 1.0
+    assert session.posts == 3
+
+
+def test_half_open_trial_closes_or_reopens():
+    session = FakeSession(FakeResponse(500), FakeResponse(500), FakeResponse(200))
+    client = make_client(session, failure_threshold=1)
+    client.post("https://ghl.example/hook")
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    expire(client.breaker)
+    client.post("https://ghl.example/hook")
+    assert client.breaker.state == CircuitBreaker.OPEN
+    assert client.breaker.trips == 2
+
+    expire(client.breaker)
+    assert client.post("https://ghl.example/hook").status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_rate_limited_trial_is_given_back():
+    session = FakeSession(FakeResponse(500), FakeResponse(200))
+    client = make_client(session, failure_threshold=1, rate_per_second=10.0, burst=1, max_wait_seconds=0.0)
+    client.post("https://ghl.example/hook")
+    expire(client.breaker)
+
+    # The breaker hands out the trial, but no rate-limit token is left
+    try:
+        client.post("https://ghl.example/hook")
+        raise AssertionError("call went out without a token")
+    except GHLUnavailable:
+        pass
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    # Once the circuit may half-open again the next trial goes out
+    time.sleep(0.15)
+    expire(client.breaker)
+    assert client.post("https://ghl.example/hook").status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    assert session.posts == 2
+
+
+def test_429_pauses_the_limiter():
+    session = FakeSession(FakeResponse(429, {"Retry-After": "2"}))
+    client = make_client(session, max_wait_seconds=0.0)
+    try:
+        client.post("https://ghl.example/hook")
+        raise AssertionError("429 was returned as delivered")
+    except GHLUnavailable as e:
+        assert e.retry_after == 2.0
+    assert client.limiter.acquire() > 1.5
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def main():
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n✅ ALL {len(tests)} GHL CLIENT TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test Script for the MetroFlex GHL Outbox
+Delivery, retry backoff, dead rows and leases, without calling GHL
+
+Each test uses its own SQLite file in a temporary directory, and drains the
+outbox with process_batch() instead of the background thread.
+Run directly (python test_ghl_outbox.py) or with pytest.
+"""
+
+import os
+import tempfile
+import time
+
+from ghl_client import GHLClient
+from ghl_outbox import GHLOutbox
+
+URL = "https://services.leadconnectorhq.com/hooks/test"
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.headers = {}
+
+
+class FakeSession:
+    """Answers every POST with `status_code` and records the payloads"""
+
+    def __init__(self, status_code: int = 200):
+        self.status_code = status_code
+        self.posted = []
+
+    def post(self, url, data=None, **kwargs):
+        self.posted.append(data)
+        return FakeResponse(self.status_code)
+
+
+def make_outbox(session: FakeSession, path: str = None, **kwargs) -> GHLOutbox:
+    client = GHLClient(failure_threshold=100, max_wait_seconds=0.0)
+    client._http = lambda: session
+    outbox = GHLOutbox(path=path or os.path.join(tempfile.mkdtemp(), "outbox.db"), client=client, **kwargs)
+    # Drained by hand in these tests
+    outbox.start = lambda: None
+    return outbox
+
+
+def row(outbox: GHLOutbox, row_id: int) -> dict:
+    status, attempts, next_attempt_at, last_error = outbox._connection().execute(
+        "SELECT status, attempts, next_attempt_at, last_error FROM ghl_outbox WHERE id = ?", (row_id,)
+    ).fetchone()
+    return {"status": status, "attempts": attempts, "next_attempt_at": next_attempt_at, "last_error": last_error}
+
+
+def test_delivers_queued_leads():
+    session = FakeSession(200)
+    outbox = make_outbox(session)
+    row_id = outbox.enqueue(URL, {"contact": {"email": "a@example.com"}})
+    assert outbox.process_batch() == 1
+    assert row(outbox, row_id)["status"] == "delivered"
+    assert session.posted == ['{"contact": {"email": "a@example.com"}}']
+    assert outbox.stats()["queue_depth"] == 0
+    # Nothing due any more
+    assert outbox.process_batch() == 0
+
+
+def test_failed_post_backs_off_then_goes_dead():
+    session = FakeSession(500)
+    outbox = make_outbox(session, max_attempts=2, base_backoff=10.0)
+    row_id = outbox.enqueue(URL, {"n": 1})
+
+    outbox.process_batch()
+    first = row(outbox, row_id)
+    assert first["status"] == "pending" and first["attempts"] == 1 and first["last_error"] == "HTTP 500"
+    assert first["next_attempt_at"] - time.time() > 5
+    assert outbox.process_batch() == 0
+
+    outbox._connection().execute("UPDATE ghl_outbox SET next_attempt_at = 0")
+    outbox.process_batch()
+    assert row(outbox, row_id)["status"] == "dead"
+    assert outbox.stats()["dead"] == 1
+
+
+def test_unavailable_ghl_keeps_attempts():
+    session = FakeSession(200)
+    outbox = make_outbox(session)
+    row_id = outbox.enqueue(URL, {"n": 1})
+    # Circuit open: the client refuses without posting
+    breaker = outbox.client.breaker
+    breaker.state, breaker.opened_at = breaker.OPEN, time.monotonic()
+
+    outbox.process_batch()
+    rescheduled = row(outbox, row_id)
+    assert rescheduled["status"] == "pending" and rescheduled["attempts"] == 0
+    assert "circuit open" in rescheduled["last_error"]
+    assert session.posted == []
+
+
+def test_lapsed_lease_is_not_posted_twice():
+    path = os.path.join(tempfile.mkdtemp(), "outbox.db")
+    first_session, second_session = FakeSession(200), FakeSession(200)
+    first = make_outbox(first_session, path, lease_seconds=0.2, request_timeout=0.1)
+    second = make_outbox(second_session, path, lease_seconds=0.2, request_timeout=0.1)
+    for n in range(3):
+        first.enqueue(URL, {"n": n})
+
+    # The first worker claims the rows, then stalls past its lease
+    claim = first._claim()
+    time.sleep(0.25)
+    assert second.process_batch() == 3
+
+    first._claim = lambda: claim
+    first.process_batch()
+    assert first_session.posted == []
+    assert len(second_session.posted) == 3
+
+
+def test_lease_must_cover_one_post():
+    try:
+        make_outbox(FakeSession(), lease_seconds=5.0, request_timeout=10.0)
+        raise AssertionError("lease shorter than a post was accepted")
+    except ValueError:
+        pass
+
+
+def main():
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n✅ ALL {len(tests)} GHL OUTBOX TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test Script for the MetroFlex Markdown Cleaner
+Whole-response cleaning, and streamed cleaning that matches it for any chunking
+
+Run directly (python test_markdown_cleaner.py) or with pytest.
+"""
+
+from markdown_cleaner import MarkdownStreamCleaner, clean_markdown_formatting
+
+RESPONSE = (
+    "## Tickets\n\n"
+    "**General admission** is $25. See [the site](https://metroflex.com).\n\n"
+    "- VIP: $75\n"
+    "- Athlete: __free__\n\n"
+    "1. Register\n"
+    "2. Pay\n\n\n\n"
+    "Thanks _champ_, see you at the *show*!"
+)
+
+
+def stream(text: str, size: int) -> MarkdownStreamCleaner:
+    """Feed `text` in `size`-character chunks; returns the cleaner"""
+    cleaner = MarkdownStreamCleaner()
+    for i in range(0, len(text), size):
+        cleaner.feed(text[i:i + size])
+    cleaner.flush()
+    return cleaner
+
+
+def test_clean_markdown_formatting():
+    assert clean_markdown_formatting(RESPONSE) == (
+        "Tickets\n\n"
+        "General admission is $25. See https://metroflex.com.\n\n"
+        "VIP: $75\n"
+        "Athlete: free\n\n"
+        "Register\n"
+        "Pay\n\n"
+        "Thanks champ, see you at the show!"
+    )
+
+
+def test_blank_line_before_a_list_is_kept():
+    assert clean_markdown_formatting("Options:\n\n- Monthly\n  + Annual\n10. Day pass") == \
+        "Options:\n\nMonthly\nAnnual\nDay pass"
+
+
+def test_plain_text_is_untouched():
+    text = "Weigh-ins are 5-7 PM. 2 x 3 = 6, file_name stays."
+    assert clean_markdown_formatting(text) == text
+
+
+def test_stream_matches_whole_response_for_any_chunking():
+    expected = clean_markdown_formatting(RESPONSE)
+    for size in range(1, len(RESPONSE) + 1):
+        assert stream(RESPONSE, size).text == expected, f"chunk size {size}"
+
+
+def test_open_bold_is_held_until_closed():
+    cleaner = MarkdownStreamCleaner()
+    assert cleaner.feed("Tickets are **on ") == "Tickets are"
+    assert cleaner.feed("sale** now ") == " on sale now"
+    assert cleaner.flush() == ""
+
+
+def test_open_link_is_held_until_closed():
+    cleaner = MarkdownStreamCleaner()
+    assert cleaner.feed("Register at [MuscleWare](https://") == "Register at"
+    assert cleaner.feed("muscleware.com) today") == " https://muscleware.com"
+    assert cleaner.flush() == " today"
+
+
+def test_unmatched_marker_is_released_after_max_hold():
+    cleaner = MarkdownStreamCleaner()
+    emitted = cleaner.feed("5 * 3 ")
+    emitted += cleaner.feed("word " * (MarkdownStreamCleaner.MAX_HOLD_CHARS // 5 + 1))
+    assert emitted.startswith("5 * 3 word")
+    emitted += cleaner.flush()
+    assert emitted == cleaner.text
+
+
+def main():
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n✅ ALL {len(tests)} MARKDOWN CLEANER TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
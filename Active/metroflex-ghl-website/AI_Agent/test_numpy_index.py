@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test Script for the MetroFlex NumPy Vector Index
+Top-k queries, filters, persistence and concurrent writers sharing one directory
+
+Each test uses its own index directory in a temporary directory.
+Run directly (python test_numpy_index.py) or with pytest.
+"""
+
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+
+from numpy_index import NumpyVectorIndex
+
+
+def vector(seed: int, dimensions: int = 8) -> list:
+    return np.random.default_rng(seed).standard_normal(dimensions).tolist()
+
+
+def make_path() -> str:
+    return os.path.join(tempfile.mkdtemp(), "index")
+
+
+def assert_aligned(index: NumpyVectorIndex):
+    """Every id's row of the matrix is that id's own vector"""
+    assert index._matrix.shape[0] == len(index._ids)
+    for doc_id in index._ids:
+        result = index.query(query_embeddings=[vector(int(doc_id.split("-")[1]))], n_results=1)
+        assert result["ids"][0] == [doc_id], f"{doc_id} is served {result['ids'][0]}"
+
+
+def test_query_and_filters():
+    index = NumpyVectorIndex()
+    index.upsert(ids=["a-1", "b-2", "c-3"], documents=["one", "two", "three"],
+                 metadatas=[{"category": "event"}, {"category": "faq"}, {"category": "event"}],
+                 embeddings=[vector(1), vector(2), vector(3)])
+    result = index.query(query_embeddings=[vector(2)], n_results=2)
+    assert result["ids"][0][0] == "b-2" and abs(result["distances"][0][0]) < 1e-5
+
+    events = index.query(query_embeddings=[vector(2)], n_results=5, where={"category": "event"})
+    assert sorted(events["ids"][0]) == ["a-1", "c-3"]
+    assert index.get(where={"$and": [{"category": "event"}]})["documents"] == ["one", "three"]
+
+    index.delete(["a-1"])
+    assert index.count() == 2
+    assert_aligned(index)
+
+
+def test_persists_and_reloads_mapped():
+    path = make_path()
+    NumpyVectorIndex(path=path).upsert(ids=["a-1", "b-2"], documents=["one", "two"], embeddings=[vector(1), vector(2)])
+    reloaded = NumpyVectorIndex(path=path, mmap=True)
+    assert reloaded.count() == 2 and isinstance(reloaded._matrix, np.memmap)
+    assert_aligned(reloaded)
+
+
+def test_writer_keeps_rows_it_never_loaded():
+    # Two processes opened the directory before either wrote to it
+    path = make_path()
+    first, second = NumpyVectorIndex(path=path, mmap=True), NumpyVectorIndex(path=path, mmap=True)
+    first.upsert(ids=["events-1"], documents=["events"], embeddings=[vector(1)])
+    second.upsert(ids=["gym-2"], documents=["gym"], embeddings=[vector(2)])
+    first.upsert(ids=["events-3"], documents=["events"], embeddings=[vector(3)])
+
+    for index in (first, NumpyVectorIndex(path=path, mmap=True)):
+        assert sorted(index.get()["ids"]) == ["events-1", "events-3", "gym-2"]
+        assert_aligned(index)
+
+
+def _write_rows(path: str, start: int):
+    index = NumpyVectorIndex(path=path, mmap=True)
+    for seed in range(start, start + 10):
+        index.upsert(ids=[f"row-{seed}"], documents=[str(seed)], embeddings=[vector(seed)])
+    assert_aligned(index)
+
+
+def test_concurrent_processes():
+    path = make_path()
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_write_rows, args=(path, start)) for start in (0, 100, 200, 300)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+
+    index = NumpyVectorIndex(path=path, mmap=True)
+    assert index.count() == 40
+    assert_aligned(index)
+
+
+def main():
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n✅ ALL {len(tests)} NUMPY INDEX TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
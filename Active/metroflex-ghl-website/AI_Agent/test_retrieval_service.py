@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test Script for the MetroFlex Retrieval Service
+Namespaced views of the shared index, and section-scoped prompt context
+
+Uses a NumPy index and a bag-of-words stand-in for the SentenceTransformer.
+Run directly (python test_retrieval_service.py) or with pytest.
+"""
+
+import os
+import tempfile
+import zlib
+
+import numpy as np
+
+from numpy_index import NumpyVectorIndex
+from retrieval_service import NamespaceView, SectionContext, chunk_sections
+
+GYM = {
+    "overview": "MetroFlex Miami HQ opens Q2 2026",
+    "membership_tiers": [
+        {"tier": "Founder's Lifetime Membership", "price": "$2,500 one-time"},
+        {"tier": "Monthly Unlimited", "price": "$89/month"}
+    ],
+    "facilities": ["Olympic lifting platforms", "Posing room"]
+}
+
+
+def embed(texts):
+    """Bag of words hashed into 64 dimensions"""
+    vectors = np.zeros((len(texts), 64), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.lower().replace('"', " ").replace(":", " ").split():
+            vectors[row, zlib.crc32(word.encode()) % 64] += 1.0
+    return vectors
+
+
+class FakeRetrieval:
+    """RetrievalService without the SentenceTransformer"""
+
+    def __init__(self, path: str = None):
+        self.collection = NumpyVectorIndex(embedding_function=embed, path=path)
+
+    def namespace(self, name: str) -> NamespaceView:
+        return NamespaceView(self.collection, name)
+
+    def embed_query(self, text: str):
+        return embed([text])[0]
+
+
+def test_chunk_sections():
+    documents, metadatas = chunk_sections(GYM, "membership_tiers", "tier")
+    assert documents[0] == 'overview: "MetroFlex Miami HQ opens Q2 2026"'
+    assert documents[2] == 'membership_tiers / Monthly Unlimited: {"tier":"Monthly Unlimited","price":"$89/month"}'
+    assert metadatas[1] == {"section": "membership_tiers", "tier": "Founder's Lifetime Membership", "order": 2}
+    assert [meta["order"] for meta in metadatas] == [1, 2, 3, 4]
+
+
+def test_namespaces_are_isolated():
+    retrieval = FakeRetrieval()
+    gym, licensing = retrieval.namespace("gym"), retrieval.namespace("licensing")
+    gym.upsert(ids=["a"], documents=["posing room"], metadatas=[{"section": "facilities"}])
+    licensing.upsert(ids=["a"], documents=["new build license"], metadatas=[{"section": "packages"}])
+
+    assert gym.get()["ids"] == ["a"] and gym.get()["documents"] == ["posing room"]
+    assert gym.count() == 1 and retrieval.collection.count() == 2
+    result = licensing.query(query_embeddings=[retrieval.embed_query("posing room")], n_results=5)
+    assert result["documents"][0] == ["new build license"]
+    assert "namespace" not in result["metadatas"][0][0]
+
+
+def test_section_context_sends_the_closest_chunks_in_kb_order():
+    context = SectionContext("gym", GYM, "membership_tiers", "tier", limit=2, retrieval=FakeRetrieval())
+    assert context.mode == "retrieval" and context.collection.count() == 4
+    text = context.text("Olympic lifting platforms and the monthly unlimited price")
+    assert text.splitlines() == [
+        'membership_tiers / Monthly Unlimited: {"tier":"Monthly Unlimited","price":"$89/month"}',
+        'facilities: ["Olympic lifting platforms","Posing room"]'
+    ]
+
+
+def test_section_context_falls_back_to_the_full_section():
+    class BrokenRetrieval(FakeRetrieval):
+        def namespace(self, name):
+            raise RuntimeError("no encoder")
+
+    context = SectionContext("gym", GYM, "membership_tiers", "tier", retrieval=BrokenRetrieval())
+    assert context.mode == "full"
+    assert '"Posing room"' in context.text("anything") and "\n  " in context.text("anything")
+
+    full = SectionContext("gym", GYM, "membership_tiers", "tier", mode="full")
+    assert full.collection is None and full.text("anything") == context.text("anything")
+
+
+def test_agents_sharing_a_directory_keep_each_others_rows():
+    path = os.path.join(tempfile.mkdtemp(), "index")
+    SectionContext("licensing", {"fees": "$60,000"}, "licensing_packages", "package", retrieval=FakeRetrieval(path))
+    # A process that only hosts the gym agent
+    SectionContext("gym", GYM, "membership_tiers", "tier", retrieval=FakeRetrieval(path))
+
+    reloaded = FakeRetrieval(path)
+    assert reloaded.namespace("licensing").count() == 1
+    assert reloaded.namespace("gym").count() == 4
+
+
+def main():
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n✅ ALL {len(tests)} RETRIEVAL SERVICE TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test Script for the MetroFlex Session Store
+Message caps, LRU eviction and idle expiry for both backends
+
+Each SQLite store uses its own file in a temporary directory.
+Run directly (python test_session_store.py) or with pytest.
+"""
+
+import os
+import tempfile
+import time
+
+from session_store import MemorySessionStore, SessionStore, SQLiteSessionStore
+
+
+def stores(**options):
+    yield MemorySessionStore(**options)
+    yield SQLiteSessionStore(path=os.path.join(tempfile.mkdtemp(), "sessions.db"), **options)
+
+
+def message(n: int) -> dict:
+    return {"role": "user", "content": str(n)}
+
+
+def test_keeps_the_latest_messages():
+    for store in stores(max_messages=3):
+        store.append("a", *[message(n) for n in range(5)])
+        store.append("a", message(5))
+        assert [m["content"] for m in store.get("a")] == ["3", "4", "5"], store.backend
+        assert store.get("unknown") == []
+
+        store.delete("a")
+        assert store.get("a") == [] and len(store) == 0
+
+
+def test_max_messages_must_keep_a_message():
+    for max_messages in (0, -1):
+        try:
+            MemorySessionStore(max_messages=max_messages)
+        except ValueError:
+            continue
+        raise AssertionError(f"max_messages={max_messages} accepted")
+
+    for store in stores(max_messages=1):
+        store.append("a", message(1), message(2))
+        assert store.get("a") == [message(2)], store.backend
+
+
+def test_least_recently_used_session_is_evicted():
+    store = MemorySessionStore(max_sessions=2)
+    store.append("a", message(1))
+    store.append("b", message(2))
+    store.get("a")
+    store.append("a", message(3))
+    store.append("c", message(4))
+    assert store.get("b") == [] and len(store) == 2 and store.evictions == 1
+
+    sqlite = SQLiteSessionStore(path=os.path.join(tempfile.mkdtemp(), "sessions.db"), max_sessions=2)
+    for key in ("a", "b", "c"):
+        sqlite.append(key, message(1))
+        time.sleep(0.01)
+    sqlite.prune()
+    assert sqlite.get("a") == [] and len(sqlite) == 2 and sqlite.evictions == 1
+
+
+def test_idle_sessions_expire():
+    for store in stores(ttl_seconds=0):
+        store.append("a", message(1))
+        time.sleep(0.01)
+        assert store.get("a") == [] and store.expirations == 1, store.backend
+
+
+def test_backends_must_implement_the_interface():
+    try:
+        SessionStore()
+    except TypeError:
+        return
+    raise AssertionError("SessionStore is instantiable")
+
+
+def main():
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n✅ ALL {len(tests)} SESSION STORE TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
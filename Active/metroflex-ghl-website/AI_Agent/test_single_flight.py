@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test Script for the MetroFlex Single-Flight
+Coalescing of identical in-flight calls, for threads and asyncio
+
+Run directly (python test_single_flight.py) or with pytest.
+"""
+
+import asyncio
+import threading
+import time
+
+from single_flight import SingleFlight
+
+
+def test_threads_share_one_call():
+    flights = SingleFlight()
+    calls = []
+
+    def complete():
+        calls.append(1)
+        time.sleep(0.1)
+        return "answer"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("q", complete))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["answer"] * 5 and len(calls) == 1
+    assert flights.stats()["coalesced_calls"] == 4 and flights.stats()["in_flight"] == 0
+
+
+def test_async_callers_share_one_call_and_its_error():
+    flights = SingleFlight()
+    calls = []
+
+    async def complete():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise ValueError("upstream")
+
+    async def run():
+        return await asyncio.gather(*(flights.ado("q", complete) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1 and all(isinstance(result, ValueError) for result in results)
+
+
+def test_cancelled_leader_hands_the_call_to_a_follower():
+    flights = SingleFlight()
+    calls = []
+
+    async def complete():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return f"answer {len(calls)}"
+
+    async def run():
+        leader = asyncio.ensure_future(flights.ado("q", complete))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flights.ado("q", complete)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        # The leader's client disconnects
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        return leader.cancelled(), results
+
+    leader_cancelled, results = asyncio.run(run())
+    assert leader_cancelled
+    assert results == ["answer 2"] * 3 and len(calls) == 2
+    assert flights.stats()["upstream_calls"] == 2 and flights.stats()["in_flight"] == 0
+
+
+def test_cancelled_follower_leaves_the_call_running():
+    flights = SingleFlight()
+
+    async def complete():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        leader = asyncio.ensure_future(flights.ado("q", complete))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.ado("q", complete))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        return await leader, follower.cancelled()
+
+    assert asyncio.run(run()) == ("answer", True)
+
+
+def main():
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n✅ ALL {len(tests)} SINGLE-FLIGHT TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
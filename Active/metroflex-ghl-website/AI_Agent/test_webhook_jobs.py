@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Test Script for the MetroFlex Webhook Job Queue
+Deduplication, re-running failed and stale jobs, startup recovery and callbacks
+
+Each test uses its own SQLite file in a temporary directory.
+Run directly (python test_webhook_jobs.py) or with pytest.
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+
+import webhook_jobs
+from ghl_client import get_ghl_client
+from webhook_jobs import QueueFull, WebhookJobQueue, dedupe_key, validate_callback_url
+
+PAYLOAD = {"contact_id": "ghl_123", "event_id": "evt_1", "message": "Too expensive"}
+
+
+def make_queue(**kwargs) -> WebhookJobQueue:
+    return WebhookJobQueue(path=os.path.join(tempfile.mkdtemp(), "jobs.db"), **kwargs)
+
+
+def wait_for(queue: WebhookJobQueue, job_id: str, timeout: float = 5.0) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def age(queue: WebhookJobQueue, job_id: str, seconds: float):
+    """Pretend the job was queued/started `seconds` ago"""
+    conn = sqlite3.connect(queue.path)
+    conn.execute("UPDATE webhook_jobs SET created_at = created_at - ?, started_at = started_at - ? WHERE id = ?",
+                 (seconds, seconds, job_id))
+    conn.commit()
+    conn.close()
+
+
+def test_dedupe_key():
+    assert dedupe_key("conversation", PAYLOAD) == "conversation:event:evt_1"
+    without_event = {"contact_id": "ghl_123", "message": "hi"}
+    assert dedupe_key("workflow", without_event) == dedupe_key("workflow", dict(without_event))
+    assert dedupe_key("workflow", without_event) != dedupe_key("workflow", {**without_event, "message": "yo"})
+
+
+def test_duplicate_delivery_returns_the_original_job():
+    queue = make_queue()
+    runs = []
+    job, created = queue.submit("conversation", "k1", PAYLOAD, lambda p: runs.append(p) or {"ok": True})
+    assert created
+    assert wait_for(queue, job["job_id"])["result"] == {"ok": True}
+
+    again, created = queue.submit("conversation", "k1", PAYLOAD, lambda p: runs.append(p) or {"ok": True})
+    assert not created and again["job_id"] == job["job_id"]
+    time.sleep(0.1)
+    assert len(runs) == 1
+
+
+def test_failed_job_runs_again_on_redelivery():
+    queue = make_queue()
+    attempts = []
+
+    def flaky(payload):
+        attempts.append(payload)
+        if len(attempts) == 1:
+            raise RuntimeError("OpenAI timeout")
+        return {"reply": "ok"}
+
+    job, _ = queue.submit("conversation", "k1", PAYLOAD, flaky)
+    assert wait_for(queue, job["job_id"])["error"] == "OpenAI timeout"
+
+    again, created = queue.submit("conversation", "k1", PAYLOAD, flaky)
+    assert created and again["job_id"] == job["job_id"]
+    done = wait_for(queue, job["job_id"])
+    assert done["status"] == "done" and "error" not in done
+    assert len(attempts) == 2
+
+
+def test_stale_job_runs_again_on_redelivery():
+    queue = make_queue(stale_seconds=60)
+    conn = queue._connection()
+    conn.execute(
+        """INSERT INTO webhook_jobs (id, kind, dedupe_key, status, payload, created_at, started_at)
+           VALUES ('lost', 'conversation', 'k1', 'running', '{}', ?, ?)""",
+        (time.time(), time.time())
+    )
+
+    # Still within stale_seconds: the running job is left alone
+    _, created = queue.submit("conversation", "k1", PAYLOAD, lambda p: {"ok": True})
+    assert not created
+
+    age(queue, "lost", 120)
+    job, created = queue.submit("conversation", "k1", PAYLOAD, lambda p: {"ok": True})
+    assert created and job["job_id"] == "lost"
+    assert wait_for(queue, "lost")["result"] == {"ok": True}
+
+
+def test_queued_job_behind_a_busy_pool_is_not_run_twice():
+    queue = make_queue(max_workers=1, stale_seconds=0.05)
+    runs = []
+    blocker, _ = queue.submit("workflow", "slow", PAYLOAD, lambda p: time.sleep(0.3) or {})
+    job, _ = queue.submit("conversation", "k1", PAYLOAD, lambda p: runs.append(p) or {"ok": True})
+
+    # Still queued past stale_seconds, but this process's pool holds it
+    time.sleep(0.1)
+    assert queue.get(job["job_id"])["status"] == "queued"
+    _, created = queue.submit("conversation", "k1", PAYLOAD, lambda p: runs.append(p) or {"ok": True})
+    assert not created
+    assert queue.recover({"conversation": lambda p: runs.append(p) or {}}) == 0
+
+    wait_for(queue, blocker["job_id"])
+    wait_for(queue, job["job_id"])
+    time.sleep(0.05)
+    assert len(runs) == 1
+
+
+def test_stale_job_held_by_a_live_worker_is_left_alone():
+    queue = make_queue(stale_seconds=60)
+    conn = queue._connection()
+    # Another live process (the test runner's parent) holds the job
+    conn.execute(
+        """INSERT INTO webhook_jobs (id, kind, dedupe_key, status, payload, worker_pid, created_at, started_at)
+           VALUES ('busy', 'conversation', 'k1', 'running', '{}', ?, ?, ?)""",
+        (os.getppid(), time.time(), time.time())
+    )
+    age(queue, "busy", 120)
+    _, created = queue.submit("conversation", "k1", PAYLOAD, lambda p: {"ok": True})
+    assert not created
+    assert queue.recover({"conversation": lambda p: {}}) == 0
+
+
+def test_callback_url_allow_list():
+    allowed = ["leadconnectorhq.com"]
+    assert validate_callback_url("https://services.leadconnectorhq.com/hooks/abc", allowed)
+    assert validate_callback_url("https://leadconnectorhq.com/hooks/abc", allowed)
+    for url in ("http://services.leadconnectorhq.com/hooks/abc", "https://169.254.169.254/latest/meta-data",
+                "https://localhost:5001/api/admin", "https://leadconnectorhq.com.evil.example/x",
+                "https://user:pw@services.leadconnectorhq.com/x", "not a url", ""):
+        try:
+            validate_callback_url(url, allowed)
+            raise AssertionError(f"{url!r} accepted")
+        except ValueError:
+            pass
+
+    try:
+        make_queue().submit("workflow", "k1", PAYLOAD, lambda p: {}, "https://10.0.0.5/internal")
+        raise AssertionError("internal callback accepted")
+    except ValueError:
+        pass
+
+
+def test_callbacks_use_their_own_outbox():
+    queued = []
+
+    class RecordingOutbox:
+        def enqueue(self, url, payload):
+            queued.append((url, payload["status"]))
+
+    original = webhook_jobs.get_callback_outbox
+    webhook_jobs.get_callback_outbox = lambda start=True: RecordingOutbox()
+    try:
+        queue = make_queue()
+        url = "https://services.leadconnectorhq.com/hooks/done"
+        job, _ = queue.submit("workflow", "k1", PAYLOAD, lambda p: {"ok": True}, url)
+        wait_for(queue, job["job_id"])
+        time.sleep(0.05)
+    finally:
+        webhook_jobs.get_callback_outbox = original
+    assert queued == [(url, "done")]
+
+    # Not the lead outbox's client: a failing callback host can't open its circuit
+    os.environ.setdefault("WEBHOOK_CALLBACK_OUTBOX_PATH", os.path.join(tempfile.mkdtemp(), "callbacks.db"))
+    assert webhook_jobs.get_callback_outbox(start=False).client is not get_ghl_client()
+
+
+def test_recover_restarts_stale_jobs():
+    queue = make_queue(stale_seconds=60)
+    conn = queue._connection()
+    now = time.time()
+    for job_id, kind, status in (("q", "workflow", "queued"), ("r", "conversation", "running"),
+                                 ("fresh", "conversation", "running")):
+        conn.execute(
+            """INSERT INTO webhook_jobs (id, kind, dedupe_key, status, payload, created_at, started_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (job_id, kind, job_id, status, '{"contact_id": "ghl_1"}', now, now if status == "running" else None)
+        )
+    age(queue, "q", 300)
+    age(queue, "r", 300)
+
+    handlers = {"workflow": lambda p: {"kind": "workflow", **p}, "conversation": lambda p: {"kind": "conversation"}}
+    assert queue.recover(handlers) == 2
+    assert wait_for(queue, "q")["result"] == {"kind": "workflow", "contact_id": "ghl_1"}
+    assert wait_for(queue, "r")["status"] == "done"
+    assert queue.get("fresh")["status"] == "running"
+    # A second worker starting up finds nothing left to take
+    assert queue.recover(handlers) == 0
+
+
+def test_queue_full():
+    queue = make_queue(max_workers=1, max_pending=1)
+    job, _ = queue.submit("workflow", "slow", PAYLOAD, lambda p: time.sleep(0.3) or {})
+    try:
+        queue.submit("workflow", "other", PAYLOAD, lambda p: {})
+        raise AssertionError("second job accepted past max_pending")
+    except QueueFull:
+        pass
+    wait_for(queue, job["job_id"])
+
+
+def test_old_table_gets_a_payload_column():
+    path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """CREATE TABLE webhook_jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, dedupe_key TEXT NOT NULL UNIQUE,
+               status TEXT NOT NULL DEFAULT 'queued', callback_url TEXT, result TEXT, error TEXT,
+               created_at REAL NOT NULL, started_at REAL, finished_at REAL)"""
+    )
+    conn.commit()
+    conn.close()
+
+    queue = WebhookJobQueue(path=path)
+    job, _ = queue.submit("conversation", "k1", PAYLOAD, lambda p: {"ok": True})
+    assert wait_for(queue, job["job_id"])["status"] == "done"
+
+
+def main():
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n✅ ALL {len(tests)} WEBHOOK JOB TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
@@ -25,9 +25,11 @@ import json
 import logging
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import requests
-from licensing_agent import LicensingQualificationAgent
-from gym_member_agent import GymMemberOnboardingAgent
+from agent_registry import AgentRegistry
+from ghl_outbox import get_outbox
+from webhook_jobs import QueueFull, dedupe_key, get_callback_outbox, get_job_queue, validate_callback_url
+from llm_gateway import BATCH, INTERACTIVE, LLMOverloaded, get_llm_gateway, overloaded_response
+from metrics import instrument_flask, record_error, time_stage
 from ghl_workflow_agent import generate_workflow_api
 from ghl_conversation_agent import conversation_api
 
@@ -41,63 +43,151 @@ logger = logging.getLogger(__name__)
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
+instrument_flask(app, "unified")
 
 # Configuration
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 GHL_WEBHOOK_URL = os.getenv('GHL_LEAD_CAPTURE_WEBHOOK', '')
 PORT = int(os.getenv('PORT', 5001))
 
-# Initialize agents
-logger.info("Initializing AI agents...")
+# Agents are constructed on first use (or by /warmup), not at import
+agents = AgentRegistry(retry_seconds=float(os.getenv('AGENT_RETRY_SECONDS', '30')))
 
-try:
-    licensing_agent = LicensingQualificationAgent(
+
+def _create_licensing_agent():
+    from licensing_agent import LicensingQualificationAgent
+    return LicensingQualificationAgent(
         openai_api_key=OPENAI_API_KEY,
-        knowledge_base_path='METROFLEX_EVENTS_KB_V3_EVENTS_ONLY.json'  # Will use licensing section
+        knowledge_base_path='METROFLEX_COMPLETE_KB_V3.json'  # metroflex_licensing section
     )
-    logger.info("✅ Licensing Agent initialized")
-except Exception as e:
-    logger.error(f"❌ Failed to initialize Licensing Agent: {e}")
-    licensing_agent = None
 
-try:
-    gym_agent = GymMemberOnboardingAgent(
+
+def _create_gym_agent():
+    from gym_member_agent import GymMemberOnboardingAgent
+    return GymMemberOnboardingAgent(
         openai_api_key=OPENAI_API_KEY,
         knowledge_base_path='METROFLEX_COMPLETE_KB_V3.json'
     )
-    logger.info("✅ Gym Member Agent initialized")
-except Exception as e:
-    logger.error(f"❌ Failed to initialize Gym Member Agent: {e}")
-    gym_agent = None
+
+
+def _create_events_agent():
+    # The events module builds its RAG agent (encoder + vector index) on import,
+    # from EVENTS_KB_PATH; the registry hands out that same instance rather
+    # than building a second one
+    import metroflex_ai_agent_enhanced as events
+    return events.agent
+
+
+agents.register('licensing', _create_licensing_agent)
+agents.register('gym_member', _create_gym_agent)
+agents.register('events', _create_events_agent)
+
+# Agents constructed in the background right after startup; /ready reports
+# 200 once the AGENT_READY_REQUIRED ones (default: the same list) are built
+AGENT_PRELOAD = [name.strip() for name in os.getenv('AGENT_PRELOAD', 'licensing,gym_member').split(',') if name.strip()]
+AGENT_READY_REQUIRED = [
+    name.strip() for name in os.getenv('AGENT_READY_REQUIRED', ','.join(AGENT_PRELOAD)).split(',') if name.strip()
+]
+
+
+# Fast-ack mode for GHL-triggered webhooks: validate, answer 202 with a job ID,
+# do the LLM work in the background (a request can also opt in with ?async=true)
+WEBHOOK_FAST_ACK = os.getenv('WEBHOOK_FAST_ACK', 'false').lower() == 'true'
 
 
 def send_to_ghl(payload: dict) -> bool:
-    """Send lead to GoHighLevel webhook"""
+    """
+    Queue lead for the GoHighLevel webhook
+
+    The payload goes to the durable outbox (ghl_outbox.py); its background
+    worker posts it with retries, so API responses never wait on GHL.
+    """
     if not GHL_WEBHOOK_URL or GHL_WEBHOOK_URL == 'https://placeholder-get-real-webhook-from-brian.com':
         logger.warning("GHL webhook not configured - skipping lead capture")
         return False
 
     try:
-        response = requests.post(GHL_WEBHOOK_URL, json=payload, timeout=10)
-        response.raise_for_status()
-        logger.info(f"✅ Lead sent to GHL: {payload.get('contact', {}).get('name', 'Unknown')}")
+        with time_stage("unified", "ghl_enqueue"):
+            get_outbox().enqueue(GHL_WEBHOOK_URL, payload)
+        logger.info(f"📬 Lead queued for GHL: {payload.get('contact', {}).get('name', 'Unknown')}")
         return True
     except Exception as e:
-        logger.error(f"❌ Failed to send to GHL: {e}")
+        record_error("unified", "ghl_enqueue")
+        logger.error(f"❌ Failed to queue lead for GHL: {e}")
         return False
 
 
+def health_payload() -> dict:
+    """Health check body (shared with the ASGI server)"""
+    return {
+        'status': 'healthy',
+        'agents': {name: agents.state(name) == 'ready' for name in agents.names},
+        'agent_states': {name: agents.state(name) for name in agents.names},
+        'ghl_configured': GHL_WEBHOOK_URL != '' and 'placeholder' not in GHL_WEBHOOK_URL
+    }
+
+
+def parse_agent_names(names) -> list:
+    """Agent list from a /warmup body or /ready query; None means the default. Raises ValueError"""
+    if names is None:
+        return None
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(',') if name.strip()]
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise ValueError("agents must be a list of agent names")
+    unknown = [name for name in names if name not in agents.names]
+    if unknown:
+        raise ValueError(f"Unknown agents: {', '.join(unknown)} (available: {', '.join(agents.names)})")
+    return names
+
+
+def ready_payload(names: list = None) -> tuple:
+    """(body, status code) of the readiness probe: 200 once the agents are constructed"""
+    names = AGENT_READY_REQUIRED if names is None else names
+    ready = agents.is_ready(names)
+    return {'ready': ready, 'agents': agents.status(names)}, 200 if ready else 503
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'agents': {
-            'licensing': licensing_agent is not None,
-            'gym_member': gym_agent is not None
-        },
-        'ghl_configured': GHL_WEBHOOK_URL != '' and 'placeholder' not in GHL_WEBHOOK_URL
-    }), 200
+    return jsonify(health_payload()), 200
+
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """
+    Readiness probe: 503 until the required agents are constructed
+
+    Query: ?agents=licensing,events (default: AGENT_READY_REQUIRED)
+    """
+    try:
+        names = parse_agent_names(request.args.get('agents'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    body, status = ready_payload(names)
+    return jsonify(body), status
+
+
+@app.route('/warmup', methods=['POST'])
+def warmup():
+    """
+    Construct agents in the background ahead of their first request
+
+    Request: {"agents": ["events", "licensing"]}  // Optional, default all
+    Response (202): per-agent state, poll /ready for completion
+    """
+    try:
+        names = parse_agent_names((request.get_json(silent=True) or {}).get('agents'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'agents': agents.warmup(names)}), 202
+
+
+@app.route('/api/outbox/stats', methods=['GET'])
+def outbox_stats():
+    """GHL lead outbox queue depth and delivery lag"""
+    return jsonify(get_outbox().stats()), 200
 
 
 @app.route('/api/licensing/chat', methods=['POST'])
@@ -129,6 +219,7 @@ def licensing_chat():
         "ghl_sent": true/false
     }
     """
+    licensing_agent = agents.get('licensing')
     if not licensing_agent:
         return jsonify({'error': 'Licensing agent not available'}), 503
 
@@ -161,7 +252,12 @@ def licensing_chat():
 
         return jsonify(response), 200
 
+    except LLMOverloaded as e:
+        logger.warning(f"LLM gateway shed licensing_chat: {e}")
+        body, status, headers = overloaded_response(e)
+        return jsonify(body), status, headers
     except Exception as e:
+        record_error("unified", "licensing_chat")
         logger.error(f"Error in licensing chat: {e}")
         return jsonify({'error': str(e)}), 500
 
@@ -194,6 +290,7 @@ def gym_chat():
         "ghl_sent": true/false
     }
     """
+    gym_agent = agents.get('gym_member')
     if not gym_agent:
         return jsonify({'error': 'Gym member agent not available'}), 503
 
@@ -229,7 +326,12 @@ def gym_chat():
 
         return jsonify(response), 200
 
+    except LLMOverloaded as e:
+        logger.warning(f"LLM gateway shed gym_chat: {e}")
+        body, status, headers = overloaded_response(e)
+        return jsonify(body), status, headers
     except Exception as e:
+        record_error("unified", "gym_chat")
         logger.error(f"Error in gym chat: {e}")
         return jsonify({'error': str(e)}), 500
 
@@ -237,13 +339,157 @@ def gym_chat():
 @app.route('/api/events/chat', methods=['POST'])
 def events_chat():
     """
-    Events chat endpoint (existing functionality)
-    Placeholder - integrate existing events agent here
+    Events chat endpoint (metroflex_ai_agent_enhanced.py RAG agent)
+
+    Request:
+    {
+        "message": "When is the next show?",
+        "user_id": "unique_user_id",  // Optional
+        "conversation_id": "optional_conversation_id"
+    }
+
+    Response: same body as the events server's /webhook/chat
     """
-    return jsonify({
-        'response': 'Events agent endpoint - integrate existing metroflex_ai_agent_enhanced.py',
-        'high_intent': False
-    }), 200
+    events_agent = agents.get('events')
+    if not events_agent:
+        return jsonify({'error': 'Events agent not available'}), 503
+
+    try:
+        data = request.json
+        message = data.get('message', '')
+
+        if not message:
+            return jsonify({'error': 'Message is required'}), 400
+
+        import metroflex_ai_agent_enhanced as events
+        result = events_agent.chat(message, data.get('user_id', 'anonymous'), data.get('conversation_id'))
+
+        logger.info(f"Events query processed: {message[:50]}... (High intent: {result.get('high_intent_detected', False)})")
+
+        return jsonify(events.chat_payload(result)), 200
+
+    except LLMOverloaded as e:
+        logger.warning(f"LLM gateway shed events_chat: {e}")
+        body, status, headers = overloaded_response(e)
+        return jsonify(body), status, headers
+    except Exception as e:
+        record_error("unified", "events_chat")
+        logger.error(f"Error in events chat: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+REQUIRED_FIELDS = {
+    'workflow': ['name', 'email', 'business_context'],
+    'conversation': ['contact_id', 'contact_name', 'contact_phone', 'message']
+}
+
+
+def process_workflow(data: dict) -> dict:
+    """Generate a workflow (inline or as a background job)"""
+    result = generate_workflow_api(data)
+    logger.info(f"Workflow generated: {result['workflow_id']} ({len(result['steps'])} steps)")
+    return result
+
+
+def process_conversation(data: dict) -> dict:
+    """Handle one conversation message, queueing a GHL handoff if triggered (inline or as a background job)"""
+    result = conversation_api(data)
+
+    # Send to GHL if handoff triggered
+    if result.get('trigger_handoff'):
+        handoff_payload = {
+            "contact_id": data['contact_id'],
+            "handoff_urgency": result['handoff_urgency'],
+            "handoff_reason": result['handoff_reason'],
+            "assigned_to": "sales_team"
+        }
+        send_to_ghl(handoff_payload)
+
+    logger.info(f"Conversation handled: {data.get('contact_name')} (Objection: {result['detected_objection']['objection_type']})")
+    return result
+
+
+JOB_HANDLERS = {'workflow': process_workflow, 'conversation': process_conversation}
+# LLM gateway class of each kind: SMS replies go ahead of workflow generation
+JOB_PRIORITIES = {'workflow': BATCH, 'conversation': INTERACTIVE}
+
+
+def start_background_work():
+    """
+    Start the AGENT_PRELOAD warmup, re-run webhook jobs a dead worker left
+    unfinished and deliver leads and job callbacks still queued from before
+    a restart
+    """
+    if AGENT_PRELOAD:
+        agents.warmup(AGENT_PRELOAD)
+    get_job_queue().recover(JOB_HANDLERS)
+    get_callback_outbox()
+    if GHL_WEBHOOK_URL and 'placeholder' not in GHL_WEBHOOK_URL:
+        get_outbox()
+
+
+# A preloading Gunicorn master must not fork while warmup or job threads hold
+# the retrieval service and import locks: gunicorn.conf.py sets
+# AGENT_WARMUP_AFTER_FORK and starts this work in each worker (post_fork).
+# The master still builds the AGENT_PRELOAD agents, synchronously, so the
+# workers inherit one encoder and one saved index instead of each building
+# (and writing) its own; their warmup then finds the agents ready.
+if os.getenv('AGENT_WARMUP_AFTER_FORK', 'false').lower() == 'true':
+    for name in AGENT_PRELOAD:
+        agents.get(name)
+else:
+    start_background_work()
+
+
+def wants_fast_ack(flag) -> bool:
+    """Fast-ack for this request: ?async=true|false overrides WEBHOOK_FAST_ACK"""
+    if flag is None:
+        return WEBHOOK_FAST_ACK
+    return str(flag).lower() in ('1', 'true', 'yes')
+
+
+def submit_webhook_job(kind: str, data: dict) -> tuple:
+    """
+    Validate a webhook payload and queue it as a job
+
+    Returns:
+        (body, status code, headers): 202 with the job ID (the original job
+        for a duplicate delivery), 400 for a bad payload, 429 + Retry-After
+        when the LLM gateway is shedding this kind, 503 when the queue is full
+    """
+    if not isinstance(data, dict):
+        return {'error': 'JSON body is required'}, 400, {}
+    missing = [field for field in REQUIRED_FIELDS[kind] if not data.get(field)]
+    if missing:
+        return {'error': f"Missing required fields: {', '.join(missing)}"}, 400, {}
+    if data.get('callback_url'):
+        try:
+            validate_callback_url(data['callback_url'])
+        except ValueError as e:
+            return {'error': str(e)}, 400, {}
+
+    try:
+        # Refuse up front rather than queue a job whose LLM calls would be shed
+        get_llm_gateway().check(JOB_PRIORITIES[kind])
+    except LLMOverloaded as e:
+        logger.warning(f"LLM gateway shedding {kind}, rejecting job: {e}")
+        return overloaded_response(e)
+
+    try:
+        job, created = get_job_queue().submit(
+            kind, dedupe_key(kind, data), data, JOB_HANDLERS[kind], data.get('callback_url')
+        )
+    except QueueFull as e:
+        logger.warning(f"Webhook job queue full, rejecting {kind}: {e}")
+        return {'error': 'Too many jobs in progress, retry later'}, 503, {}
+
+    logger.info(f"{kind.title()} job {'queued' if created else 'deduplicated'}: {job['job_id']}")
+    return {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'deduplicated': not created,
+        'status_url': f"/api/jobs/{job['job_id']}"
+    }, 202, {}
 
 
 @app.route('/api/workflow/generate', methods=['POST'])
@@ -261,7 +507,9 @@ def workflow_generate():
         "lead_source": "facebook-ad",
         "lpr_score": 72,
         "business_context": "licensing" | "gym_membership" | "events",
-        "workflow_length_days": 14
+        "workflow_length_days": 14,
+        "event_id": "ghl_event_id",  // Optional, deduplicates retried deliveries
+        "callback_url": "https://..."  // Optional, receives the finished job (WEBHOOK_CALLBACK_HOSTS only)
     }
 
     Response:
@@ -271,16 +519,23 @@ def workflow_generate():
         "n8n_json": {...},
         "expected_conversion": 0.18
     }
+
+    In fast-ack mode (WEBHOOK_FAST_ACK or ?async=true): 202 {"job_id", "status_url", ...}
     """
     try:
         data = request.json
-        result = generate_workflow_api(data)
-
-        logger.info(f"Workflow generated: {result['workflow_id']} ({len(result['steps'])} steps)")
+        if wants_fast_ack(request.args.get('async')):
+            body, status, headers = submit_webhook_job('workflow', data)
+            return jsonify(body), status, headers
 
-        return jsonify(result), 200
+        return jsonify(process_workflow(data)), 200
 
+    except LLMOverloaded as e:
+        logger.warning(f"LLM gateway shed workflow_generate: {e}")
+        body, status, headers = overloaded_response(e)
+        return jsonify(body), status, headers
     except Exception as e:
+        record_error("unified", "workflow_generate")
         logger.error(f"Error generating workflow: {e}")
         return jsonify({'error': str(e)}), 500
 
@@ -299,7 +554,9 @@ def conversation_handle():
         "message": "Sounds good but too expensive",
         "conversation_history": [...],
         "business_context": "licensing",
-        "channel": "sms"
+        "channel": "sms",
+        "event_id": "ghl_event_id",  // Optional, deduplicates retried deliveries
+        "callback_url": "https://..."  // Optional, receives the finished job (WEBHOOK_CALLBACK_HOSTS only)
     }
 
     Response:
@@ -309,49 +566,69 @@ def conversation_handle():
         "trigger_handoff": false,
         "update_fields": {...}
     }
+
+    In fast-ack mode (WEBHOOK_FAST_ACK or ?async=true): 202 {"job_id", "status_url", ...}
     """
     try:
         data = request.json
-        result = conversation_api(data)
-
-        # Send to GHL if handoff triggered
-        if result.get('trigger_handoff'):
-            handoff_payload = {
-                "contact_id": data['contact_id'],
-                "handoff_urgency": result['handoff_urgency'],
-                "handoff_reason": result['handoff_reason'],
-                "assigned_to": "sales_team"
-            }
-            send_to_ghl(handoff_payload)
-
-        logger.info(f"Conversation handled: {data.get('contact_name')} (Objection: {result['detected_objection']['objection_type']})")
+        if wants_fast_ack(request.args.get('async')):
+            body, status, headers = submit_webhook_job('conversation', data)
+            return jsonify(body), status, headers
 
-        return jsonify(result), 200
+        return jsonify(process_conversation(data)), 200
 
+    except LLMOverloaded as e:
+        logger.warning(f"LLM gateway shed conversation_handle: {e}")
+        body, status, headers = overloaded_response(e)
+        return jsonify(body), status, headers
     except Exception as e:
+        record_error("unified", "conversation_handle")
         logger.error(f"Error handling conversation: {e}")
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/agents/status', methods=['GET'])
-def agents_status():
-    """Get status of all 5 agents"""
-    return jsonify({
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status of a fast-ack webhook job, with its result once done"""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
+
+@app.route('/api/jobs/stats', methods=['GET'])
+def job_stats():
+    """Webhook job queue depth by status"""
+    return jsonify(get_job_queue().stats()), 200
+
+
+@app.route('/api/llm/stats', methods=['GET'])
+def llm_stats():
+    """LLM gateway slots, queue depth and shed counts per priority class"""
+    return jsonify(get_llm_gateway().stats()), 200
+
+
+def agents_status_payload() -> dict:
+    """Status of all 5 agents (shared with the ASGI server)"""
+    return {
         'agents': {
             'licensing': {
-                'available': licensing_agent is not None,
+                'available': agents.state('licensing') != 'failed',
+                'state': agents.state('licensing'),
                 'endpoint': '/api/licensing/chat',
                 'revenue_potential': '$120k-$600k/year',
                 'deal_size': '$40k-$60k'
             },
             'gym_member': {
-                'available': gym_agent is not None,
+                'available': agents.state('gym_member') != 'failed',
+                'state': agents.state('gym_member'),
                 'endpoint': '/api/gym/chat',
                 'revenue_potential': '$175k-$250k/year',
                 'founders_value': '$2,500 x 100 = $250k'
             },
             'events': {
-                'available': True,
+                'available': agents.state('events') != 'failed',
+                'state': agents.state('events'),
                 'endpoint': '/api/events/chat',
                 'revenue_coverage': '$125k/year'
             },
@@ -380,13 +657,21 @@ def agents_status():
             '17-Point Judgment Framework (Nate\'s 10 + 7 expansions)',
             'ML-driven DMN decision logic'
         ]
-    }), 200
+    }
+
+
+@app.route('/api/agents/status', methods=['GET'])
+def agents_status():
+    """Get status of all 5 agents"""
+    return jsonify(agents_status_payload()), 200
 
 
 if __name__ == '__main__':
     logger.info(f"🚀 Starting MetroFlex Unified AI Agent Server on port {PORT}")
-    logger.info(f"   Licensing Agent: {'✅ Ready' if licensing_agent else '❌ Not available'}")
-    logger.info(f"   Gym Member Agent: {'✅ Ready' if gym_agent else '❌ Not available'}")
+    logger.info(f"   Agents: constructed on first use; warming up {', '.join(AGENT_PRELOAD) or 'none'} in the background")
+    logger.info(f"   Webhook fast-ack: {'✅ On' if WEBHOOK_FAST_ACK else 'Off (per request with ?async=true)'}, jobs at GET /api/jobs/<id>")
+    logger.info(f"   LLM gateway: chat/SMS ahead of workflow generation, 429 when shedding (GET /api/llm/stats)")
+    logger.info(f"   Readiness: GET /ready (requires {', '.join(AGENT_READY_REQUIRED) or 'nothing'}), POST /warmup")
     logger.info(f"   GHL Webhook: {'✅ Configured' if GHL_WEBHOOK_URL and 'placeholder' not in GHL_WEBHOOK_URL else '⚠️  Not configured'}")
     logger.info(f"   Revenue Potential: $420k-$975k/year")
 
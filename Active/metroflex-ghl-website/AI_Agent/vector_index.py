@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Vector Index Utilities
+Persistent, content-addressed document storage for the RAG agents
+
+Every document is stored under an ID derived from a hash of its content
+instead of its position in the knowledge base. On restart only new or
+changed documents are embedded; unchanged ones are reused from disk and
+documents that disappeared from the knowledge base are deleted.
+
+open_collection() picks the storage backend from VECTOR_BACKEND: "chroma"
+(default) or "numpy" for the brute-force NumpyVectorIndex, which is faster
+for knowledge bases of a few hundred documents.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+# Where the persistent Chroma index lives (one directory shared by all workers)
+DEFAULT_INDEX_PATH = os.getenv("METROFLEX_VECTOR_DB_PATH", "./chroma_db")
+
+# Retrieval backend: "chroma" or "numpy"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+NUMPY_INDEX_PATH = os.getenv("METROFLEX_NUMPY_INDEX_PATH", "./numpy_index")
+# Memory-map the NumPy index so worker processes share its pages
+NUMPY_INDEX_MMAP = os.getenv("METROFLEX_NUMPY_INDEX_MMAP", "true").lower() == "true"
+
+
+def content_id(document: str, metadata: Optional[Dict] = None) -> str:
+    """
+    Stable document ID derived from the document text (and its metadata,
+    so re-categorising a document also counts as a change)
+    """
+    payload = document
+    if metadata:
+        payload += "\x1f" + json.dumps(metadata, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def assign_content_ids(documents: List[str], metadatas: List[Dict]) -> Tuple[List[str], List[str], List[Dict]]:
+    """
+    Attach content IDs to documents, dropping exact duplicates
+
+    Returns:
+        (ids, documents, metadatas) in original order
+    """
+    ids, unique_docs, unique_metas = [], [], []
+    seen = set()
+    for document, metadata in zip(documents, metadatas):
+        doc_id = content_id(document, metadata)
+        if doc_id in seen:
+            continue
+        seen.add(doc_id)
+        ids.append(doc_id)
+        unique_docs.append(document)
+        unique_metas.append(metadata)
+    return ids, unique_docs, unique_metas
+
+
+def sync_collection(collection, documents: List[str], metadatas: List[Dict]) -> Dict:
+    """
+    Make a Chroma collection contain exactly the given documents
+
+    Only documents whose content ID is not already stored are embedded.
+    Upsert keeps this idempotent when several workers sync the same
+    persistent index at startup.
+
+    Returns:
+        {"total": int, "added": int, "removed": int, "unchanged": int}
+    """
+    ids, documents, metadatas = assign_content_ids(documents, metadatas)
+
+    existing_ids = set(collection.get(include=[])["ids"])
+    new_positions = [i for i, doc_id in enumerate(ids) if doc_id not in existing_ids]
+    stale_ids = sorted(existing_ids - set(ids))
+
+    if new_positions:
+        collection.upsert(
+            ids=[ids[i] for i in new_positions],
+            documents=[documents[i] for i in new_positions],
+            metadatas=[metadatas[i] for i in new_positions]
+        )
+
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+
+    return {
+        "total": len(ids),
+        "added": len(new_positions),
+        "removed": len(stale_ids),
+        "unchanged": len(ids) - len(new_positions)
+    }
+
+
+def open_collection(name: str, embedding_function, persistent: bool = True, backend: Optional[str] = None):
+    """
+    Open (or create) a document collection on the configured backend
+
+    Args:
+        name: Collection name (also the NumPy index's directory name)
+        embedding_function: Used to embed documents and text queries
+        persistent: Keep the index on disk across restarts
+        backend: "chroma" or "numpy" (defaults to VECTOR_BACKEND)
+
+    Both backends use cosine distance and support get/add/upsert/delete/query.
+    """
+    backend = (backend or VECTOR_BACKEND).lower()
+
+    if backend == "numpy":
+        from numpy_index import NumpyVectorIndex
+        path = os.path.join(NUMPY_INDEX_PATH, name) if persistent else None
+        return NumpyVectorIndex(embedding_function=embedding_function, path=path, mmap=NUMPY_INDEX_MMAP)
+
+    if backend != "chroma":
+        raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
+
+    import chromadb
+    client = chromadb.PersistentClient(path=DEFAULT_INDEX_PATH) if persistent else chromadb.Client()
+    return client.get_or_create_collection(
+        name=name,
+        embedding_function=embedding_function,
+        metadata={"hnsw:space": "cosine"}
+    )
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+MetroFlex Webhook Jobs
+Fast-ack processing of GHL-triggered webhooks
+
+GHL retries a webhook that doesn't answer within a few seconds, and the
+conversation and workflow endpoints spend that long (or much longer) on
+LLM calls. In fast-ack mode the endpoint validates the payload, records a
+job and answers 202 with its ID right away; a bounded thread pool does the
+work. Jobs are deduplicated by GHL event ID (or contact ID plus payload
+hash), so a retried delivery gets the original job back instead of
+starting a second LLM run. A redelivery does run the job again when it
+failed, or when it has sat queued/running for longer than `stale_seconds`
+and no live worker holds it (each job records the PID of the process whose
+pool has it, and a process also knows which jobs it has in flight); the
+payload is stored with the job for that, and recover() restarts such
+stale jobs when a worker starts.
+
+Jobs live in a local SQLite table (WAL mode, like the GHL outbox), so any
+Gunicorn worker can answer GET /api/jobs/<id> and deduplicate deliveries
+that land on a different worker. A finished job's result is also POSTed to
+its `callback_url` when one was given. Callback URLs come from the request
+body, so only https URLs on WEBHOOK_CALLBACK_HOSTS are accepted, and they
+are posted through their own outbox and client: a failing callback host
+never trips the circuit breaker or spends the rate limit of lead delivery.
+
+Usage:
+    jobs = get_job_queue()
+    job, created = jobs.submit("conversation", dedupe_key, payload, handler, callback_url)
+    jobs.get(job["id"])
+    jobs.recover({"conversation": handler})
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from ghl_client import GHLClient
+from ghl_outbox import GHLOutbox
+from metrics import record_cache, record_error, time_stage
+
+# Hosts (and their subdomains) a job result may be POSTed to
+CALLBACK_HOSTS = [
+    host.strip().lower().lstrip('.')
+    for host in os.getenv('WEBHOOK_CALLBACK_HOSTS', 'leadconnectorhq.com').split(',') if host.strip()
+]
+
+
+class QueueFull(Exception):
+    """Too many jobs waiting; the caller should answer 503 and let GHL retry"""
+
+
+def validate_callback_url(url: str, allowed_hosts: Optional[List[str]] = None) -> str:
+    """
+    The callback URL, if it is https on an allowed host (or a subdomain of one)
+
+    Raises:
+        ValueError: any other URL, so a caller can't make the server POST to
+            internal or arbitrary hosts
+    """
+    allowed_hosts = CALLBACK_HOSTS if allowed_hosts is None else allowed_hosts
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError("callback_url is not a valid URL")
+    if parts.scheme != 'https' or not host:
+        raise ValueError("callback_url must be an https URL")
+    if parts.username or parts.password:
+        raise ValueError("callback_url must not carry credentials")
+    if not any(host == allowed or host.endswith('.' + allowed) for allowed in allowed_hosts):
+        raise ValueError(f"callback_url host {host} is not allowed (see WEBHOOK_CALLBACK_HOSTS)")
+    return url
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def dedupe_key(kind: str, payload: Dict) -> str:
+    """GHL event ID when the delivery has one, else contact ID + hash of the payload"""
+    event_id = payload.get('event_id') or payload.get('webhook_id')
+    if event_id:
+        return f"{kind}:event:{event_id}"
+    digest = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return f"{kind}:contact:{payload.get('contact_id', '')}:{digest}"
+
+
+class WebhookJobQueue:
+    def __init__(self, path: str = "./webhook_jobs.db", max_workers: int = 4, max_pending: int = 100,
+                 retention_seconds: float = 3600.0, stale_seconds: float = 600.0):
+        """
+        Args:
+            path: SQLite file holding the jobs (shared by all workers on the host)
+            max_workers: Jobs processed concurrently per process
+            max_pending: Queued + running jobs per process before submit() raises QueueFull
+            retention_seconds: How long finished jobs can be polled, and the dedupe window
+            stale_seconds: How long a job may stay queued/running before it is
+                taken to be lost with its worker and run again
+        """
+        self.path = path
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self.stale_seconds = stale_seconds
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._pending = 0
+        # Jobs submitted to this process's pool and not finished yet
+        self._in_flight = set()
+
+        conn = self._connection()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS webhook_jobs (
+                   id TEXT PRIMARY KEY,
+                   kind TEXT NOT NULL,
+                   dedupe_key TEXT NOT NULL UNIQUE,
+                   status TEXT NOT NULL DEFAULT 'queued',
+                   payload TEXT,
+                   worker_pid INTEGER,
+                   callback_url TEXT,
+                   result TEXT,
+                   error TEXT,
+                   created_at REAL NOT NULL,
+                   started_at REAL,
+                   finished_at REAL
+               )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_webhook_jobs_created ON webhook_jobs (created_at)")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(webhook_jobs)")}
+        # Tables created before payloads and holders were stored
+        for column, column_type in (("payload", "TEXT"), ("worker_pid", "INTEGER")):
+            if column not in columns:
+                try:
+                    conn.execute(f"ALTER TABLE webhook_jobs ADD COLUMN {column} {column_type}")
+                except sqlite3.OperationalError:
+                    pass  # another worker added it first
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Worker threads don't survive a fork: one pool per process
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="webhook-job")
+            self._executor_pid = os.getpid()
+            self._pending = 0
+            self._in_flight = set()
+        return self._executor
+
+    def submit(self, kind: str, key: str, payload: Dict, handler: Callable[[Dict], Dict],
+               callback_url: Optional[str] = None) -> Tuple[Dict, bool]:
+        """
+        Record a job and start `handler(payload)` in the background
+
+        Returns:
+            (job, created): created is False when `key` matched an existing job,
+            which is returned unchanged and not run again. A matching job that
+            failed or went stale is queued again (created is True).
+
+        Raises:
+            QueueFull: max_pending jobs are already waiting in this process
+            ValueError: callback_url is not an allowed callback (validate_callback_url)
+        """
+        if callback_url:
+            validate_callback_url(callback_url)
+        now = time.time()
+        conn = self._connection()
+        conn.execute("DELETE FROM webhook_jobs WHERE created_at < ?", (now - self.retention_seconds,))
+
+        with self._lock:
+            pool = self._pool()
+            if self._pending >= self.max_pending:
+                record_error("webhook_jobs", "queue_full")
+                raise QueueFull(f"{self._pending} webhook jobs pending")
+
+            job_id = uuid.uuid4().hex
+            cursor = conn.execute(
+                """INSERT OR IGNORE INTO webhook_jobs
+                       (id, kind, dedupe_key, payload, worker_pid, callback_url, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (job_id, kind, key, json.dumps(payload, default=str), os.getpid(), callback_url, now)
+            )
+            created = cursor.rowcount == 1
+            if not created:
+                job_id = conn.execute("SELECT id FROM webhook_jobs WHERE dedupe_key = ?", (key,)).fetchone()[0]
+                created = self._requeue(conn, job_id, payload, callback_url, now)
+            record_cache("webhook_dedupe", not created)
+            if not created:
+                return self.get(job_id), False
+
+            self._start(pool, job_id, kind, payload, handler, callback_url)
+        return self.get(job_id), True
+
+    def _start(self, pool: ThreadPoolExecutor, job_id: str, kind: str, payload: Dict,
+               handler: Callable[[Dict], Dict], callback_url: Optional[str]):
+        # Called with self._lock held
+        self._pending += 1
+        self._in_flight.add(job_id)
+        pool.submit(self._run, job_id, kind, payload, handler, callback_url)
+
+    def _held(self, worker_pid: Optional[int], job_id: str) -> bool:
+        """Whether a live worker still has the job in its pool (queued behind a busy pool or running)"""
+        if worker_pid == os.getpid():
+            return job_id in self._in_flight
+        return _pid_alive(worker_pid)
+
+    def _requeue(self, conn: sqlite3.Connection, job_id: str, payload: Dict, callback_url: Optional[str],
+                 now: float) -> bool:
+        """
+        Reset a failed job, or a stale one no live worker holds, to queued for
+        this process; False if it is done or still held (or another worker took it)
+        """
+        row = conn.execute("SELECT status, worker_pid FROM webhook_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return False
+        status, worker_pid = row
+        if status in ('queued', 'running') and self._held(worker_pid, job_id):
+            return False
+        # Conditional on the holder just checked, so only one worker takes the job
+        cursor = conn.execute(
+            """UPDATE webhook_jobs
+               SET status = 'queued', payload = ?, worker_pid = ?, callback_url = COALESCE(?, callback_url),
+                   result = NULL, error = NULL, created_at = ?, started_at = NULL, finished_at = NULL
+               WHERE id = ? AND worker_pid IS ? AND (status = 'failed'
+                     OR (status IN ('queued', 'running') AND COALESCE(started_at, created_at) < ?))""",
+            (json.dumps(payload, default=str), os.getpid(), callback_url, now, job_id, worker_pid,
+             now - self.stale_seconds)
+        )
+        if cursor.rowcount == 1:
+            record_error("webhook_jobs", "requeued")
+            return True
+        return False
+
+    def recover(self, handlers: Dict[str, Callable[[Dict], Dict]]) -> int:
+        """
+        Run again the jobs left queued/running past stale_seconds by a worker that is gone
+
+        Returns:
+            Number of jobs restarted in this process
+        """
+        now = time.time()
+        conn = self._connection()
+        rows = conn.execute(
+            """SELECT id, kind, payload, callback_url FROM webhook_jobs
+               WHERE status IN ('queued', 'running') AND payload IS NOT NULL
+                 AND COALESCE(started_at, created_at) < ?""",
+            (now - self.stale_seconds,)
+        ).fetchall()
+
+        recovered = 0
+        with self._lock:
+            pool = self._pool()
+            for job_id, kind, payload, callback_url in rows:
+                handler = handlers.get(kind)
+                if handler is None or self._pending >= self.max_pending:
+                    continue
+                payload = json.loads(payload)
+                # The conditional update lets only one worker take each job
+                if self._requeue(conn, job_id, payload, callback_url, now):
+                    self._start(pool, job_id, kind, payload, handler, callback_url)
+                    recovered += 1
+        if recovered:
+            print(f"🔁 Restarted {recovered} interrupted webhook jobs")
+        return recovered
+
+    def _run(self, job_id: str, kind: str, payload: Dict, handler: Callable[[Dict], Dict],
+             callback_url: Optional[str]):
+        conn = self._connection()
+        conn.execute("UPDATE webhook_jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), job_id))
+        try:
+            with time_stage("webhook_jobs", kind):
+                result = handler(payload)
+            conn.execute(
+                "UPDATE webhook_jobs SET status = 'done', result = ?, finished_at = ? WHERE id = ?",
+                (json.dumps(result, default=str), time.time(), job_id)
+            )
+        except Exception as e:
+            record_error("webhook_jobs", kind)
+            print(f"❌ Webhook job {job_id} ({kind}) failed: {e}")
+            conn.execute(
+                "UPDATE webhook_jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                (str(e), time.time(), job_id)
+            )
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._in_flight.discard(job_id)
+
+        if callback_url:
+            # Durable, retried delivery through the callback outbox (not lead delivery's)
+            try:
+                get_callback_outbox().enqueue(callback_url, self.get(job_id))
+            except Exception as e:
+                record_error("webhook_jobs", "callback_enqueue")
+                print(f"❌ Webhook job {job_id} callback not queued: {e}")
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Job status and, once finished, its result or error"""
+        row = self._connection().execute(
+            """SELECT id, kind, status, result, error, created_at, started_at, finished_at
+               FROM webhook_jobs WHERE id = ?""",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job_id, kind, status, result, error, created_at, started_at, finished_at = row
+        job = {"job_id": job_id, "kind": kind, "status": status, "created_at": created_at}
+        if started_at:
+            job["queue_seconds"] = round(started_at - created_at, 3)
+        if finished_at:
+            job["run_seconds"] = round(finished_at - (started_at or created_at), 3)
+        if result is not None:
+            job["result"] = json.loads(result)
+        if error is not None:
+            job["error"] = error
+        return job
+
+    def stats(self) -> Dict:
+        counts = dict(self._connection().execute(
+            "SELECT status, COUNT(*) FROM webhook_jobs GROUP BY status"
+        ).fetchall())
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "pending_in_process": self._pending,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending
+        }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+_callback_outbox = None
+_callback_outbox_lock = threading.Lock()
+
+
+def get_callback_outbox(start: bool = True) -> GHLOutbox:
+    """
+    Process-wide outbox for job callbacks, with its own GHL client
+
+    WEBHOOK_CALLBACK_OUTBOX_PATH  SQLite file (default ./webhook_callbacks.db)
+    WEBHOOK_CALLBACK_HOSTS        allowed callback hosts, comma-separated, subdomains
+                                  included (default leadconnectorhq.com)
+    """
+    global _callback_outbox
+    with _callback_outbox_lock:
+        if _callback_outbox is None:
+            _callback_outbox = GHLOutbox(
+                path=os.getenv("WEBHOOK_CALLBACK_OUTBOX_PATH", "./webhook_callbacks.db"),
+                client=GHLClient(rate_per_second=5.0, burst=20, pool_size=4)
+            )
+    if start:
+        # Also delivers callbacks left over from before a restart
+        _callback_outbox.start()
+    return _callback_outbox
+
+
+def get_job_queue() -> WebhookJobQueue:
+    """
+    Process-wide job queue configured from the environment
+
+    WEBHOOK_JOBS_PATH         SQLite file (default ./webhook_jobs.db)
+    WEBHOOK_JOB_WORKERS       concurrent jobs per process (default 4)
+    WEBHOOK_JOB_MAX_PENDING   waiting jobs per process before 503 (default 100)
+    WEBHOOK_JOB_RETENTION     seconds results are kept / deliveries deduped (default 3600)
+    WEBHOOK_JOB_STALE_SECONDS seconds queued/running before a job is run again (default 600)
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = WebhookJobQueue(
+                path=os.getenv("WEBHOOK_JOBS_PATH", "./webhook_jobs.db"),
+                max_workers=int(os.getenv("WEBHOOK_JOB_WORKERS", "4")),
+                max_pending=int(os.getenv("WEBHOOK_JOB_MAX_PENDING", "100")),
+                retention_seconds=float(os.getenv("WEBHOOK_JOB_RETENTION", "3600")),
+                stale_seconds=float(os.getenv("WEBHOOK_JOB_STALE_SECONDS", "600"))
+            )
+    return _queue